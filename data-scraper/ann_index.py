@@ -0,0 +1,487 @@
+"""Approximate nearest-neighbour (IVF-flat) index over course embeddings.
+
+Brute-force ``matrix @ query`` is fine for one academic year, but scanning
+every vector gets slow once several years and external catalogues are indexed.
+This module partitions the normalized BGEM3 vectors with spherical k-means
+into ``nlist`` inverted lists and, at query time, only scans the ``nprobe``
+lists whose centroids are closest to the query. ``nprobe`` is the
+recall/latency knob: ``nprobe == nlist`` is exact search.
+
+An index is a directory of plain ``.npy`` files, so it can be opened with
+``mmap_mode="r"`` and shared between processes without loading it::
+
+    meta.json        dim, nlist, storage kind, counts
+    centroids.npy    (nlist x dim) float32
+    vectors.npy      (n x dim) float32/float16, grouped by list
+    offsets.npy      (nlist + 1) start of each list in vectors.npy
+    row_ids.npy      row_id of each vector
+    deleted.npy      tombstones for replaced/removed rows
+    delta_*.npy      vectors inserted since the last compaction
+
+New ``row_id``s are assigned to their nearest centroid and appended to the
+delta segment; re-inserting an existing ``row_id`` tombstones the old vector.
+The ``insert`` command only inserts row_ids that are new or whose vector
+changed, and reports (or with ``--remove-missing`` drops) row_ids that left
+the source.
+``compact`` folds the delta back into the list-ordered layout (retrain with
+``build`` once the corpus has drifted a lot).
+
+Usage::
+
+    python ann_index.py build  [--csv-path PATH | --embedding-store PATH]
+                               [--out data/ann] [--nlist N] [--kind float32|float16]
+    python ann_index.py insert --index data/ann [--csv-path PATH | --embedding-store PATH]
+                               [--remove-missing] [--compact]
+    python ann_index.py compact --index data/ann
+    python ann_index.py bench  --index data/ann [--k 10] [--nprobe 1 2 4 8 16]
+                               [--n-queries 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from csv_stream import DEFAULT_CHUNK_SIZE
+from embedding_quant import EmbeddingStore, build_store, load_store
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+DEFAULT_CSV_PATH = DATA_DIR / "courses_scores.csv"
+DEFAULT_INDEX_DIR = DATA_DIR / "ann"
+INDEX_VERSION = 1
+STORAGE_KINDS = ("float32", "float16")
+DEFAULT_NPROBE = 8
+DEFAULT_KMEANS_ITERS = 20
+KMEANS_SAMPLE = 100_000
+BLOCK_ROWS = 8192
+
+
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def default_nlist(n: int) -> int:
+    """~4 * sqrt(n) lists, so each list holds a few dozen to a few hundred vectors."""
+    return int(max(1, min(n, round(4 * np.sqrt(max(n, 1))))))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), BLOCK_ROWS):
+        block = np.asarray(vectors[start : start + BLOCK_ROWS], dtype=np.float32)
+        out[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iters: int = DEFAULT_KMEANS_ITERS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (cosine) on up to ``KMEANS_SAMPLE`` rows."""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    nlist = max(1, min(nlist, n))
+    sample_idx = rng.choice(n, size=min(n, KMEANS_SAMPLE), replace=False)
+    sample = np.asarray(vectors[np.sort(sample_idx)], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(max(1, iters)):
+        assign = _assign(sample, centroids)
+        counts = np.bincount(assign, minlength=nlist)
+        grouped = sample[np.argsort(assign, kind="stable")]
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        sums = np.zeros_like(centroids)
+        for c in np.flatnonzero(counts):
+            sums[c] = grouped[bounds[c] : bounds[c + 1]].sum(axis=0)
+        empty = counts == 0
+        if empty.any():
+            # re-seed empty lists with random sample points
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted-file index with a list-ordered main segment and an append-only delta."""
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        vectors: np.ndarray,
+        offsets: np.ndarray,
+        row_ids: np.ndarray,
+        deleted: np.ndarray | None = None,
+        delta_vectors: np.ndarray | None = None,
+        delta_lists: np.ndarray | None = None,
+        delta_row_ids: np.ndarray | None = None,
+        kind: str = "float32",
+    ):
+        dim = centroids.shape[1]
+        self.kind = kind
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.vectors = vectors
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.row_ids = np.asarray(row_ids, dtype=np.str_)
+        self.deleted = np.zeros(len(vectors), dtype=bool) if deleted is None else np.array(deleted, dtype=bool)
+        self.delta_vectors = np.zeros((0, dim), dtype=kind) if delta_vectors is None else np.asarray(delta_vectors)
+        self.delta_lists = np.zeros(0, dtype=np.int32) if delta_lists is None else np.asarray(delta_lists, dtype=np.int32)
+        self.delta_row_ids = np.zeros(0, dtype=np.str_) if delta_row_ids is None else np.asarray(delta_row_ids, dtype=np.str_)
+        self.delta_deleted = np.zeros(len(self.delta_vectors), dtype=bool)
+        self._positions: Dict[str, tuple[bool, int]] | None = None
+
+    @property
+    def dim(self) -> int:
+        return self.centroids.shape[1]
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    def __len__(self) -> int:
+        return int((~self.deleted).sum() + (~self.delta_deleted).sum())
+
+    @classmethod
+    def build(
+        cls,
+        row_ids: Sequence[str],
+        vectors: np.ndarray,
+        nlist: int | None = None,
+        kind: str = "float32",
+        iters: int = DEFAULT_KMEANS_ITERS,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        if kind not in STORAGE_KINDS:
+            raise ValueError(f"Unknown storage kind: {kind}")
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        centroids = train_centroids(vectors, nlist or default_nlist(len(vectors)), iters, seed)
+        assign = _assign(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=len(centroids)), out=offsets[1:])
+        return cls(
+            centroids,
+            vectors[order].astype(kind),
+            offsets,
+            np.asarray(row_ids, dtype=np.str_)[order],
+            kind=kind,
+        )
+
+    def _position_map(self) -> Dict[str, tuple[bool, int]]:
+        if self._positions is None:
+            positions: Dict[str, tuple[bool, int]] = {}
+            for pos in np.flatnonzero(~self.deleted):
+                positions[str(self.row_ids[pos])] = (False, int(pos))
+            for pos in np.flatnonzero(~self.delta_deleted):
+                positions[str(self.delta_row_ids[pos])] = (True, int(pos))
+            self._positions = positions
+        return self._positions
+
+    def insert(self, row_ids: Sequence[str], vectors: np.ndarray) -> int:
+        """Add (or replace) vectors for ``row_ids``; returns how many existing rows were replaced."""
+        if len(row_ids) == 0:
+            return 0
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Vectors have {vectors.shape[1]} dims, index has {self.dim}")
+        positions = self._position_map()
+        replaced = 0
+        for row_id in row_ids:
+            hit = positions.pop(str(row_id), None)
+            if hit is not None:
+                in_delta, pos = hit
+                (self.delta_deleted if in_delta else self.deleted)[pos] = True
+                replaced += 1
+        start = len(self.delta_vectors)
+        self.delta_vectors = np.concatenate([self.delta_vectors, vectors.astype(self.kind)])
+        self.delta_lists = np.concatenate([self.delta_lists, _assign(vectors, self.centroids)])
+        self.delta_row_ids = np.concatenate([self.delta_row_ids, np.asarray(row_ids, dtype=np.str_)])
+        self.delta_deleted = np.concatenate([self.delta_deleted, np.zeros(len(vectors), dtype=bool)])
+        for offset, row_id in enumerate(row_ids):
+            positions[str(row_id)] = (True, start + offset)
+        return replaced
+
+    def changed(self, row_ids: Sequence[str], vectors: np.ndarray) -> np.ndarray:
+        """Mask of ``row_ids`` that are not indexed yet or whose stored vector differs from ``vectors``.
+
+        Vectors are compared after normalizing and casting to the storage kind,
+        so re-reading an unchanged source matches exactly.
+        """
+        vectors = _normalize_rows(np.asarray(vectors, dtype=np.float32)).astype(self.kind)
+        positions = self._position_map()
+        mask = np.ones(len(row_ids), dtype=bool)
+        hits: Dict[bool, tuple[List[int], List[int]]] = {False: ([], []), True: ([], [])}
+        for i, row_id in enumerate(row_ids):
+            hit = positions.get(str(row_id))
+            if hit is not None:
+                hits[hit[0]][0].append(i)
+                hits[hit[0]][1].append(hit[1])
+        for in_delta, (rows, pos) in hits.items():
+            if rows:
+                stored = np.asarray((self.delta_vectors if in_delta else self.vectors)[pos])
+                mask[rows] = ~np.all(stored == vectors[rows], axis=1)
+        return mask
+
+    def live_row_ids(self) -> List[str]:
+        return list(self._position_map())
+
+    def remove(self, row_ids: Iterable[str]) -> int:
+        positions = self._position_map()
+        removed = 0
+        for row_id in row_ids:
+            hit = positions.pop(str(row_id), None)
+            if hit is not None:
+                in_delta, pos = hit
+                (self.delta_deleted if in_delta else self.deleted)[pos] = True
+                removed += 1
+        return removed
+
+    def all_vectors(self) -> tuple[np.ndarray, np.ndarray]:
+        """Live ``(row_ids, float32 vectors)``, e.g. for exact search or rebuilding."""
+        live = ~self.deleted
+        live_delta = ~self.delta_deleted
+        ids = np.concatenate([self.row_ids[live], self.delta_row_ids[live_delta]])
+        vecs = np.concatenate([
+            np.asarray(self.vectors, dtype=np.float32)[live],
+            np.asarray(self.delta_vectors, dtype=np.float32)[live_delta],
+        ])
+        return ids, vecs
+
+    def compact(self) -> "IVFIndex":
+        """Fold the delta and tombstones into a fresh list-ordered layout (centroids kept)."""
+        ids, vecs = self.all_vectors()
+        assign = _assign(vecs, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=self.nlist), out=offsets[1:])
+        return IVFIndex(self.centroids, vecs[order].astype(self.kind), offsets, ids[order], kind=self.kind)
+
+    def search(self, queries: np.ndarray, k: int = 10, nprobe: int = DEFAULT_NPROBE) -> tuple[np.ndarray, np.ndarray]:
+        """Return ``(row_ids, scores)`` arrays of shape ``(n_queries, k)``, best first.
+
+        Missing results (fewer than ``k`` candidates) have row_id ``""`` and score ``-inf``.
+        """
+        queries = _normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        nprobe = max(1, min(nprobe, self.nlist))
+        k = max(1, k)
+        probe = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        out_ids = np.full((len(queries), k), "", dtype=self.row_ids.dtype if self.row_ids.size else "<U1")
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        has_deleted = bool(self.deleted.any())
+        for qi, query in enumerate(queries):
+            lists = probe[qi]
+            # main segment: one contiguous slice per probed list
+            ranges = [(int(self.offsets[c]), int(self.offsets[c + 1])) for c in lists]
+            ranges = [(a, b) for a, b in ranges if b > a]
+            if ranges:
+                scores = np.concatenate([np.asarray(self.vectors[a:b], dtype=np.float32) @ query for a, b in ranges])
+                ids = np.concatenate([self.row_ids[a:b] for a, b in ranges])
+                if has_deleted:
+                    live = ~np.concatenate([self.deleted[a:b] for a, b in ranges])
+                    ids, scores = ids[live], scores[live]
+            else:
+                ids = self.row_ids[:0]
+                scores = np.zeros(0, dtype=np.float32)
+            if len(self.delta_vectors):
+                hit = np.isin(self.delta_lists, lists) & ~self.delta_deleted
+                if hit.any():
+                    scores = np.concatenate([scores, np.asarray(self.delta_vectors[hit], dtype=np.float32) @ query])
+                    ids = np.concatenate([ids, self.delta_row_ids[hit]])
+            if not len(scores):
+                continue
+            top = min(k, len(scores))
+            best = np.argpartition(-scores, top - 1)[:top]
+            best = best[np.argsort(-scores[best], kind="stable")]
+            out_ids[qi, :top] = ids[best]
+            out_scores[qi, :top] = scores[best]
+        return out_ids, out_scores
+
+    def save(self, path: Path) -> None:
+        """Write the index directory atomically (a temp dir renamed over ``path``)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{path.name}.", dir=path.parent))
+        try:
+            tmp_dir.chmod(0o755)
+            meta = {
+                "version": INDEX_VERSION,
+                "dim": self.dim,
+                "nlist": self.nlist,
+                "kind": self.kind,
+                "count": int(len(self.vectors)),
+                "delta_count": int(len(self.delta_vectors)),
+                "live": len(self),
+            }
+            (tmp_dir / "meta.json").write_text(json.dumps(meta, indent=2) + "\n", encoding="utf-8")
+            np.save(tmp_dir / "centroids.npy", self.centroids)
+            np.save(tmp_dir / "vectors.npy", np.asarray(self.vectors))
+            np.save(tmp_dir / "offsets.npy", self.offsets)
+            np.save(tmp_dir / "row_ids.npy", self.row_ids)
+            np.save(tmp_dir / "deleted.npy", self.deleted)
+            np.save(tmp_dir / "delta_vectors.npy", np.asarray(self.delta_vectors))
+            np.save(tmp_dir / "delta_lists.npy", self.delta_lists)
+            np.save(tmp_dir / "delta_row_ids.npy", self.delta_row_ids)
+            np.save(tmp_dir / "delta_deleted.npy", self.delta_deleted)
+            old_dir = None
+            if path.exists():
+                old_dir = path.with_name(f".{path.name}.old")
+                shutil.rmtree(old_dir, ignore_errors=True)
+                path.rename(old_dir)
+            tmp_dir.rename(path)
+            if old_dir is not None:
+                shutil.rmtree(old_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "IVFIndex":
+        meta_path = path / "meta.json"
+        if not meta_path.exists():
+            raise FileNotFoundError(f"ANN index not found: {path}")
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported ANN index version in {path}: {meta.get('version')!r}")
+        mode = "r" if mmap else None
+        index = cls(
+            np.load(path / "centroids.npy"),
+            np.load(path / "vectors.npy", mmap_mode=mode),
+            np.load(path / "offsets.npy"),
+            np.load(path / "row_ids.npy"),
+            np.load(path / "deleted.npy"),
+            np.load(path / "delta_vectors.npy"),
+            np.load(path / "delta_lists.npy"),
+            np.load(path / "delta_row_ids.npy"),
+            kind=meta["kind"],
+        )
+        index.delta_deleted = np.array(np.load(path / "delta_deleted.npy"), dtype=bool)
+        return index
+
+
+def _load_vectors(csv_path: Path | None, store_path: Path | None, chunk_size: int) -> EmbeddingStore:
+    if store_path is not None:
+        return load_store(store_path)
+    store, _ = build_store(csv_path or DEFAULT_CSV_PATH, "float32", chunk_size)
+    return store
+
+
+def _exact_search(vectors: np.ndarray, row_ids: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = vectors @ query
+    return row_ids[np.argpartition(-scores, k - 1)[:k]]
+
+
+def _bench(args: argparse.Namespace) -> int:
+    index = IVFIndex.load(args.index, mmap=True)
+    ids, vecs = index.all_vectors()
+    rng = np.random.default_rng(args.seed)
+    n_queries = min(args.n_queries, len(vecs))
+    # perturbed course vectors: near, but not exactly on, indexed points
+    picks = rng.choice(len(vecs), size=n_queries, replace=False)
+    queries = _normalize_rows(vecs[picks] + rng.normal(0, args.noise, size=(n_queries, index.dim)).astype(np.float32))
+    k = min(args.k, len(vecs))
+
+    # timed one query at a time, like the index
+    started = time.perf_counter()
+    truth = [_exact_search(vecs, ids, q, k) for q in queries]
+    exact_ms = (time.perf_counter() - started) * 1000 / n_queries
+    print(
+        f"[info] {len(ids)} vectors ({index.kind}), nlist={index.nlist}, delta={int((~index.delta_deleted).sum())}, "
+        f"{n_queries} queries, k={k}"
+    )
+    print(f"{'nprobe':>7} {'recall@k':>9} {'ms/query':>9} {'scanned %':>10}")
+    print(f"{'exact':>7} {1.0:>9.4f} {exact_ms:>9.3f} {100.0:>10.1f}")
+    list_sizes = np.diff(index.offsets)
+    for nprobe in args.nprobe:
+        started = time.perf_counter()
+        found = [index.search(q, k=k, nprobe=nprobe)[0][0] for q in queries]
+        ms = (time.perf_counter() - started) * 1000 / n_queries
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        scanned = 100.0 * min(1.0, nprobe * list_sizes.mean() / max(1, len(index.vectors)))
+        print(f"{nprobe:>7} {recall:>9.4f} {ms:>9.3f} {scanned:>10.1f}")
+    return 0
+
+
+def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="IVF-flat approximate nearest-neighbour index for course embeddings.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def source(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--csv-path", type=Path, default=None, help="courses_scores.csv with an embedding column (default: data/courses_scores.csv).")
+        p.add_argument("--embedding-store", type=Path, default=None, help="Read vectors from an embedding_quant.py store instead.")
+        p.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="CSV rows read at a time (default: %(default)s).")
+
+    build = sub.add_parser("build", help="Train centroids and write a new index.")
+    source(build)
+    build.add_argument("--out", type=Path, default=DEFAULT_INDEX_DIR, help="Index directory (default: data/ann).")
+    build.add_argument("--nlist", type=int, default=None, help="Number of inverted lists (default: ~4*sqrt(n)).")
+    build.add_argument("--kind", choices=STORAGE_KINDS, default="float32", help="Vector storage (default: %(default)s).")
+    build.add_argument("--iters", type=int, default=DEFAULT_KMEANS_ITERS, help="k-means iterations (default: %(default)s).")
+    build.add_argument("--seed", type=int, default=0, help="k-means seed (default: %(default)s).")
+
+    insert = sub.add_parser("insert", help="Add new or changed row_ids to an existing index.")
+    source(insert)
+    insert.add_argument("--index", type=Path, default=DEFAULT_INDEX_DIR, help="Index directory (default: data/ann).")
+    insert.add_argument("--remove-missing", action="store_true", help="Tombstone indexed row_ids that are no longer in the source.")
+    insert.add_argument("--compact", action="store_true", help="Fold the delta into the main segment afterwards.")
+
+    compact = sub.add_parser("compact", help="Fold inserted vectors and tombstones into the main segment.")
+    compact.add_argument("--index", type=Path, default=DEFAULT_INDEX_DIR, help="Index directory (default: data/ann).")
+
+    bench = sub.add_parser("bench", help="recall@k and latency against exact search.")
+    bench.add_argument("--index", type=Path, default=DEFAULT_INDEX_DIR, help="Index directory (default: data/ann).")
+    bench.add_argument("--k", type=int, default=10, help="Neighbours per query (default: %(default)s).")
+    bench.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="nprobe values to try.")
+    bench.add_argument("--n-queries", type=int, default=200, help="Number of queries (default: %(default)s).")
+    bench.add_argument("--noise", type=float, default=0.02, help="Per-dim Gaussian noise added to sampled vectors (default: %(default)s).")
+    bench.add_argument("--seed", type=int, default=0, help="Query sampling seed (default: %(default)s).")
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = _parse_args(argv or sys.argv[1:])
+    if args.command == "bench":
+        return _bench(args)
+    if args.command == "build":
+        store = _load_vectors(args.csv_path, args.embedding_store, args.chunk_size)
+        started = time.perf_counter()
+        index = IVFIndex.build(store.row_ids, store.matrix.dequantize(), args.nlist, args.kind, args.iters, args.seed)
+        index.save(args.out)
+        print(f"[done] Indexed {len(index)} vectors in {index.nlist} lists to {args.out} ({time.perf_counter() - started:.1f} s)")
+        return 0
+
+    index = IVFIndex.load(args.index, mmap=True)
+    if args.command == "insert":
+        store = _load_vectors(args.csv_path, args.embedding_store, args.chunk_size)
+        vectors = store.matrix.dequantize()
+        mask = index.changed(store.row_ids, vectors)
+        row_ids = [row_id for row_id, changed in zip(store.row_ids, mask) if changed]
+        replaced = index.insert(row_ids, vectors[mask])
+        print(
+            f"[info] Inserted {len(row_ids)} vectors ({replaced} replaced changed row_ids, "
+            f"{len(mask) - len(row_ids)} unchanged)"
+        )
+        source_ids = set(store.row_ids)
+        missing = [row_id for row_id in index.live_row_ids() if row_id not in source_ids]
+        if missing and args.remove_missing:
+            print(f"[info] Removed {index.remove(missing)} row_ids that are no longer in the source")
+        elif missing:
+            print(f"[warn] {len(missing)} indexed row_ids are no longer in the source; pass --remove-missing to drop them")
+        if not row_ids and not (missing and args.remove_missing) and not args.compact:
+            print(f"[done] {args.index} is up to date")
+            return 0
+        if not args.compact:
+            index.save(args.index)
+            print(f"[done] {len(index)} live vectors, {len(index.delta_vectors)} in the delta segment")
+            return 0
+    index = index.compact()
+    index.save(args.index)
+    print(f"[done] Compacted {args.index}: {len(index)} vectors in {index.nlist} lists")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
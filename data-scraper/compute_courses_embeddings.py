@@ -1,25 +1,51 @@
 """Compute BGEM3 embeddings for each course text and append them to the CSV.
 
 Usage:
-    python compute_courses_scores.py [--csv-path PATH] [--batch-size N]
+    python compute_courses_embeddings.py [--csv-path PATH] [--batch-size N]
+                                         [--chunk-size N] [--resume]
+                                         [--backend flag|onnx] [--encoder-url URL]
+                                         [--clusters data/course_clusters.csv]
 
 By default, this script reads ``data/courses_scores.csv`` relative to its own
 location, generates a dense embedding for the ``text`` column of each row using
 ``BAAI/bge-m3`` (matching ``tests/test_bgem3.py``), and writes the embeddings
 back into the same CSV under a new ``embedding`` column.
+
+Rows are streamed ``--chunk-size`` at a time into a temporary file that
+atomically replaces the CSV once every chunk has been encoded, so memory use
+does not grow with the number of courses.
+
+Encoded vectors are also appended to a checkpoint sidecar
+(``<csv>.embeddings-checkpoint.jsonl``) every ``--checkpoint-every`` batches or
+``--checkpoint-seconds`` seconds, keyed by a hash of the model settings, the
+encoder backend (``backend_fingerprint``) and the text. If the job is
+interrupted, rerun it with ``--resume`` to skip every text already in the
+sidecar; the resulting CSV is byte-identical to an uninterrupted run. The
+sidecar is removed once the CSV has been written.
+
+``--clusters`` takes the near-duplicate map written by ``dedup_courses.py``:
+every clustered row is keyed and encoded by its canonical row's text, so a
+cluster costs one encode and all of its ``row_id``s get the same vector.
+
+``--backend onnx`` encodes with an exported onnxruntime model instead of
+FlagEmbedding, and ``--encoder-url`` with a running ``embedding_service.py``
+(see ``encoder_backends.py``).
 """
 
 from __future__ import annotations
 
 import argparse
-import csv
+import hashlib
 import json
+import os
 import sys
+import time
 from pathlib import Path
-from typing import Iterable, List
-import torch
+from typing import Dict, Iterable, Iterator, List, Tuple
 
-from FlagEmbedding import BGEM3FlagModel
+from csv_stream import DEFAULT_CHUNK_SIZE, atomic_csv_writer, iter_row_chunks, read_fieldnames
+from dedup_courses import CanonicalTexts
+from encoder_backends import EncoderBackend, add_backend_arguments, backend_fingerprint, load_backend
 
 DEFAULT_CSV_PATH = Path(__file__).resolve().parent / "data" / "courses_scores.csv"
 EMBEDDING_COLUMN = "embedding"
@@ -28,6 +54,9 @@ DEFAULT_BATCH_SIZE = 8
 MODEL_NAME = "BAAI/bge-m3"
 MAX_LENGTH = 8192
 DEFAULT_DEVICE = "auto"  # auto | cpu | mps | cuda
+CHECKPOINT_SUFFIX = ".embeddings-checkpoint.jsonl"
+DEFAULT_CHECKPOINT_EVERY = 10
+DEFAULT_CHECKPOINT_SECONDS = 120.0
 
 
 def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
@@ -44,6 +73,12 @@ def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
         default=DEFAULT_BATCH_SIZE,
         help="Number of texts to encode per batch (default: %(default)s).",
     )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Number of CSV rows read, encoded and written per chunk (default: %(default)s).",
+    )
     parser.add_argument(
         "--max-length",
         type=int,
@@ -57,23 +92,132 @@ def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
         default=DEFAULT_DEVICE,
         help="Device to run inference on: auto|cpu|mps|cuda (default: %(default)s).",
     )
+    add_backend_arguments(parser)
+    parser.add_argument(
+        "--clusters",
+        type=Path,
+        default=None,
+        help="course_clusters.csv from dedup_courses.py; near-duplicates reuse their canonical row's embedding.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reuse embeddings from the checkpoint sidecar of an interrupted run.",
+    )
+    parser.add_argument(
+        "--checkpoint-path",
+        type=Path,
+        default=None,
+        help=f"Checkpoint sidecar location (default: <csv-path>{CHECKPOINT_SUFFIX}).",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=DEFAULT_CHECKPOINT_EVERY,
+        help="Flush the checkpoint after this many encoded batches (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--checkpoint-seconds",
+        type=float,
+        default=DEFAULT_CHECKPOINT_SECONDS,
+        help="Flush the checkpoint at least this often, in seconds (default: %(default)s).",
+    )
     return parser.parse_args(argv)
 
 
-def _load_rows(csv_path: Path) -> tuple[List[dict], List[str]]:
-    if not csv_path.exists():
-        raise FileNotFoundError(f"CSV file not found: {csv_path}")
+def _text_key(text: str, max_length: int, fingerprint: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{MODEL_NAME}\0{fingerprint}\0{max_length}\0".encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
 
-    with csv_path.open("r", newline="", encoding="utf-8") as fp:
-        reader = csv.DictReader(fp)
-        if TEXT_COLUMN not in reader.fieldnames:
-            raise ValueError(f"Missing '{TEXT_COLUMN}' column in {csv_path}")
-        rows = [row for row in reader]
-    return rows, list(reader.fieldnames or [])
+class _EmbeddingCheckpoint:
+    """Append-only JSONL sidecar mapping text keys to serialized embeddings.
 
+    Only line offsets are kept in memory; vectors are read back from disk on
+    lookup. A trailing partial line left by a killed process is discarded.
+    """
 
-def _encode_batches(model: BGEM3FlagModel, texts: List[str], batch_size: int, max_length: int) -> List[List[float]]:
-    embeddings: List[List[float]] = []
+    def __init__(self, path: Path, every_batches: int, every_seconds: float, resume: bool):
+        self.path = path
+        self.every_batches = max(1, every_batches)
+        self.every_seconds = max(0.0, every_seconds)
+        self._offsets: Dict[str, int] = {}
+        self._pending: Dict[str, str] = {}
+        self._batches_since_flush = 0
+        self._last_flush = time.monotonic()
+        if resume and path.exists():
+            self._load()
+        else:
+            path.write_bytes(b"")
+        self._fp = path.open("r+b")
+        self._fp.seek(0, os.SEEK_END)
+
+    def __len__(self) -> int:
+        return len(self._offsets) + len(self._pending)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._pending or key in self._offsets
+
+    def _load(self) -> None:
+        good_end = 0
+        with self.path.open("rb") as fp:
+            for line in iter(fp.readline, b""):
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self._offsets[entry["key"]] = good_end
+                good_end += len(line)
+        with self.path.open("r+b") as fp:
+            fp.truncate(good_end)
+
+    def get(self, key: str) -> str | None:
+        if key in self._pending:
+            return self._pending[key]
+        offset = self._offsets.get(key)
+        if offset is None:
+            return None
+        self._fp.seek(offset)
+        entry = json.loads(self._fp.readline())
+        self._fp.seek(0, os.SEEK_END)
+        return entry["embedding"]
+
+    def add(self, key: str, serialized: str) -> None:
+        self._pending[key] = serialized
+
+    def batch_done(self) -> None:
+        self._batches_since_flush += 1
+        elapsed = time.monotonic() - self._last_flush
+        if self._batches_since_flush >= self.every_batches or elapsed >= self.every_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self._fp.seek(0, os.SEEK_END)
+            for key, serialized in self._pending.items():
+                self._offsets[key] = self._fp.tell()
+                line = json.dumps({"key": key, "embedding": serialized}, separators=(",", ":"))
+                self._fp.write(line.encode("utf-8") + b"\n")
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+            self._pending.clear()
+        self._batches_since_flush = 0
+        self._last_flush = time.monotonic()
+
+    def close(self, remove: bool = False) -> None:
+        self.flush()
+        self._fp.close()
+        if remove:
+            self.path.unlink(missing_ok=True)
+
+
+def _iter_encoded_batches(
+    model: EncoderBackend, texts: List[str], batch_size: int, max_length: int
+) -> Iterator[Tuple[int, List[List[float]]]]:
     total = len(texts)
     for start in range(0, total, batch_size):
         batch = texts[start : start + batch_size]
@@ -88,54 +232,84 @@ def _encode_batches(model: BGEM3FlagModel, texts: List[str], batch_size: int, ma
         dense = output["dense_vecs"]
         if hasattr(dense, "tolist"):
             dense = dense.tolist()
-        embeddings.extend(dense)
         print(f"[ok] Encoded batch {start // batch_size + 1}/{(total + batch_size - 1) // batch_size}")
-    return embeddings
-
-
-def _write_rows(csv_path: Path, rows: List[dict], fieldnames: List[str]) -> None:
-    if EMBEDDING_COLUMN not in fieldnames:
-        fieldnames = fieldnames + [EMBEDDING_COLUMN]
-
-    with csv_path.open("w", newline="", encoding="utf-8") as fp:
-        writer = csv.DictWriter(fp, fieldnames=fieldnames, extrasaction="ignore")
-        writer.writeheader()
-        writer.writerows(rows)
+        yield start, dense
 
 
 def main(argv: Iterable[str] | None = None) -> int:
     args = _parse_args(argv or sys.argv[1:])
     csv_path = args.csv_path
     batch_size = max(1, args.batch_size)
+    chunk_size = max(1, args.chunk_size)
     max_length = max(1, args.max_length)
 
-    # Resolve device
-    if args.device == "auto":
-        if torch.cuda.is_available():
-            resolved_device = "cuda"
-        elif getattr(torch.backends, "mps", None) and torch.backends.mps.is_available():
-            resolved_device = "mps"
-        else:
-            resolved_device = "cpu"
-    else:
-        resolved_device = args.device
+    fieldnames = read_fieldnames(csv_path, required=[TEXT_COLUMN])
+    if EMBEDDING_COLUMN not in fieldnames:
+        fieldnames.append(EMBEDDING_COLUMN)
 
-    rows, fieldnames = _load_rows(csv_path)
-    texts = [row.get(TEXT_COLUMN, "") or "" for row in rows]
+    canonical = CanonicalTexts.load(args.clusters, csv_path, chunk_size) if args.clusters else None
+    if canonical is not None:
+        print(f"[info] {len(canonical)} near-duplicate rows will reuse their canonical row's embedding")
 
-    print(f"[info] Loading model '{MODEL_NAME}' on {resolved_device}...")
-    model = BGEM3FlagModel(MODEL_NAME, use_fp16=False, device=resolved_device)
+    checkpoint_path = args.checkpoint_path or csv_path.with_name(csv_path.name + CHECKPOINT_SUFFIX)
+    checkpoint = _EmbeddingCheckpoint(
+        checkpoint_path,
+        every_batches=args.checkpoint_every,
+        every_seconds=args.checkpoint_seconds,
+        resume=args.resume,
+    )
+    if args.resume:
+        print(f"[info] Resuming with {len(checkpoint)} embeddings from {checkpoint_path}")
+
+    model = load_backend(
+        args.backend,
+        device=args.device,
+        encoder_url=args.encoder_url,
+        onnx_model=args.onnx_model,
+    )
 
-    print(f"[info] Encoding {len(texts)} course texts (batch size {batch_size})...")
-    embeddings = _encode_batches(model, texts, batch_size, max_length)
+    # keys include the encoder, so --resume with another backend, ONNX model or URL re-encodes
+    fingerprint = backend_fingerprint(args.backend, encoder_url=args.encoder_url, onnx_model=args.onnx_model)
+    total_rows = 0
+    try:
+        with atomic_csv_writer(csv_path, fieldnames) as writer:
+            for chunk_idx, rows in enumerate(iter_row_chunks(csv_path, chunk_size), start=1):
+                if canonical is not None:
+                    texts = [canonical.text_for(row) for row in rows]
+                else:
+                    texts = [row.get(TEXT_COLUMN, "") or "" for row in rows]
+                keys = [_text_key(text, max_length, fingerprint) for text in texts]
 
-    if len(embeddings) != len(rows):
-        raise RuntimeError("Embedding count does not match row count.")
+                # Encode each distinct text once, skipping those already checkpointed.
+                todo: Dict[str, str] = {}
+                for key, text in zip(keys, texts):
+                    if key not in checkpoint and key not in todo:
+                        todo[key] = text
+                todo_keys = list(todo)
+                todo_texts = list(todo.values())
+                print(
+                    f"[info] Chunk {chunk_idx}: encoding {len(todo_texts)} of {len(texts)} course texts "
+                    f"(batch size {batch_size})..."
+                )
+                for start, dense in _iter_encoded_batches(model, todo_texts, batch_size, max_length):
+                    for key, vector in zip(todo_keys[start : start + len(dense)], dense):
+                        checkpoint.add(key, json.dumps(vector, ensure_ascii=False, separators=(",", ":")))
+                    checkpoint.batch_done()
 
-    for row, vector in zip(rows, embeddings):
-        row[EMBEDDING_COLUMN] = json.dumps(vector, ensure_ascii=False, separators=(",", ":"))
+                for row, key in zip(rows, keys):
+                    serialized = checkpoint.get(key)
+                    if serialized is None:
+                        raise RuntimeError("Embedding count does not match row count.")
+                    row[EMBEDDING_COLUMN] = serialized
+                writer.writerows(rows)
+                total_rows += len(rows)
+    except BaseException:
+        checkpoint.close()
+        print(f"[info] Progress saved to {checkpoint_path}; rerun with --resume to continue.")
+        raise
+    checkpoint.close(remove=True)
 
-    _write_rows(csv_path, rows, fieldnames)
+    print(f"[info] Encoded {total_rows} course texts.")
     print(f"[done] Updated {csv_path} with '{EMBEDDING_COLUMN}' column.")
     return 0
 
@@ -6,27 +6,88 @@ BGEM3 embedding (reusing the existing JSON-encoded vector or creating one on the
 fly), encodes four aspect descriptions from ``data/aspects.json``, and writes
 per-aspect cosine/dot similarities plus a softmax score back into the CSV.
 
+Aspect vectors are cached next to ``aspects.json`` (``aspects.vectors.npz``)
+under a hash of the aspect texts and model settings. The model is loaded
+lazily, so when every course already has an embedding and the cache is warm
+the script never loads BGE-M3.
+
+Dataset-wide calibration (z-score or min-max per aspect) can be frozen with
+``--fit calibration.json``. ``--apply calibration.json`` then scores new or
+changed courses (e.g. a small delta CSV, optionally with ``--output``) against
+those parameters in a single pass, without touching the rest of the corpus.
+
+The CSV is streamed in chunks: a first pass fills in missing embeddings,
+spills the (rows x aspects) cosine matrix to a scratch file and feeds it to a
+one-pass accumulator (``online_stats.RunningStats``: mean/std, min/max,
+histogram quantiles), and a second pass reads the spilled scores back chunk by
+chunk to write the score columns. Each pass writes to a temporary file that
+atomically replaces its target, so memory stays flat as the corpus grows.
+
+Experiment sweeps run in the same pass: ``--aspect-set NAME=PATH`` adds further
+aspect sets (JSON objects mapping label -> description), and ``--sweep-tau``,
+``--sweep-mode`` and ``--sweep-calibrate`` expand every set into a parameter
+grid. All aspect vectors are stacked into one matrix, so each course chunk is
+scored against every set with a single matrix multiplication. The default
+set and parameters keep their usual column names. Extra sets add
+``<set>__score_<label>_cos`` columns, and every other grid point adds
+``<variant>__score_<label>_sigmoid`` (or ``_<label>`` softmax) columns, for
+example ``default_single_zscore_tau0p1__score_skills`` (``tau1em05`` for
+1e-05). With ``--sweep-output`` those columns go to a separate ``row_id`` keyed
+CSV instead. Sweep columns already in the CSV from an earlier run are dropped
+when it is rewritten.
+
+With ``--clusters`` (from ``dedup_courses.py``), near-duplicate rows that still
+need a vector are encoded from their canonical row's text, once per run, and
+rows missing from ``--embedding-store`` borrow their canonical row's vector.
+
+For sharded runs, ``--stats-out`` saves each shard's accumulator; merge them
+with ``online_stats.py merge`` and pass the result back via ``--stats-in`` so
+every shard is calibrated against corpus-wide statistics.
+
 Usage::
 
     python compute_courses_scores.py [--csv-path PATH] [--aspects-path PATH]
-                                     [--batch-size N] [--tau 0.1]
+                                     [--batch-size N] [--chunk-size N]
+                                     [--tau 0.1]
                                      [--device auto|cpu|mps|cuda]
                                      [--max-length 8192]
                                      [--mode single|multi]
+                                     [--backend flag|onnx] [--encoder-url URL]
+                                     [--embedding-store PATH] [--clusters PATH]
+                                     [--fit MODEL.json | --apply MODEL.json]
+                                     [--stats-out STATS.json] [--stats-in STATS.json ...]
+                                     [--aspect-set NAME=PATH ...] [--sweep-tau T ...]
+                                     [--sweep-mode M ...] [--sweep-calibrate C ...]
+                                     [--sweep-output PATH]
+                                     [--output PATH]
 """
 
 from __future__ import annotations
 
 import argparse
-import csv
+import hashlib
+import itertools
 import json
+import re
 import sys
+import tempfile
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Iterable, List, Sequence
 
 import numpy as np
-import torch
-from FlagEmbedding import BGEM3FlagModel
+
+from csv_stream import (
+    DEFAULT_CHUNK_SIZE,
+    atomic_csv_writer,
+    iter_row_chunks,
+    read_fieldnames,
+    write_with_column_chunks,
+)
+from dedup_courses import CanonicalTexts
+from embedding_quant import EmbeddingStore, load_store
+from encoder_backends import EncoderBackend, LazyBackend, add_backend_arguments, backend_fingerprint
+from online_stats import RunningStats, merge_files, save_stats
 
 DEFAULT_CSV_PATH = Path(__file__).resolve().parent / "data" / "courses_scores.csv"
 DEFAULT_ASPECTS_PATH = Path(__file__).resolve().parent / "data" / "aspects.json"
@@ -44,6 +105,12 @@ ASPECT_CONFIG = [
     ("foundations", "entrepreneurship_foundations"),
 ]
 MODEL_NAME = "BAAI/bge-m3"
+ASPECT_CACHE_SUFFIX = ".vectors.npz"
+CALIBRATION_VERSION = 1
+DEFAULT_ASPECT_SET = "default"
+SET_NAME_RE = re.compile(r"^[A-Za-z0-9_]+$")
+# Columns written by an earlier sweep (older runs could leave "-" in the tau part).
+SWEEP_COLUMN_RE = re.compile(r"^[A-Za-z0-9_.+-]+__score_")
 
 
 def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
@@ -60,12 +127,29 @@ def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
         default=DEFAULT_ASPECTS_PATH,
         help="Path to aspects.json describing the four aspect texts (default: data/aspects.json).",
     )
+    parser.add_argument(
+        "--aspect-cache",
+        type=Path,
+        default=None,
+        help=f"Cached aspect vectors, keyed by aspect texts and model settings (default: <aspects-path stem>{ASPECT_CACHE_SUFFIX}).",
+    )
+    parser.add_argument(
+        "--no-aspect-cache",
+        action="store_true",
+        help="Always re-encode the aspect texts and do not write the cache.",
+    )
     parser.add_argument(
         "--batch-size",
         type=int,
         default=DEFAULT_BATCH_SIZE,
         help="Batch size when encoding missing course embeddings (default: %(default)s).",
     )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Number of CSV rows streamed through memory at a time (default: %(default)s).",
+    )
     parser.add_argument(
         "--tau",
         type=float,
@@ -92,6 +176,71 @@ def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
         default=None,
         help="Optional JSON file mapping aspect labels to bias values to subtract from raw cosine (e.g., {\"skills\":0.05}).",
     )
+    parser.add_argument(
+        "--fit",
+        type=Path,
+        default=None,
+        help="After scoring, save the calibration model (mode, tau, bias, per-aspect statistics) to this JSON file.",
+    )
+    parser.add_argument(
+        "--apply",
+        type=Path,
+        default=None,
+        help="Score rows independently against a frozen calibration model from --fit; overrides --mode/--tau/--calibrate/--bias-json.",
+    )
+    parser.add_argument(
+        "--stats-out",
+        type=Path,
+        default=None,
+        help="Save this run's streaming statistics of the (biased) raw cosines, for merging across shards.",
+    )
+    parser.add_argument(
+        "--stats-in",
+        type=Path,
+        nargs="+",
+        default=None,
+        help="Fit the calibration on these merged statistics files (e.g. from all shards) instead of this CSV alone.",
+    )
+    parser.add_argument(
+        "--aspect-set",
+        action="append",
+        default=[],
+        metavar="NAME=PATH",
+        help="Extra aspect set scored in the same pass: a JSON object mapping labels to aspect texts (repeatable).",
+    )
+    parser.add_argument(
+        "--sweep-tau",
+        type=float,
+        nargs="+",
+        default=None,
+        help="Temperatures to sweep for every aspect set (default: just --tau).",
+    )
+    parser.add_argument(
+        "--sweep-mode",
+        choices=["single", "multi"],
+        nargs="+",
+        default=None,
+        help="Scoring modes to sweep for every aspect set (default: just --mode).",
+    )
+    parser.add_argument(
+        "--sweep-calibrate",
+        choices=["none", "zscore", "minmax"],
+        nargs="+",
+        default=None,
+        help="Calibrations to sweep for every aspect set (default: just --calibrate).",
+    )
+    parser.add_argument(
+        "--sweep-output",
+        type=Path,
+        default=None,
+        help="Write extra aspect-set and sweep columns to this row_id-keyed CSV instead of the main CSV.",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Write the scored CSV here instead of updating --csv-path in place.",
+    )
     parser.add_argument(
         "--device",
         type=str,
@@ -99,6 +248,19 @@ def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
         default=DEFAULT_DEVICE,
         help="Device to run inference on (default: %(default)s).",
     )
+    add_backend_arguments(parser)
+    parser.add_argument(
+        "--embedding-store",
+        type=Path,
+        default=None,
+        help="Quantized .npz store from embedding_quant.py export; its vectors are scored in compact form instead of parsing the JSON column.",
+    )
+    parser.add_argument(
+        "--clusters",
+        type=Path,
+        default=None,
+        help="course_clusters.csv from dedup_courses.py; near-duplicate rows missing embeddings reuse their canonical row's vector.",
+    )
     parser.add_argument(
         "--max-length",
         type=int,
@@ -108,19 +270,6 @@ def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
     return parser.parse_args(argv)
 
 
-def _load_rows(csv_path: Path) -> tuple[List[dict], List[str]]:
-    if not csv_path.exists():
-        raise FileNotFoundError(f"CSV file not found: {csv_path}")
-
-    with csv_path.open("r", newline="", encoding="utf-8") as fp:
-        reader = csv.DictReader(fp)
-        fieldnames = list(reader.fieldnames or [])
-        if TEXT_COLUMN not in fieldnames:
-            raise ValueError(f"Missing '{TEXT_COLUMN}' column in {csv_path}")
-        rows = [row for row in reader]
-    return rows, fieldnames
-
-
 def _load_aspects(aspects_path: Path) -> List[str]:
     with aspects_path.open("r", encoding="utf-8") as fp:
         data = json.load(fp)
@@ -132,6 +281,100 @@ def _load_aspects(aspects_path: Path) -> List[str]:
     return texts
 
 
+@dataclass
+class AspectSet:
+    name: str
+    path: Path
+    labels: List[str]
+    texts: List[str]
+
+    def qualified_labels(self) -> List[str]:
+        if self.name == DEFAULT_ASPECT_SET:
+            return list(self.labels)
+        return [f"{self.name}.{label}" for label in self.labels]
+
+
+@dataclass(frozen=True)
+class Variant:
+    """One grid point: an aspect set scored with a given mode, calibration and temperature."""
+
+    aspect_set: str
+    mode: str
+    calibrate: str
+    tau: float
+
+    @property
+    def name(self) -> str:
+        # 0.1 -> "0p1", 1e-05 -> "1em05", 1e+06 -> "1e06": only [A-Za-z0-9_] in column names
+        tau = f"{self.tau:g}".replace(".", "p").replace("-", "m").replace("+", "")
+        return f"{self.aspect_set}_{self.mode}_{self.calibrate}_tau{tau}"
+
+
+def _load_aspect_set(spec: str) -> AspectSet:
+    name, sep, path = spec.partition("=")
+    if not sep or not path or not SET_NAME_RE.match(name) or name == DEFAULT_ASPECT_SET:
+        raise ValueError(f"--aspect-set expects NAME=PATH with NAME in [A-Za-z0-9_] (not '{DEFAULT_ASPECT_SET}'), got {spec!r}")
+    with Path(path).open("r", encoding="utf-8") as fp:
+        data = json.load(fp)
+    if not isinstance(data, dict) or not data:
+        raise ValueError(f"Aspect set {path} must be a non-empty JSON object mapping labels to texts")
+    for label, text in data.items():
+        if not SET_NAME_RE.match(label) or not isinstance(text, str):
+            raise ValueError(f"Aspect set {path}: label {label!r} must be [A-Za-z0-9_] and map to a string")
+    return AspectSet(name, Path(path), list(data), list(data.values()))
+
+
+def _build_variants(sets: Sequence[AspectSet], args: argparse.Namespace) -> List[Variant]:
+    """Primary variant first, then the rest of the (set x mode x calibrate x tau) grid."""
+    primary = Variant(DEFAULT_ASPECT_SET, args.mode, args.calibrate, float(args.tau))
+    variants = [primary]
+    grid = itertools.product(
+        [aspect_set.name for aspect_set in sets],
+        args.sweep_mode or [args.mode],
+        args.sweep_calibrate or [args.calibrate],
+        [float(t) for t in (args.sweep_tau or [args.tau])],
+    )
+    for point in grid:
+        variant = Variant(*point)
+        if variant not in variants:
+            variants.append(variant)
+    for variant in variants:
+        if variant.tau <= 0:
+            raise ValueError("tau must be positive")
+    return variants
+
+
+def _aspect_cache_key(
+    aspect_texts: Sequence[str], max_length: int, backend: str, labels: Sequence[str] | None = None
+) -> str:
+    labels = list(labels) if labels is not None else [label for label, _ in ASPECT_CONFIG]
+    payload = {
+        "model": MODEL_NAME,
+        "backend": backend,
+        "max_length": max_length,
+        "aspects": [[label, text] for label, text in zip(labels, aspect_texts)],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _load_aspect_cache(cache_path: Path, key: str) -> np.ndarray | None:
+    if not cache_path.exists():
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            if str(data["key"]) != key:
+                return None
+            return data["vectors"].astype(np.float32)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _save_aspect_cache(cache_path: Path, key: str, vectors: np.ndarray) -> None:
+    with tempfile.NamedTemporaryFile(dir=cache_path.parent, prefix=f".{cache_path.name}.", delete=False) as fp:
+        np.savez(fp, key=np.array(key), vectors=np.asarray(vectors, dtype=np.float32))
+    Path(fp.name).replace(cache_path)
+
+
 def _normalize_rows(mat: np.ndarray) -> np.ndarray:
     norms = np.linalg.norm(mat, axis=1, keepdims=True)
     norms[norms == 0] = 1.0
@@ -139,7 +382,7 @@ def _normalize_rows(mat: np.ndarray) -> np.ndarray:
 
 
 def _encode_texts(
-    model: BGEM3FlagModel, texts: Sequence[str], batch_size: int, max_length: int
+    model: EncoderBackend, texts: Sequence[str], batch_size: int, max_length: int
 ) -> np.ndarray:
     if not texts:
         return np.zeros((0, 0), dtype=np.float32)
@@ -166,16 +409,6 @@ def _encode_texts(
     return _normalize_rows(arr)
 
 
-def _resolve_device(choice: str) -> str:
-    if choice != "auto":
-        return choice
-    if torch.cuda.is_available():
-        return "cuda"
-    if getattr(torch.backends, "mps", None) and torch.backends.mps.is_available():
-        return "mps"
-    return "cpu"
-
-
 def _parse_embedding(value: str | None) -> np.ndarray | None:
     if not value:
         return None
@@ -190,6 +423,100 @@ def _parse_embedding(value: str | None) -> np.ndarray | None:
     return None
 
 
+def _chunk_vectors(
+    rows: List[dict],
+    model: EncoderBackend,
+    batch_size: int,
+    max_length: int,
+    canonical: CanonicalTexts | None = None,
+    encoded: dict[str, np.ndarray] | None = None,
+) -> np.ndarray:
+    """Return normalized course vectors for ``rows``, encoding (and storing) missing ones.
+
+    With ``canonical``, clustered rows are encoded from their canonical text, and
+    ``encoded`` remembers vectors by text across chunks so each text is encoded once.
+    """
+    course_vectors: List[np.ndarray | None] = [None] * len(rows)
+    missing: dict[str, List[int]] = {}
+
+    for idx, row in enumerate(rows):
+        emb = _parse_embedding(row.get(EMBEDDING_COLUMN))
+        if emb is not None:
+            course_vectors[idx] = emb
+            continue
+        text = canonical.text_for(row) if canonical is not None else row.get(TEXT_COLUMN, "") or ""
+        if encoded is not None and text in encoded:
+            course_vectors[idx] = encoded[text]
+            row[EMBEDDING_COLUMN] = json.dumps(encoded[text].tolist(), ensure_ascii=False, separators=(",", ":"))
+        else:
+            missing.setdefault(text, []).append(idx)
+
+    if missing:
+        n_rows = sum(len(indices) for indices in missing.values())
+        print(f"[info] Encoding {len(missing)} course texts for {n_rows} rows missing embeddings...")
+        new_embs = _encode_texts(model, list(missing), batch_size=batch_size, max_length=max_length)
+        for (text, indices), emb in zip(missing.items(), new_embs):
+            if encoded is not None:
+                encoded[text] = emb
+            serialized = json.dumps(emb.tolist(), ensure_ascii=False, separators=(",", ":"))
+            for idx in indices:
+                course_vectors[idx] = emb
+                rows[idx][EMBEDDING_COLUMN] = serialized
+
+    if any(vec is None for vec in course_vectors):
+        raise RuntimeError("Some course embeddings are still missing after encoding.")
+
+    return _normalize_rows(np.vstack([vec for vec in course_vectors if vec is not None]))
+
+
+def _chunk_raw_scores(
+    rows: List[dict],
+    aspect_matrix: np.ndarray,
+    model: EncoderBackend,
+    batch_size: int,
+    max_length: int,
+    store: EmbeddingStore | None = None,
+    store_index: dict[str, int] | None = None,
+    canonical: CanonicalTexts | None = None,
+    encoded: dict[str, np.ndarray] | None = None,
+) -> np.ndarray:
+    """Cosine scores of ``rows`` against the aspects, taking vectors from ``store`` when present.
+
+    Rows whose CSV embedding differs from the one the store was exported from
+    are scored from the CSV. Clustered rows missing from the store fall back to
+    their canonical row's vector.
+    """
+    if store is None or not store_index:
+        return _chunk_vectors(rows, model, batch_size, max_length, canonical, encoded) @ aspect_matrix.T
+
+    positions = [store_index.get(row.get("row_id") or "") for row in rows]
+    # a store exported before the embeddings were recomputed must not win over the CSV
+    stale = [
+        i for i, pos in enumerate(positions) if pos is not None and not store.is_current(pos, rows[i].get(EMBEDDING_COLUMN))
+    ]
+    if stale:
+        print(f"[warn] {len(stale)} rows have a newer embedding in the CSV than in the store; scoring them from the CSV")
+        for i in stale:
+            positions[i] = None
+    if canonical is not None:
+        stale_rows = set(stale)
+        positions = [
+            store_index.get(canonical.mapping.get(row.get("row_id") or "", ""))
+            if pos is None and i not in stale_rows
+            else pos
+            for i, (row, pos) in enumerate(zip(rows, positions))
+        ]
+    hits = [i for i, pos in enumerate(positions) if pos is not None]
+    misses = [i for i, pos in enumerate(positions) if pos is None]
+    raw = np.empty((len(rows), aspect_matrix.shape[0]), dtype=np.float32)
+    if hits:
+        raw[hits] = store.matrix.take([positions[i] for i in hits]).matmul(aspect_matrix.T)
+    if misses:
+        missing_rows = [rows[i] for i in misses]
+        raw[misses] = _chunk_vectors(missing_rows, model, batch_size, max_length, canonical, encoded) @ aspect_matrix.T
+    return raw
+
+
 def _softmax(scores: np.ndarray, tau: float) -> np.ndarray:
     if tau <= 0:
         raise ValueError("tau must be positive")
@@ -204,21 +531,45 @@ def _sigmoid(scores: np.ndarray, tau: float) -> np.ndarray:
     return 1.0 / (1.0 + np.exp(-scaled))
 
 
-def _ensure_fieldnames(fieldnames: List[str], extra: Sequence[str]) -> List[str]:
-    for col in extra:
-        if col not in fieldnames:
-            fieldnames.append(col)
-    return fieldnames
-
-
-def _write_rows(csv_path: Path, rows: List[dict], fieldnames: List[str]) -> None:
-    with csv_path.open("w", newline="", encoding="utf-8") as fp:
-        writer = csv.DictWriter(fp, fieldnames=fieldnames, extrasaction="ignore")
-        writer.writeheader()
-        writer.writerows(rows)
-
-
-def _load_biases(bias_path: Path | None) -> dict[str, float]:
+def _score_column_names(
+    mode: str,
+    labels: Sequence[str] | None = None,
+    cos_prefix: str | None = "",
+    prob_prefix: str = "",
+) -> List[str]:
+    """Cosine and softmax/sigmoid column names; ``cos_prefix=None`` leaves out the cosine columns."""
+    labels = labels if labels is not None else [label for label, _ in ASPECT_CONFIG]
+    suffix = "" if mode == "single" else "_sigmoid"  # softmax | sigmoid
+    names: List[str] = []
+    for label in labels:
+        if cos_prefix is not None:
+            names.append(f"{cos_prefix}score_{label}_cos")
+        names.append(f"{prob_prefix}score_{label}{suffix}")
+    return names
+
+
+def _score_columns(
+    raw: np.ndarray,
+    cal: np.ndarray,
+    mode: str,
+    tau: float,
+    labels: Sequence[str] | None = None,
+    cos_prefix: str | None = "",
+    prob_prefix: str = "",
+) -> dict[str, List[float]]:
+    """Compute softmax/sigmoid once over the whole matrix and return one list per score column."""
+    labels = labels if labels is not None else [label for label, _ in ASPECT_CONFIG]
+    probs = _softmax(cal, tau) if mode == "single" else _sigmoid(cal, tau)
+    names = iter(_score_column_names(mode, labels, cos_prefix, prob_prefix))
+    columns: dict[str, List[float]] = {}
+    for aspect_idx in range(len(labels)):
+        if cos_prefix is not None:
+            columns[next(names)] = raw[:, aspect_idx].tolist()
+        columns[next(names)] = probs[:, aspect_idx].tolist()
+    return columns
+
+
+def _load_biases(bias_path: Path | None, labels: Sequence[str] | None = None) -> dict[str, float]:
     if not bias_path:
         return {}
     if not bias_path.exists():
@@ -228,7 +579,7 @@ def _load_biases(bias_path: Path | None) -> dict[str, float]:
     if not isinstance(data, dict):
         raise ValueError("Bias JSON must be an object mapping label->bias float")
     out: dict[str, float] = {}
-    for label, _ in ASPECT_CONFIG:
+    for label in labels if labels is not None else [label for label, _ in ASPECT_CONFIG]:
         val = data.get(label, 0.0)
         try:
             out[label] = float(val)
@@ -237,129 +588,329 @@ def _load_biases(bias_path: Path | None) -> dict[str, float]:
     return out
 
 
-def _apply_calibration(raw: np.ndarray, mode: str) -> tuple[np.ndarray, dict]:
+def _fit_calibration(stats: RunningStats, mode: str) -> dict:
+    """Derive calibration parameters from streamed per-aspect statistics."""
     if mode == "none":
-        return raw, {"type": "none"}
+        return {"type": "none"}
+    if stats.count == 0:
+        raise ValueError("Cannot fit a calibration on zero rows")
     if mode == "zscore":
-        mu = raw.mean(axis=0, keepdims=True)
-        sd = raw.std(axis=0, keepdims=True)
+        sd = stats.std.astype(np.float32)
         sd[sd == 0] = 1.0
-        adj = (raw - mu) / sd
-        return adj, {"type": "zscore", "mean": mu.squeeze().tolist(), "std": sd.squeeze().tolist()}
+        return {"type": "zscore", "mean": stats.mean.astype(np.float32).tolist(), "std": sd.tolist()}
     if mode == "minmax":
-        mn = raw.min(axis=0, keepdims=True)
-        mx = raw.max(axis=0, keepdims=True)
+        return {
+            "type": "minmax",
+            "min": stats.min.astype(np.float32).tolist(),
+            "max": stats.max.astype(np.float32).tolist(),
+        }
+    raise ValueError(f"Unknown calibration mode: {mode}")
+
+
+def _slice_calibration(stats: dict, columns: slice) -> dict:
+    return {key: value[columns] if isinstance(value, list) else value for key, value in stats.items()}
+
+
+def _calibrate(raw: np.ndarray, stats: dict) -> np.ndarray:
+    """Apply fitted (possibly frozen) calibration statistics to raw scores."""
+    mode = stats.get("type")
+    if mode == "none":
+        return raw
+    if mode == "zscore":
+        mu = np.asarray(stats["mean"], dtype=np.float32)[None, :]
+        sd = np.asarray(stats["std"], dtype=np.float32)[None, :]
+        return (raw - mu) / sd
+    if mode == "minmax":
+        mn = np.asarray(stats["min"], dtype=np.float32)[None, :]
+        mx = np.asarray(stats["max"], dtype=np.float32)[None, :]
         denom = (mx - mn)
         denom[denom == 0] = 1.0
         adj = (raw - mn) / denom
         # scale to roughly center at 0 using affine map to [-1,1]
         adj = adj * 2.0 - 1.0
-        return adj, {"type": "minmax", "min": mn.squeeze().tolist(), "max": mx.squeeze().tolist()}
+        return adj
     raise ValueError(f"Unknown calibration mode: {mode}")
 
 
+def _save_calibration(path: Path, model: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(json.dumps(model, indent=2) + "\n", encoding="utf-8")
+    tmp_path.replace(path)
+
+
+def _load_calibration(path: Path) -> dict:
+    if not path.exists():
+        raise FileNotFoundError(f"Calibration model not found: {path}")
+    with path.open("r", encoding="utf-8") as fp:
+        model = json.load(fp)
+    if model.get("version") != CALIBRATION_VERSION:
+        raise ValueError(f"Unsupported calibration model version in {path}: {model.get('version')!r}")
+    labels = [label for label, _ in ASPECT_CONFIG]
+    if model.get("aspects") != labels:
+        raise ValueError(f"Calibration model {path} was fitted for aspects {model.get('aspects')}, expected {labels}")
+    return model
+
+
 def main(argv: Iterable[str] | None = None) -> int:
     args = _parse_args(argv or sys.argv[1:])
     csv_path = args.csv_path
     aspects_path = args.aspects_path
     batch_size = max(1, args.batch_size)
+    chunk_size = max(1, args.chunk_size)
     tau = float(args.tau)
     max_length = max(1, args.max_length)
     mode = args.mode
     calib_mode = args.calibrate
-    bias_map = _load_biases(args.bias_json)
-
-    rows, fieldnames = _load_rows(csv_path)
+    output_path = args.output or csv_path
+
+    sets = [AspectSet(DEFAULT_ASPECT_SET, aspects_path, [label for label, _ in ASPECT_CONFIG], _load_aspects(aspects_path))]
+    for spec in args.aspect_set:
+        sets.append(_load_aspect_set(spec))
+    if len({aspect_set.name for aspect_set in sets}) != len(sets):
+        raise ValueError("Aspect set names must be unique")
+    variants = _build_variants(sets, args)
+    all_labels = [label for aspect_set in sets for label in aspect_set.qualified_labels()]
+    set_columns: dict[str, slice] = {}
+    offset = 0
+    for aspect_set in sets:
+        set_columns[aspect_set.name] = slice(offset, offset + len(aspect_set.labels))
+        offset += len(aspect_set.labels)
+    if args.apply and len(variants) > 1:
+        raise ValueError("--apply scores with one frozen calibration; drop --aspect-set/--sweep-* options")
+    bias_map = _load_biases(args.bias_json, sorted({label for aspect_set in sets for label in aspect_set.labels}))
+
+    fieldnames = read_fieldnames(csv_path, required=[TEXT_COLUMN])
     if EMBEDDING_COLUMN not in fieldnames:
         fieldnames.append(EMBEDDING_COLUMN)
+    # Sweep columns from an earlier run are dropped; this run writes its own.
+    stale_sweep = [col for col in fieldnames if SWEEP_COLUMN_RE.match(col)]
+    if stale_sweep:
+        fieldnames = [col for col in fieldnames if col not in stale_sweep]
+        print(f"[info] Dropping {len(stale_sweep)} sweep columns from a previous run")
+
+    store: EmbeddingStore | None = None
+    store_index: dict[str, int] | None = None
+    if args.embedding_store:
+        store = load_store(args.embedding_store)
+        store_index = store.index()
+        print(f"[info] Scoring {len(store.row_ids)} {store.matrix.kind} vectors from {args.embedding_store}")
+        if store.digests is None:
+            print(
+                f"[warn] {args.embedding_store} predates per-row embedding digests, so vectors recomputed since "
+                "the export cannot be detected; re-export it with embedding_quant.py export"
+            )
+
+    canonical: CanonicalTexts | None = None
+    encoded: dict[str, np.ndarray] | None = None
+    if args.clusters:
+        canonical = CanonicalTexts.load(args.clusters, csv_path, chunk_size)
+        encoded = {}
+        print(f"[info] {len(canonical)} near-duplicate rows reuse their canonical row's vector ({args.clusters})")
+
+    # The model is only loaded if something actually needs encoding.
+    model = LazyBackend(
+        args.backend,
+        device=args.device,
+        encoder_url=args.encoder_url,
+        onnx_model=args.onnx_model,
+    )
 
-    aspect_texts = _load_aspects(aspects_path)
-    device = _resolve_device(args.device)
-    print(f"[info] Loading model '{MODEL_NAME}' on {device}...")
-    model = BGEM3FlagModel(MODEL_NAME, use_fp16=False, device=device)
-
-    print("[info] Encoding aspect texts...")
-    aspect_vectors = _encode_texts(model, aspect_texts, batch_size=4, max_length=max_length)
-    if aspect_vectors.shape[0] != len(ASPECT_CONFIG):
-        raise RuntimeError("Aspect encoding failed: unexpected shape")
-
-    course_vectors: List[np.ndarray | None] = [None] * len(rows)
-    missing_indices: List[int] = []
-    missing_texts: List[str] = []
-
-    for idx, row in enumerate(rows):
-        emb = _parse_embedding(row.get(EMBEDDING_COLUMN))
-        if emb is None:
-            missing_indices.append(idx)
-            missing_texts.append(row.get(TEXT_COLUMN, "") or "")
+    fingerprint = backend_fingerprint(args.backend, encoder_url=args.encoder_url, onnx_model=args.onnx_model)
+    primary_key = _aspect_cache_key(sets[0].texts, max_length, fingerprint)
+    set_vectors: List[np.ndarray] = []
+    for aspect_set in sets:
+        # each set is cached next to its own JSON (--aspect-cache overrides the default set's)
+        if args.no_aspect_cache:
+            cache_path = None
+        elif aspect_set.name == DEFAULT_ASPECT_SET and args.aspect_cache:
+            cache_path = args.aspect_cache
         else:
-            course_vectors[idx] = emb
-
-    if missing_indices:
-        print(f"[info] Encoding {len(missing_indices)} course texts missing embeddings...")
-        new_embs = _encode_texts(model, missing_texts, batch_size=batch_size, max_length=max_length)
-        for idx, emb in zip(missing_indices, new_embs):
-            course_vectors[idx] = emb
-            rows[idx][EMBEDDING_COLUMN] = json.dumps(emb.tolist(), ensure_ascii=False, separators=(",", ":"))
-
-    if any(vec is None for vec in course_vectors):
-        raise RuntimeError("Some course embeddings are still missing after encoding.")
-
-    course_matrix = np.vstack([vec for vec in course_vectors if vec is not None])
-    course_matrix = _normalize_rows(course_matrix)
-    aspect_matrix = _normalize_rows(aspect_vectors)
-
-    raw_scores = course_matrix @ aspect_matrix.T
-
-    # subtract per-aspect biases if provided
+            cache_path = aspect_set.path.with_suffix(ASPECT_CACHE_SUFFIX)
+        cache_key = _aspect_cache_key(aspect_set.texts, max_length, fingerprint, aspect_set.labels)
+        vectors = _load_aspect_cache(cache_path, cache_key) if cache_path else None
+        if vectors is not None:
+            print(f"[info] Reusing cached aspect vectors from {cache_path}")
+        else:
+            print(f"[info] Encoding aspect texts ({aspect_set.name})...")
+            vectors = _encode_texts(model, aspect_set.texts, batch_size=4, max_length=max_length)
+            if cache_path:
+                _save_aspect_cache(cache_path, cache_key, vectors)
+        if vectors.shape[0] != len(aspect_set.labels):
+            raise RuntimeError("Aspect encoding failed: unexpected shape")
+        set_vectors.append(vectors)
+    # Every aspect set is stacked into one matrix: one matmul per chunk scores them all.
+    aspect_matrix = _normalize_rows(np.vstack(set_vectors))
+    if len(sets) > 1 or len(variants) > 1:
+        print(f"[info] Scoring {len(sets)} aspect sets ({len(all_labels)} aspects) in {len(variants)} variants")
+
+    frozen = _load_calibration(args.apply) if args.apply else None
+    if frozen is not None:
+        mode, tau, bias_map = frozen["mode"], float(frozen["tau"]), frozen["bias"]
+        calib_mode = frozen["calibration"]["type"]
+        if frozen.get("aspect_key") != primary_key:
+            print(f"[warn] {args.apply} was fitted with different aspect texts or model settings.")
+        print(f"[info] Applying frozen calibration from {args.apply} (mode={mode}, calibrate={calib_mode}, tau={tau})")
+
+    bias_vec = None
     if bias_map:
-        bias_vec = np.array([bias_map[label] for label, _ in ASPECT_CONFIG], dtype=np.float32)
-        raw_scores = raw_scores - bias_vec[None, :]
-
-    # apply calibration over the dataset if requested
-    cal_scores, cal_stats = _apply_calibration(raw_scores, calib_mode)
-
-    if mode == "single":
-        softmax_scores = _softmax(cal_scores, tau)
-        sigmoid_scores = None
-    else:  # multi
-        softmax_scores = None
-        sigmoid_scores = _sigmoid(cal_scores, tau)
-
-    new_columns = []
-    if mode == "single":
-        for label, _ in ASPECT_CONFIG:
-            new_columns.extend([
-                f"score_{label}_cos",
-                f"score_{label}",  # softmax
-            ])
-    else:  # multi
-        for label, _ in ASPECT_CONFIG:
-            new_columns.extend([
-                f"score_{label}_cos",
-                f"score_{label}_sigmoid",
-            ])
-
-    fieldnames = _ensure_fieldnames(fieldnames, new_columns)
+        bias_vec = np.array(
+            [bias_map.get(label, 0.0) for aspect_set in sets for label in aspect_set.labels], dtype=np.float32
+        )
 
-    for idx, row in enumerate(rows):
-        raw = raw_scores[idx]
-        cal = cal_scores[idx]
-        if mode == "single":
-            soft = _softmax(cal[np.newaxis, :], tau)[0]
-            for aspect_idx, (label, _) in enumerate(ASPECT_CONFIG):
-                row[f"score_{label}_cos"] = float(raw[aspect_idx])
-                row[f"score_{label}"] = float(soft[aspect_idx])
-        else:  # multi
-            sig = _sigmoid(cal[np.newaxis, :], tau)[0]
-            for aspect_idx, (label, _) in enumerate(ASPECT_CONFIG):
-                row[f"score_{label}_cos"] = float(raw[aspect_idx])
-                row[f"score_{label}_sigmoid"] = float(sig[aspect_idx])
-
-    _write_rows(csv_path, rows, fieldnames)
+    if frozen is not None:
+        # Frozen parameters make every row independent: score in one streaming pass.
+        cal_stats = frozen["calibration"]
+        out_fieldnames = fieldnames + [col for col in _score_column_names(mode) if col not in fieldnames]
+        scored = 0
+        with atomic_csv_writer(output_path, out_fieldnames) as writer:
+            for rows in iter_row_chunks(csv_path, chunk_size):
+                raw = _chunk_raw_scores(
+                    rows, aspect_matrix, model, batch_size, max_length, store, store_index, canonical, encoded
+                )
+                if bias_vec is not None:
+                    raw = raw - bias_vec[None, :]
+                for col, values in _score_columns(raw, _calibrate(raw, cal_stats), mode, tau).items():
+                    for row, value in zip(rows, values):
+                        row[col] = value
+                writer.writerows(rows)
+                scored += len(rows)
+        print(f"[done] Scored {scored} rows into {output_path} with frozen calibration.")
+        return 0
+
+    # Output columns: the primary variant keeps the historical names; extra
+    # sets get namespaced cosine columns and every other variant its own
+    # probability columns.
+    primary, extra_variants = variants[0], variants[1:]
+    sweep_names: List[str] = []
+    for aspect_set in sets[1:]:
+        sweep_names.extend(
+            f"{aspect_set.name}__score_{label}_cos" for label in aspect_set.labels
+        )
+    set_labels = {aspect_set.name: aspect_set.labels for aspect_set in sets}
+    for variant in extra_variants:
+        sweep_names.extend(
+            _score_column_names(variant.mode, set_labels[variant.aspect_set], None, f"{variant.name}__")
+        )
+
+    width = len(all_labels)
+    with tempfile.TemporaryDirectory(prefix=".scores-", dir=csv_path.parent) as staging_dir:
+        # Pass 1: fill in missing embeddings chunk by chunk, spill the
+        # (rows x aspects) cosines to disk and fold them into running stats.
+        staged_path = Path(staging_dir) / csv_path.name
+        raw_path = Path(staging_dir) / "raw_scores.f32"
+        stats = RunningStats(width)
+        row_ids: List[str] = []
+        with atomic_csv_writer(staged_path, fieldnames) as writer, raw_path.open("wb") as raw_fp:
+            for rows in iter_row_chunks(csv_path, chunk_size):
+                raw = _chunk_raw_scores(
+                    rows, aspect_matrix, model, batch_size, max_length, store, store_index, canonical, encoded
+                )
+                # subtract per-aspect biases if provided
+                if bias_vec is not None:
+                    raw = raw - bias_vec[None, :]
+                raw = np.asarray(raw, dtype=np.float32)
+                stats.update(raw)
+                raw.tofile(raw_fp)
+                writer.writerows(rows)
+                if args.sweep_output:
+                    row_ids.extend(row.get("row_id", "") for row in rows)
+
+        if args.stats_out:
+            save_stats(args.stats_out, stats, all_labels)
+            print(f"[info] Saved score statistics for {stats.count} rows to {args.stats_out}")
+        fit_stats = stats
+        if args.stats_in:
+            fit_stats, stats_labels = merge_files(args.stats_in)
+            if stats_labels is not None and stats_labels != all_labels:
+                raise ValueError(f"Statistics in {args.stats_in} are for aspects {stats_labels}, expected {all_labels}")
+            print(f"[info] Calibrating against merged statistics of {fit_stats.count} rows")
+
+        # calibration parameters over the dataset, fitted once per calibration
+        # type and sliced per aspect set
+        fitted: dict[str, dict] = {}
+        for variant in variants:
+            if variant.calibrate not in fitted:
+                fitted[variant.calibrate] = (
+                    _fit_calibration(fit_stats, variant.calibrate) if stats.count else {"type": "none"}
+                )
+        cal_stats = _slice_calibration(fitted[primary.calibrate], set_columns[DEFAULT_ASPECT_SET])
+
+        # Pass 2: read the spilled cosines back per chunk and attach the score
+        # columns to the staged rows.
+        if stats.count:
+            raw_scores = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(stats.count, width))
+        else:
+            raw_scores = np.zeros((0, width), dtype=np.float32)
+
+        def sweep_columns_for(start: int, stop: int) -> dict[str, List[float]]:
+            raw = np.asarray(raw_scores[start:stop])
+            columns: dict[str, List[float]] = {}
+            for aspect_set in sets[1:]:
+                set_raw = raw[:, set_columns[aspect_set.name]]
+                for idx, label in enumerate(aspect_set.labels):
+                    columns[f"{aspect_set.name}__score_{label}_cos"] = set_raw[:, idx].tolist()
+            calibrated: dict[tuple[str, str], np.ndarray] = {}
+            for variant in extra_variants:
+                columns_slice = set_columns[variant.aspect_set]
+                key = (variant.aspect_set, variant.calibrate)
+                if key not in calibrated:
+                    calibrated[key] = _calibrate(
+                        raw[:, columns_slice], _slice_calibration(fitted[variant.calibrate], columns_slice)
+                    )
+                columns.update(_score_columns(
+                    raw[:, columns_slice],
+                    calibrated[key],
+                    variant.mode,
+                    variant.tau,
+                    set_labels[variant.aspect_set],
+                    None,
+                    f"{variant.name}__",
+                ))
+            return columns
+
+        def columns_for(start: int, stop: int) -> dict[str, List[float]]:
+            raw = np.asarray(raw_scores[start:stop, set_columns[DEFAULT_ASPECT_SET]])
+            columns = _score_columns(raw, _calibrate(raw, cal_stats), primary.mode, primary.tau)
+            if sweep_names and not args.sweep_output:
+                columns.update(sweep_columns_for(start, stop))
+            return columns
+
+        column_names = _score_column_names(primary.mode)
+        if not args.sweep_output:
+            column_names += sweep_names
+        write_with_column_chunks(staged_path, output_path, column_names, columns_for, chunk_size)
+
+        if args.sweep_output and sweep_names:
+            with atomic_csv_writer(args.sweep_output, ["row_id"] + sweep_names) as writer:
+                for start in range(0, stats.count, chunk_size):
+                    stop = min(start + chunk_size, stats.count)
+                    columns = sweep_columns_for(start, stop)
+                    for offset_idx, row_id in enumerate(row_ids[start:stop]):
+                        row = {col: values[offset_idx] for col, values in columns.items()}
+                        row["row_id"] = row_id
+                        writer.writerow(row)
+            print(f"[info] Wrote {len(sweep_names)} sweep columns to {args.sweep_output}")
+        del raw_scores
+
+    if args.fit:
+        _save_calibration(args.fit, {
+            "version": CALIBRATION_VERSION,
+            "aspects": [label for label, _ in ASPECT_CONFIG],
+            "aspect_key": primary_key,
+            "mode": mode,
+            "tau": tau,
+            "bias": {label: float(bias_map.get(label, 0.0)) for label, _ in ASPECT_CONFIG},
+            "calibration": cal_stats,
+            "rows": int(fit_stats.count),
+        })
+        print(f"[info] Saved calibration model to {args.fit}")
+
+    if not model.loaded:
+        print("[info] All embeddings were cached; no model was loaded.")
     if calib_mode != "none":
         print(f"[info] Applied calibration: {cal_stats.get('type')}.")
-    print(f"[done] Updated {csv_path} with aspect scores using tau={tau}.")
+    print(f"[done] Updated {output_path} with aspect scores using tau={tau}.")
     return 0
 
 
@@ -0,0 +1,455 @@
+"""In-process hybrid (BM25 + dense) search over the scraped course corpus.
+
+Mirrors the ``hybrid_search_courses`` SQL function without needing Supabase:
+``epfl_courses.csv`` and the course embeddings are loaded once into
+
+* a BM25 inverted index over course name, keywords and course text (fields are
+  weighted BM25F-style; per-posting impacts are precomputed at build time so a
+  query is just a few slice additions), and
+* a dense matrix of normalized BGEM3 vectors (from ``courses_scores.csv`` or a
+  quantized store written by ``embedding_quant.py export``).
+
+A hybrid query scores ``w_fts * bm25 + w_dense * cosine`` like the SQL
+function: BM25 is scaled to [0, 1] by the best match, and only the top
+``max(k, 100)`` dense neighbours contribute a dense score. Filters on section,
+credits and level (``BA3``, ``MA``, ``Minor``, ``PhD``...) are precomputed
+boolean masks.
+
+Usage::
+
+    python course_search.py query "machine learning for robotics" [--k 10]
+                            [--section IN SC] [--level MA1] [--min-credits 4]
+                            [--w-fts 0.6] [--w-dense 0.4] [--no-dense]
+                            [--backend flag|onnx] [--encoder-url URL]
+    python course_search.py bench [--n-queries 200] [--repeat 3] [--k 10]
+
+``bench`` reuses course names as text queries and the matching course vectors
+as query embeddings, so it measures search latency without loading a model.
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import csv
+import re
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from csv_stream import DEFAULT_CHUNK_SIZE, iter_row_chunks, read_fieldnames
+from embedding_quant import EmbeddingStore, QuantizedMatrix, build_store, load_store, quantize
+from encoder_backends import add_backend_arguments, load_backend
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+DEFAULT_COURSES_CSV = DATA_DIR / "epfl_courses.csv"
+DEFAULT_SCORES_CSV = DATA_DIR / "courses_scores.csv"
+DEFAULT_K = 10
+DEFAULT_W_FTS = 0.6
+DEFAULT_W_DENSE = 0.4
+DENSE_CANDIDATES = 100  # like ``limit greatest(k, 100)`` in hybrid_search_courses
+BM25_K1 = 1.2
+BM25_B = 0.75
+FIELD_WEIGHTS = {"name": 3.0, "keywords": 2.0, "text": 1.0}
+MAX_LENGTH = 8192
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+LEVEL_RE = re.compile(r"^\s*([A-Za-z]+)(\d+)\s")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _parse_list(value: str) -> List[str]:
+    if not value:
+        return []
+    try:
+        parsed = ast.literal_eval(value)
+    except (SyntaxError, ValueError):
+        return []
+    if isinstance(parsed, (list, tuple)):
+        return [str(x).strip() for x in parsed if str(x).strip()]
+    return []
+
+
+def _levels(program_labels: Sequence[str]) -> set[str]:
+    """Level tokens of an offering, e.g. ``{"BA3", "BA"}`` for ``"BA3 Architecture"``."""
+    levels: set[str] = set()
+    for label in program_labels:
+        match = LEVEL_RE.match(label)
+        if match:
+            degree = match.group(1).upper()
+            levels.update({f"{degree}{match.group(2)}", degree})
+        elif label.lower().startswith("minor"):
+            levels.add("MINOR")
+        elif label.upper().startswith("MA PROJECT"):
+            levels.update({"MA PROJECT", "MA"})
+        elif label.lower().startswith(("edoc", "phd")):
+            levels.add("PHD")
+    return levels
+
+
+@dataclass
+class SearchHit:
+    row_id: str
+    course_code: str
+    course_name: str
+    section: str
+    credits: float
+    score: float
+    bm25: float
+    dense: float
+
+
+class CourseSearchIndex:
+    """BM25 postings, a dense matrix and filter masks over one row per course offering."""
+
+    def __init__(
+        self,
+        rows: List[Dict[str, str]],
+        texts: Dict[str, str],
+        vectors: EmbeddingStore | None = None,
+    ):
+        self.row_ids = [row["row_id"] for row in rows]
+        self.course_codes = [row.get("course_code", "") for row in rows]
+        self.course_names = [row.get("course_name", "") for row in rows]
+        self.sections = np.array([row.get("section", "") for row in rows], dtype=object)
+        self.credits = np.array([_parse_credits(row.get("credits")) for row in rows], dtype=np.float32)
+        self._section_masks: Dict[str, np.ndarray] = {}
+        for section in set(self.sections.tolist()):
+            self._section_masks[section] = self.sections == section
+        self._level_masks: Dict[str, np.ndarray] = {}
+        for idx, row in enumerate(rows):
+            for level in _levels(_parse_list(row.get("available_programs", ""))):
+                self._level_masks.setdefault(level, np.zeros(len(rows), dtype=bool))[idx] = True
+        self._build_bm25(rows, texts)
+        self._build_dense(vectors)
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+    def _build_bm25(self, rows: List[Dict[str, str]], texts: Dict[str, str]) -> None:
+        vocab: Dict[str, int] = {}
+        doc_terms: List[Dict[int, float]] = []
+        lengths = np.zeros(len(rows), dtype=np.float32)
+        for idx, row in enumerate(rows):
+            fields = {
+                "name": row.get("course_name", ""),
+                "keywords": " ".join(_parse_list(row.get("keywords", ""))),
+                "text": texts.get(row["row_id"], ""),
+            }
+            tf: Dict[int, float] = {}
+            for field, value in fields.items():
+                weight = FIELD_WEIGHTS[field]
+                for token in tokenize(value):
+                    term = vocab.setdefault(token, len(vocab))
+                    tf[term] = tf.get(term, 0.0) + weight
+            doc_terms.append(tf)
+            lengths[idx] = sum(tf.values())
+
+        # CSR postings: term -> (doc ids, precomputed BM25 impacts)
+        n_docs = len(rows)
+        avg_len = float(lengths.mean()) if n_docs else 0.0
+        df = np.zeros(len(vocab), dtype=np.int64)
+        for tf in doc_terms:
+            for term in tf:
+                df[term] += 1
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(df, out=offsets[1:])
+        docs = np.empty(offsets[-1], dtype=np.int32)
+        impacts = np.empty(offsets[-1], dtype=np.float32)
+        cursor = offsets[:-1].copy()
+        idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+        for doc, tf in enumerate(doc_terms):
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[doc] / avg_len) if avg_len else BM25_K1
+            for term, freq in tf.items():
+                pos = cursor[term]
+                docs[pos] = doc
+                impacts[pos] = idf[term] * freq * (BM25_K1 + 1.0) / (freq + norm)
+                cursor[term] += 1
+        self.vocab = vocab
+        self._offsets = offsets
+        self._docs = docs
+        self._impacts = impacts
+
+    def _build_dense(self, vectors: EmbeddingStore | None) -> None:
+        self.dense: QuantizedMatrix | None = None
+        self.dense_missing = len(self.row_ids)
+        if vectors is None:
+            return
+        index = vectors.index()
+        positions = [index.get(row_id) for row_id in self.row_ids]
+        present = np.array([pos is not None for pos in positions], dtype=bool)
+        dim = vectors.matrix.shape[1]
+        if present.all():
+            self.dense = vectors.matrix.take(positions)
+        else:
+            # rows without an embedding get a zero vector (never a dense match)
+            full = np.zeros((len(self.row_ids), dim), dtype=np.float32)
+            hit_rows = np.flatnonzero(present)
+            full[hit_rows] = vectors.matrix.take([positions[i] for i in hit_rows]).dequantize()
+            self.dense = quantize(full, vectors.matrix.kind)
+        self.dense_missing = int((~present).sum())
+
+    def bm25_scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term = self.vocab.get(token)
+            if term is None:
+                continue
+            start, stop = self._offsets[term], self._offsets[term + 1]
+            scores[self._docs[start:stop]] += self._impacts[start:stop]
+        return scores
+
+    def dense_scores(self, query_vector: np.ndarray) -> np.ndarray:
+        if self.dense is None:
+            raise ValueError("No course embeddings loaded; dense search is unavailable")
+        vec = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vec))
+        if norm:
+            vec = vec / norm
+        return self.dense.matmul(vec[:, None])[:, 0]
+
+    def filter_mask(
+        self,
+        sections: Sequence[str] | None = None,
+        levels: Sequence[str] | None = None,
+        min_credits: float | None = None,
+        max_credits: float | None = None,
+    ) -> np.ndarray | None:
+        mask: np.ndarray | None = None
+
+        def both(a: np.ndarray | None, b: np.ndarray) -> np.ndarray:
+            return b if a is None else a & b
+
+        if sections:
+            empty = np.zeros(len(self), dtype=bool)
+            mask = both(mask, np.logical_or.reduce([self._section_masks.get(s, empty) for s in sections]))
+        if levels:
+            empty = np.zeros(len(self), dtype=bool)
+            wanted = [self._level_masks.get(level.strip().upper(), empty) for level in levels]
+            mask = both(mask, np.logical_or.reduce(wanted))
+        if min_credits is not None:
+            mask = both(mask, self.credits >= min_credits)
+        if max_credits is not None:
+            mask = both(mask, self.credits <= max_credits)
+        return mask
+
+    def search(
+        self,
+        query: str,
+        query_vector: np.ndarray | None = None,
+        k: int = DEFAULT_K,
+        w_fts: float = DEFAULT_W_FTS,
+        w_dense: float = DEFAULT_W_DENSE,
+        sections: Sequence[str] | None = None,
+        levels: Sequence[str] | None = None,
+        min_credits: float | None = None,
+        max_credits: float | None = None,
+    ) -> List[SearchHit]:
+        k = max(1, k)
+        mask = self.filter_mask(sections, levels, min_credits, max_credits)
+        bm25 = self.bm25_scores(query) if w_fts else np.zeros(len(self), dtype=np.float32)
+        if mask is not None:
+            bm25[~mask] = 0.0
+        best = float(bm25.max()) if len(self) else 0.0
+        fts = bm25 / best if best > 0 else bm25
+
+        dense = np.zeros(len(self), dtype=np.float32)
+        if query_vector is not None and w_dense:
+            cos = self.dense_scores(query_vector)
+            if mask is not None:
+                cos[~mask] = -np.inf
+            n_cand = min(max(k, DENSE_CANDIDATES), len(self))
+            cand = np.argpartition(-cos, n_cand - 1)[:n_cand]
+            cand = cand[np.isfinite(cos[cand]) & (cos[cand] > 0)]
+            dense[cand] = cos[cand]
+
+        score = w_fts * fts + w_dense * dense
+        candidates = np.flatnonzero((fts > 0) | (dense > 0))
+        if candidates.size > k:
+            top = candidates[np.argpartition(-score[candidates], k - 1)[:k]]
+        else:
+            top = candidates
+        top = top[np.argsort(-score[top], kind="stable")]
+        return [
+            SearchHit(
+                row_id=self.row_ids[i],
+                course_code=self.course_codes[i],
+                course_name=self.course_names[i],
+                section=str(self.sections[i]),
+                credits=float(self.credits[i]),
+                score=float(score[i]),
+                bm25=float(bm25[i]),
+                dense=float(dense[i]),
+            )
+            for i in top
+        ]
+
+
+def _parse_credits(value: str | None) -> float:
+    try:
+        return float(value) if value not in (None, "") else float("nan")
+    except ValueError:
+        return float("nan")
+
+
+def load_index(
+    courses_csv: Path = DEFAULT_COURSES_CSV,
+    scores_csv: Path | None = DEFAULT_SCORES_CSV,
+    embedding_store: Path | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> CourseSearchIndex:
+    """Read the course table, course texts and embeddings and build the index."""
+    read_fieldnames(courses_csv, required=["row_id", "course_name"])
+    with courses_csv.open("r", newline="", encoding="utf-8") as fp:
+        rows = [row for row in csv.DictReader(fp) if row.get("row_id")]
+
+    texts: Dict[str, str] = {}
+    vectors: EmbeddingStore | None = None
+    if scores_csv is not None and scores_csv.exists():
+        for chunk in iter_row_chunks(scores_csv, chunk_size):
+            for row in chunk:
+                if row.get("row_id"):
+                    texts[row["row_id"]] = row.get("text", "") or ""
+        if embedding_store is None and "embedding" in read_fieldnames(scores_csv):
+            vectors, _ = build_store(scores_csv, "float32", chunk_size)
+    if embedding_store is not None:
+        vectors = load_store(embedding_store)
+    return CourseSearchIndex(rows, texts, vectors)
+
+
+def _percentiles(samples: Sequence[float]) -> str:
+    arr = np.asarray(samples) * 1000.0
+    return (
+        f"mean {arr.mean():7.3f}  p50 {np.percentile(arr, 50):7.3f}  "
+        f"p95 {np.percentile(arr, 95):7.3f}  p99 {np.percentile(arr, 99):7.3f} ms"
+    )
+
+
+def _bench(index: CourseSearchIndex, args: argparse.Namespace) -> int:
+    rng = np.random.default_rng(args.seed)
+    n_queries = min(args.n_queries, len(index))
+    picks = rng.choice(len(index), size=n_queries, replace=False)
+    queries = [" ".join(tokenize(index.course_names[i])[:3]) for i in picks]
+    vectors = index.dense.dequantize()[picks] if index.dense is not None else None
+    sections = sorted({str(s) for s in index.sections.tolist()})[:3]
+
+    cases = [("bm25", dict(w_dense=0.0), False)]
+    if vectors is not None:
+        cases += [
+            ("dense", dict(w_fts=0.0), True),
+            ("hybrid", {}, True),
+            ("hybrid+filters", dict(sections=sections, min_credits=3), True),
+        ]
+    print(f"[info] {len(index)} offerings, {len(index.vocab)} terms, {n_queries} queries x {args.repeat} runs, k={args.k}")
+    for name, kwargs, use_dense in cases:
+        timings: List[float] = []
+        for _ in range(max(1, args.repeat)):
+            for qi, query in enumerate(queries):
+                vec = vectors[qi] if use_dense else None
+                started = time.perf_counter()
+                index.search(query, vec, k=args.k, **kwargs)
+                timings.append(time.perf_counter() - started)
+        print(f"{name:<15} {_percentiles(timings)}")
+    return 0
+
+
+def _query(index: CourseSearchIndex, args: argparse.Namespace) -> int:
+    vector = None
+    if not args.no_dense and index.dense is not None and args.w_dense:
+        model = load_backend(args.backend, device=args.device, encoder_url=args.encoder_url, onnx_model=args.onnx_model)
+        started = time.perf_counter()
+        output = model.encode(
+            [args.text],
+            return_dense=True,
+            return_sparse=False,
+            return_colbert_vecs=False,
+            max_length=MAX_LENGTH,
+        )
+        vector = np.asarray(output["dense_vecs"], dtype=np.float32)[0]
+        print(f"[info] Encoded query in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    started = time.perf_counter()
+    hits = index.search(
+        args.text,
+        vector,
+        k=args.k,
+        w_fts=args.w_fts,
+        w_dense=args.w_dense if vector is not None else 0.0,
+        sections=args.section,
+        levels=args.level,
+        min_credits=args.min_credits,
+        max_credits=args.max_credits,
+    )
+    elapsed = (time.perf_counter() - started) * 1000
+    for rank, hit in enumerate(hits, 1):
+        print(
+            f"{rank:>3}. {hit.score:6.4f}  {hit.course_code:<14} {hit.section:<5} "
+            f"{hit.credits:>4g} ECTS  {hit.course_name}  (bm25 {hit.bm25:.2f}, dense {hit.dense:.3f})"
+        )
+    print(f"[done] {len(hits)} results in {elapsed:.2f} ms")
+    return 0
+
+
+def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Local hybrid BM25 + dense search over EPFL courses.")
+    parser.add_argument(
+        "--courses-csv",
+        type=Path,
+        default=DEFAULT_COURSES_CSV,
+        help="Path to epfl_courses.csv (default: data/epfl_courses.csv).",
+    )
+    parser.add_argument(
+        "--scores-csv",
+        type=Path,
+        default=DEFAULT_SCORES_CSV,
+        help="courses_scores.csv with course texts and embeddings (default: data/courses_scores.csv).",
+    )
+    parser.add_argument(
+        "--embedding-store",
+        type=Path,
+        default=None,
+        help="Quantized .npz store from embedding_quant.py export, used instead of the CSV embeddings.",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    query = sub.add_parser("query", help="Run one hybrid query and print the results.")
+    query.add_argument("text", help="Query text.")
+    query.add_argument("--k", type=int, default=DEFAULT_K, help="Number of results (default: %(default)s).")
+    query.add_argument("--w-fts", type=float, default=DEFAULT_W_FTS, help="BM25 weight (default: %(default)s).")
+    query.add_argument("--w-dense", type=float, default=DEFAULT_W_DENSE, help="Dense weight (default: %(default)s).")
+    query.add_argument("--no-dense", action="store_true", help="BM25 only; do not load an encoder.")
+    query.add_argument("--section", nargs="+", default=None, help="Only these sections (e.g. IN SC).")
+    query.add_argument("--level", nargs="+", default=None, help="Only these levels (e.g. BA3, MA, Minor, PhD).")
+    query.add_argument("--min-credits", type=float, default=None, help="Minimum ECTS credits.")
+    query.add_argument("--max-credits", type=float, default=None, help="Maximum ECTS credits.")
+    query.add_argument("--device", choices=["auto", "cpu", "mps", "cuda"], default="auto", help="Model device.")
+    add_backend_arguments(query)
+
+    bench = sub.add_parser("bench", help="Measure search latency (no model needed).")
+    bench.add_argument("--k", type=int, default=DEFAULT_K, help="Number of results (default: %(default)s).")
+    bench.add_argument("--n-queries", type=int, default=200, help="Number of sampled queries (default: %(default)s).")
+    bench.add_argument("--repeat", type=int, default=3, help="Runs over the query set (default: %(default)s).")
+    bench.add_argument("--seed", type=int, default=0, help="Query sampling seed (default: %(default)s).")
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = _parse_args(argv or sys.argv[1:])
+    started = time.perf_counter()
+    index = load_index(args.courses_csv, args.scores_csv, args.embedding_store)
+    dense_info = f"{index.dense.kind} dense vectors" if index.dense is not None else "no dense vectors"
+    print(f"[info] Indexed {len(index)} offerings ({dense_info}) in {time.perf_counter() - started:.2f} s")
+    if args.command == "bench":
+        return _bench(index, args)
+    return _query(index, args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+"""Chunked CSV reading and atomic CSV rewriting shared by the batch jobs.
+
+``compute_courses_embeddings.py`` and ``compute_courses_scores.py`` rewrite
+``data/courses_scores.csv`` in place. Instead of materialising every row (and
+every JSON-encoded embedding) as a list of dicts, they read the file in chunks
+of ``chunk_size`` rows and stream the updated rows into a temporary file next
+to the target, which replaces the original only once the whole file has been
+written successfully.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+import stat
+import sys
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Mapping, Sequence, TextIO
+
+DEFAULT_CHUNK_SIZE = 256
+
+# Course texts and JSON embeddings easily exceed the default 128 KiB field limit.
+csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+
+
+def read_fieldnames(csv_path: Path, required: Sequence[str] = ()) -> List[str]:
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV file not found: {csv_path}")
+
+    with csv_path.open("r", newline="", encoding="utf-8") as fp:
+        reader = csv.DictReader(fp)
+        fieldnames = list(reader.fieldnames or [])
+    for col in required:
+        if col not in fieldnames:
+            raise ValueError(f"Missing '{col}' column in {csv_path}")
+    return fieldnames
+
+
+def iter_row_chunks(csv_path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[dict]]:
+    """Yield the rows of ``csv_path`` as lists of at most ``chunk_size`` dicts."""
+    chunk_size = max(1, chunk_size)
+    with csv_path.open("r", newline="", encoding="utf-8") as fp:
+        reader = csv.DictReader(fp)
+        chunk: List[dict] = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+@contextmanager
+def _atomic_text_file(csv_path: Path) -> Iterator[TextIO]:
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{csv_path.name}.", suffix=".tmp", dir=csv_path.parent)
+    tmp_path = Path(tmp_name)
+    try:
+        if csv_path.exists():
+            os.chmod(tmp_path, stat.S_IMODE(csv_path.stat().st_mode))
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as fp:
+            yield fp
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp_path, csv_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def atomic_csv_writer(csv_path: Path, fieldnames: Sequence[str]) -> Iterator[csv.DictWriter]:
+    """Write a CSV to a temp file in the target directory, then rename it over ``csv_path``.
+
+    The rename only happens if the ``with`` block exits cleanly; on error the
+    temp file is removed and the original CSV is left untouched.
+    """
+    with _atomic_text_file(csv_path) as fp:
+        writer = csv.DictWriter(fp, fieldnames=list(fieldnames), extrasaction="ignore")
+        writer.writeheader()
+        yield writer
+
+
+def write_with_column_chunks(
+    src_path: Path,
+    dst_path: Path,
+    column_names: Sequence[str],
+    columns_for: Callable[[int, int], Mapping[str, Sequence[Any]]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """Copy ``src_path`` to ``dst_path`` (atomically), setting ``column_names`` chunk by chunk.
+
+    ``columns_for(start, stop)`` returns each column's values for data rows
+    ``start:stop``, so only one chunk of values is in memory at a time. Columns
+    missing from the source header are appended in ``column_names`` order;
+    existing ones are overwritten in place. Returns the number of data rows.
+    """
+    chunk_size = max(1, chunk_size)
+    with src_path.open("r", newline="", encoding="utf-8") as src:
+        reader = csv.reader(src)
+        header = next(reader, [])
+        out_header = header + [col for col in column_names if col not in header]
+        positions = {col: out_header.index(col) for col in column_names}
+        width = len(out_header)
+        offset = 0
+        with _atomic_text_file(dst_path) as fp:
+            writer = csv.writer(fp)
+            writer.writerow(out_header)
+            while True:
+                chunk = list(islice(reader, chunk_size))
+                if not chunk:
+                    break
+                for row in chunk:
+                    if len(row) < width:
+                        row.extend([""] * (width - len(row)))
+                stop = offset + len(chunk)
+                for col, values in columns_for(offset, stop).items():
+                    pos = positions[col]
+                    for row, value in zip(chunk, values):
+                        row[pos] = value
+                writer.writerows(chunk)
+                offset = stop
+    return offset
@@ -0,0 +1,314 @@
+"""Find near-duplicate course texts and map each one to a canonical row.
+
+The same course often appears under several codes or sections (``AR-201(a)``,
+``AR-201(b)``, ...) with descriptions that differ by a word or two. Exact text
+hashing (as in ``compute_courses_embeddings.py``) misses those, so this stage
+groups them with MinHash LSH:
+
+1. every ``text`` is split into word ``--shingle-size``-grams, hashed with
+   ``zlib.crc32`` and reduced to a ``--num-perm`` MinHash signature;
+2. signatures are cut into ``--bands`` bands; rows sharing any band bucket are
+   candidate pairs (the bucket threshold is roughly ``(1/bands)^(bands/num_perm)``);
+3. candidates are confirmed by exact shingle Jaccard (``--min-jaccard``) and, when
+   embeddings are available (``embedding`` column or ``--embedding-store``), by
+   cosine similarity (``--min-cosine``).
+
+Clusters are stars around a canonical row (the first one in file order): a row
+only joins a cluster if it is confirmed against the canonical row itself, so the
+canonical embedding is a faithful stand-in for every member. The result is a
+small CSV listing rows in multi-row clusters::
+
+    row_id,canonical_row_id,cluster_size
+
+``compute_courses_embeddings.py --clusters`` and ``compute_courses_scores.py
+--clusters`` then encode the canonical text once and fan the vector out to every
+``row_id`` of the cluster.
+
+Usage::
+
+    python dedup_courses.py [--csv-path data/courses_scores.csv] [--out data/course_clusters.csv]
+                            [--embedding-store PATH] [--num-perm 128] [--bands 16]
+                            [--shingle-size 3] [--min-jaccard 0.7] [--min-cosine 0.95]
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import re
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from csv_stream import DEFAULT_CHUNK_SIZE, atomic_csv_writer, iter_row_chunks, read_fieldnames
+from embedding_quant import EmbeddingStore, build_store, load_store
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+DEFAULT_CSV_PATH = DATA_DIR / "courses_scores.csv"
+DEFAULT_OUT = DATA_DIR / "course_clusters.csv"
+TEXT_COLUMN = "text"
+EMBEDDING_COLUMN = "embedding"
+CLUSTER_COLUMNS = ["row_id", "canonical_row_id", "cluster_size"]
+DEFAULT_NUM_PERM = 128
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE_SIZE = 3
+DEFAULT_MIN_JACCARD = 0.7
+DEFAULT_MIN_COSINE = 0.95
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def shingles(text: str, size: int = DEFAULT_SHINGLE_SIZE) -> np.ndarray:
+    """Return the sorted unique crc32 hashes of the word ``size``-grams of ``text``."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) <= size:
+        grams = [" ".join(tokens)]
+    else:
+        grams = [" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams)))
+
+
+class MinHasher:
+    """Universal hashes ``(a * x + b) mod p`` truncated to 32 bits, one per permutation."""
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, int(_MERSENNE_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, int(_MERSENNE_PRIME), size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, hashes: np.ndarray) -> np.ndarray:
+        # uint64 products wrap around; like datasketch, that is fine for hashing purposes
+        permuted = ((self.a * hashes[None, :] + self.b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+def lsh_candidates(signatures: np.ndarray, bands: int) -> set[tuple[int, int]]:
+    """Return index pairs ``(i, j)``, ``i < j``, that share at least one band bucket."""
+    n, num_perm = signatures.shape
+    if num_perm % bands:
+        raise ValueError(f"--num-perm ({num_perm}) must be a multiple of --bands ({bands})")
+    rows_per_band = num_perm // bands
+    pairs: set[tuple[int, int]] = set()
+    for band in range(bands):
+        chunk = np.ascontiguousarray(signatures[:, band * rows_per_band : (band + 1) * rows_per_band])
+        keys = chunk.view(np.dtype((np.void, chunk.dtype.itemsize * rows_per_band))).ravel()
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], n]
+        for start, end in zip(starts, ends):
+            if end - start < 2:
+                continue
+            members = np.sort(order[start:end])
+            for pos, i in enumerate(members[:-1]):
+                for j in members[pos + 1 :]:
+                    pairs.add((int(i), int(j)))
+    return pairs
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    inter = np.intersect1d(a, b, assume_unique=True).size
+    union = a.size + b.size - inter
+    return inter / union if union else 1.0
+
+
+def cluster_rows(
+    texts: Sequence[str],
+    vectors: np.ndarray | None = None,
+    *,
+    num_perm: int = DEFAULT_NUM_PERM,
+    bands: int = DEFAULT_BANDS,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    min_jaccard: float = DEFAULT_MIN_JACCARD,
+    min_cosine: float = DEFAULT_MIN_COSINE,
+) -> np.ndarray:
+    """Return ``canonical[i]``: the index of row ``i``'s canonical row (itself for singletons).
+
+    ``vectors`` (normalized, one per text, NaN rows for missing) adds the cosine check.
+    """
+    n = len(texts)
+    hasher = MinHasher(num_perm)
+    sets = [shingles(text, shingle_size) for text in texts]
+    signatures = np.vstack([hasher.signature(s) for s in sets]) if n else np.zeros((0, num_perm), np.uint32)
+
+    neighbours: Dict[int, List[tuple[float, int]]] = {}
+    for i, j in lsh_candidates(signatures, bands):
+        sim = jaccard(sets[i], sets[j])
+        if sim < min_jaccard:
+            continue
+        if vectors is not None:
+            cos = float(vectors[i] @ vectors[j])
+            if not cos >= min_cosine:  # NaN (missing embedding) never confirms
+                continue
+        neighbours.setdefault(j, []).append((sim, i))
+
+    canonical = np.arange(n)
+    for j in range(n):
+        # join the most similar earlier row that is itself canonical
+        options = [(sim, -i) for sim, i in neighbours.get(j, ()) if canonical[i] == i]
+        if options:
+            canonical[j] = -max(options)[1]
+    return canonical
+
+
+def _store_vectors(store: EmbeddingStore, row_ids: Sequence[str]) -> np.ndarray:
+    index = store.index()
+    dim = store.matrix.shape[1]
+    vectors = np.full((len(row_ids), dim), np.nan, dtype=np.float32)
+    for pos, row_id in enumerate(row_ids):
+        src = index.get(row_id)
+        if src is not None:
+            vectors[pos] = store.matrix.dequantize(src, src + 1)[0]
+    return vectors
+
+
+def write_clusters(out_path: Path, row_ids: Sequence[str], canonical: np.ndarray) -> int:
+    sizes = np.bincount(canonical, minlength=len(row_ids))
+    written = 0
+    with atomic_csv_writer(out_path, CLUSTER_COLUMNS) as writer:
+        for pos, row_id in enumerate(row_ids):
+            root = canonical[pos]
+            if sizes[root] < 2:
+                continue
+            writer.writerow({"row_id": row_id, "canonical_row_id": row_ids[root], "cluster_size": int(sizes[root])})
+            written += 1
+    return written
+
+
+def load_clusters(path: Path) -> Dict[str, str]:
+    """Map each non-canonical ``row_id`` to its canonical ``row_id``."""
+    mapping: Dict[str, str] = {}
+    with path.open("r", newline="", encoding="utf-8") as fp:
+        for row in csv.DictReader(fp):
+            row_id = (row.get("row_id") or "").strip()
+            canonical = (row.get("canonical_row_id") or "").strip()
+            if row_id and canonical and row_id != canonical:
+                mapping[row_id] = canonical
+    return mapping
+
+
+class CanonicalTexts:
+    """Substitute each clustered row's text with its canonical row's text.
+
+    Jobs that key their work on the text (embedding checkpoint keys, per-chunk
+    encode lists) then encode a cluster once and reuse the vector for every row.
+    """
+
+    def __init__(self, mapping: Dict[str, str], texts: Dict[str, str]):
+        self.mapping = mapping
+        self.texts = texts
+
+    @classmethod
+    def load(cls, clusters_path: Path, csv_path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> "CanonicalTexts":
+        mapping = load_clusters(clusters_path)
+        wanted = set(mapping.values())
+        texts: Dict[str, str] = {}
+        if wanted:
+            for rows in iter_row_chunks(csv_path, chunk_size):
+                for row in rows:
+                    if row.get("row_id") in wanted:
+                        texts[row["row_id"]] = row.get(TEXT_COLUMN, "") or ""
+        missing = wanted - texts.keys()
+        if missing:
+            print(f"[warn] {len(missing)} canonical rows from {clusters_path} are not in {csv_path}; encoding their members as-is")
+            mapping = {row_id: canon for row_id, canon in mapping.items() if canon in texts}
+        return cls(mapping, texts)
+
+    def __len__(self) -> int:
+        return len(self.mapping)
+
+    def text_for(self, row: dict) -> str:
+        canonical = self.mapping.get(row.get("row_id", ""))
+        if canonical is not None:
+            return self.texts[canonical]
+        return row.get(TEXT_COLUMN, "") or ""
+
+
+def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate course texts with MinHash LSH.")
+    parser.add_argument(
+        "--csv-path",
+        type=Path,
+        default=DEFAULT_CSV_PATH,
+        help="CSV with row_id and text columns (default: data/courses_scores.csv).",
+    )
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT, help="Cluster CSV (default: data/course_clusters.csv).")
+    parser.add_argument(
+        "--embedding-store",
+        type=Path,
+        default=None,
+        help="Confirm candidates with vectors from an embedding_quant.py store (default: the CSV's embedding column, if any).",
+    )
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM, help="MinHash permutations (default: %(default)s).")
+    parser.add_argument("--bands", type=int, default=DEFAULT_BANDS, help="LSH bands (default: %(default)s).")
+    parser.add_argument("--shingle-size", type=int, default=DEFAULT_SHINGLE_SIZE, help="Words per shingle (default: %(default)s).")
+    parser.add_argument(
+        "--min-jaccard",
+        type=float,
+        default=DEFAULT_MIN_JACCARD,
+        help="Minimum exact shingle Jaccard to confirm a pair (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--min-cosine",
+        type=float,
+        default=DEFAULT_MIN_COSINE,
+        help="Minimum embedding cosine to confirm a pair (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="CSV rows read at a time (default: %(default)s).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = _parse_args(argv or sys.argv[1:])
+    fieldnames = read_fieldnames(args.csv_path, required=["row_id", TEXT_COLUMN])
+    row_ids: List[str] = []
+    texts: List[str] = []
+    for rows in iter_row_chunks(args.csv_path, args.chunk_size):
+        for row in rows:
+            row_ids.append(row["row_id"])
+            texts.append(row.get(TEXT_COLUMN, "") or "")
+
+    vectors = None
+    if args.embedding_store:
+        vectors = _store_vectors(load_store(args.embedding_store), row_ids)
+    elif EMBEDDING_COLUMN in fieldnames:
+        try:
+            store, _ = build_store(args.csv_path, "float32", args.chunk_size)
+        except ValueError:
+            store = None
+        if store is not None:
+            vectors = _store_vectors(store, row_ids)
+    if vectors is None:
+        print("[info] No embeddings available; confirming candidates by shingle Jaccard only")
+
+    started = time.perf_counter()
+    canonical = cluster_rows(
+        texts,
+        vectors,
+        num_perm=args.num_perm,
+        bands=args.bands,
+        shingle_size=args.shingle_size,
+        min_jaccard=args.min_jaccard,
+        min_cosine=args.min_cosine,
+    )
+    elapsed = time.perf_counter() - started
+    written = write_clusters(args.out, row_ids, canonical)
+    unique = int((canonical == np.arange(len(canonical))).sum())
+    print(f"[info] {len(row_ids)} rows -> {unique} unique texts ({len(row_ids) - unique} near-duplicates) in {elapsed:.2f} s")
+    print(f"[done] Wrote {written} clustered rows to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,317 @@
+"""Compact float16 / int8 storage for course embeddings.
+
+``courses_scores.csv`` keeps every 1024-dim BGEM3 vector as a JSON list of
+decimals (~20 KB per course). Since scoring only needs cosine similarities,
+the vectors can be kept in a much smaller binary store:
+
+* ``float32`` – lossless reference (4 KB per course)
+* ``float16`` – half precision (2 KB per course)
+* ``int8``    – per-vector symmetric scaling, ``x ≈ q * scale`` (1 KB + 4 B)
+
+Products against a small dense matrix (e.g. the four aspect vectors) run on
+the compact form block by block, so only one block is ever upcast to float32.
+
+Usage::
+
+    python embedding_quant.py export [--csv-path PATH] [--kind int8|float16|float32]
+                                     [--out data/course_embeddings.int8.npz]
+    python embedding_quant.py report [--csv-path PATH] [--aspects-path PATH]
+                                     [--bias-json PATH] [--backend flag|onnx]
+                                     [--encoder-url URL]
+
+``export`` writes a store that ``compute_courses_scores.py --embedding-store``
+can score from directly. The store records a hash of each row's ``embedding``
+cell, so rows whose embedding was recomputed after the export are noticed
+and scored from the CSV instead. ``report`` compares cosine scores computed from each
+storage kind with the existing ``score_*_cos`` columns and prints on-disk and
+in-memory sizes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import sys
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from csv_stream import DEFAULT_CHUNK_SIZE, iter_row_chunks, read_fieldnames
+from encoder_backends import add_backend_arguments, load_backend
+
+DEFAULT_CSV_PATH = Path(__file__).resolve().parent / "data" / "courses_scores.csv"
+EMBEDDING_COLUMN = "embedding"
+QUANT_KINDS = ("float32", "float16", "int8")
+DEFAULT_KIND = "int8"
+DEFAULT_BLOCK_ROWS = 4096
+INT8_MAX = 127
+
+
+@dataclass
+class QuantizedMatrix:
+    """Row-major embedding matrix in float32, float16 or per-row scaled int8 form."""
+
+    kind: str
+    data: np.ndarray
+    scales: np.ndarray | None = None
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.data.shape
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def take(self, indices: Sequence[int] | np.ndarray) -> "QuantizedMatrix":
+        idx = np.asarray(indices, dtype=np.intp)
+        scales = self.scales[idx] if self.scales is not None else None
+        return QuantizedMatrix(self.kind, self.data[idx], scales)
+
+    def dequantize(self, start: int = 0, stop: int | None = None) -> np.ndarray:
+        block = self.data[start:stop].astype(np.float32)
+        if self.kind == "int8":
+            block *= self.scales[start:stop, None]
+        return block
+
+    def matmul(self, other: np.ndarray, block_rows: int = DEFAULT_BLOCK_ROWS) -> np.ndarray:
+        """Return ``self @ other`` in float32 without materialising the full float32 matrix."""
+        other = np.asarray(other, dtype=np.float32)
+        out = np.empty((len(self), other.shape[1]), dtype=np.float32)
+        for start in range(0, len(self), max(1, block_rows)):
+            stop = start + block_rows
+            block = self.data[start:stop].astype(np.float32, copy=False) @ other
+            if self.kind == "int8":
+                # (q * s) @ B == s * (q @ B): scale the small product, not the block
+                block *= self.scales[start:stop, None]
+            out[start:stop] = block
+        return out
+
+
+def quantize(matrix: np.ndarray, kind: str = DEFAULT_KIND) -> QuantizedMatrix:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if kind == "float32":
+        return QuantizedMatrix(kind, matrix)
+    if kind == "float16":
+        return QuantizedMatrix(kind, matrix.astype(np.float16))
+    if kind == "int8":
+        scales = np.abs(matrix).max(axis=1) / INT8_MAX
+        scales[scales == 0] = 1.0
+        q = np.rint(matrix / scales[:, None])
+        np.clip(q, -INT8_MAX, INT8_MAX, out=q)
+        return QuantizedMatrix(kind, q.astype(np.int8), scales.astype(np.float32))
+    raise ValueError(f"Unknown quantization kind: {kind}")
+
+
+def concatenate(parts: Sequence[QuantizedMatrix]) -> QuantizedMatrix:
+    if not parts:
+        raise ValueError("Nothing to concatenate")
+    kind = parts[0].kind
+    data = np.concatenate([p.data for p in parts])
+    scales = np.concatenate([p.scales for p in parts]) if kind == "int8" else None
+    return QuantizedMatrix(kind, data, scales)
+
+
+def embedding_digest(raw: str) -> int:
+    """64-bit hash of a serialized ``embedding`` cell, as recorded per row in a store."""
+    return int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+@dataclass
+class EmbeddingStore:
+    """Quantized course vectors with the ``row_id`` of each row.
+
+    ``digests`` holds the ``embedding_digest`` of the CSV cell each vector was
+    built from (``None`` for stores exported before they were recorded).
+    """
+
+    row_ids: List[str]
+    matrix: QuantizedMatrix
+    digests: np.ndarray | None = None
+
+    def index(self) -> Dict[str, int]:
+        return {row_id: pos for pos, row_id in enumerate(self.row_ids)}
+
+    def is_current(self, pos: int, raw: str | None) -> bool:
+        """False when the CSV cell ``raw`` differs from the one row ``pos`` was exported from."""
+        if not raw or self.digests is None:
+            return True
+        return int(self.digests[pos]) == embedding_digest(raw)
+
+
+def save_store(path: Path, store: EmbeddingStore) -> None:
+    arrays = {
+        "kind": np.array(store.matrix.kind),
+        "row_ids": np.array(store.row_ids, dtype=np.str_),
+        "data": store.matrix.data,
+    }
+    if store.matrix.scales is not None:
+        arrays["scales"] = store.matrix.scales
+    if store.digests is not None:
+        arrays["digests"] = np.asarray(store.digests, dtype=np.uint64)
+    # np.savez appends ".npz" to bare names; write through a handle to keep ``path`` exact.
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=f".{path.name}.", delete=False) as fp:
+        np.savez(fp, **arrays)
+    Path(fp.name).replace(path)
+
+
+def load_store(path: Path) -> EmbeddingStore:
+    if not path.exists():
+        raise FileNotFoundError(f"Embedding store not found: {path}")
+    with np.load(path, allow_pickle=False) as data:
+        kind = str(data["kind"])
+        if kind not in QUANT_KINDS:
+            raise ValueError(f"Unknown quantization kind {kind!r} in {path}")
+        scales = data["scales"] if "scales" in data.files else None
+        matrix = QuantizedMatrix(kind, data["data"], scales)
+        row_ids = [str(r) for r in data["row_ids"]]
+        digests = data["digests"] if "digests" in data.files else None
+    return EmbeddingStore(row_ids, matrix, digests)
+
+
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def build_store(csv_path: Path, kind: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> tuple[EmbeddingStore, int]:
+    """Read normalized embeddings from the CSV into a store; also return their JSON size in bytes."""
+    read_fieldnames(csv_path, required=["row_id", EMBEDDING_COLUMN])
+    row_ids: List[str] = []
+    digests: List[int] = []
+    parts: List[QuantizedMatrix] = []
+    json_bytes = 0
+    for rows in iter_row_chunks(csv_path, chunk_size):
+        vectors = []
+        for row in rows:
+            raw = row.get(EMBEDDING_COLUMN) or ""
+            if not raw:
+                continue
+            json_bytes += len(raw.encode("utf-8"))
+            vectors.append(np.asarray(json.loads(raw), dtype=np.float32))
+            row_ids.append(row["row_id"])
+            digests.append(embedding_digest(raw))
+        if vectors:
+            parts.append(quantize(_normalize_rows(np.vstack(vectors)), kind))
+    if not parts:
+        raise ValueError(f"No embeddings found in {csv_path}")
+    return EmbeddingStore(row_ids, concatenate(parts), np.array(digests, dtype=np.uint64)), json_bytes
+
+
+def _report(args: argparse.Namespace) -> int:
+    import compute_courses_scores as scores
+
+    reference, json_bytes = build_store(args.csv_path, "float32", args.chunk_size)
+    cos_columns = [f"score_{label}_cos" for label, _ in scores.ASPECT_CONFIG]
+    read_fieldnames(args.csv_path, required=cos_columns)
+
+    index = reference.index()
+    existing = np.zeros((len(reference.row_ids), len(cos_columns)), dtype=np.float64)
+    for rows in iter_row_chunks(args.csv_path, args.chunk_size):
+        for row in rows:
+            pos = index.get(row["row_id"])
+            if pos is not None:
+                existing[pos] = [float(row[col]) for col in cos_columns]
+
+    aspect_texts = scores._load_aspects(args.aspects_path)
+    model = load_backend(args.backend, device=args.device, encoder_url=args.encoder_url, onnx_model=args.onnx_model)
+    aspect_matrix = scores._normalize_rows(
+        scores._encode_texts(model, aspect_texts, batch_size=4, max_length=args.max_length)
+    )
+    bias_map = scores._load_biases(args.bias_json)
+    bias_vec = np.array([bias_map.get(label, 0.0) for label, _ in scores.ASPECT_CONFIG], dtype=np.float32)
+
+    n, dim = reference.matrix.shape
+    print(f"[info] {n} course vectors x {dim} dims; JSON in CSV: {json_bytes / 1e6:.2f} MB")
+    print(f"{'kind':<8} {'RAM MB':>8} {'disk MB':>8} {'max |err|':>10} {'mean |err|':>11} {'top-50 overlap':>15}")
+    top_k = min(50, n)
+    ref_top = [set(np.argsort(-existing[:, j])[:top_k]) for j in range(len(cos_columns))]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for kind in QUANT_KINDS:
+            matrix = quantize(reference.matrix.data, kind)
+            store_path = Path(tmp_dir) / f"store.{kind}.npz"
+            save_store(store_path, EmbeddingStore(reference.row_ids, matrix))
+            cos = matrix.matmul(aspect_matrix.T) - bias_vec[None, :]
+            err = np.abs(cos.astype(np.float64) - existing)
+            overlap = np.mean([
+                len(ref_top[j] & set(np.argsort(-cos[:, j])[:top_k])) / top_k
+                for j in range(len(cos_columns))
+            ])
+            print(
+                f"{kind:<8} {matrix.nbytes / 1e6:>8.2f} {store_path.stat().st_size / 1e6:>8.2f} "
+                f"{err.max():>10.2e} {err.mean():>11.2e} {overlap:>15.3f}"
+            )
+    return 0
+
+
+def _export(args: argparse.Namespace) -> int:
+    out_path = args.out or args.csv_path.with_name(f"course_embeddings.{args.kind}.npz")
+    store, json_bytes = build_store(args.csv_path, args.kind, args.chunk_size)
+    save_store(out_path, store)
+    print(
+        f"[done] Wrote {len(store.row_ids)} {args.kind} vectors to {out_path} "
+        f"({out_path.stat().st_size / 1e6:.2f} MB on disk vs {json_bytes / 1e6:.2f} MB of JSON)"
+    )
+    return 0
+
+
+def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Quantized storage for course embeddings.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def common(p: argparse.ArgumentParser) -> None:
+        p.add_argument(
+            "--csv-path",
+            type=Path,
+            default=DEFAULT_CSV_PATH,
+            help="Path to the courses_scores.csv file (default: data/courses_scores.csv).",
+        )
+        p.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Number of CSV rows read at a time (default: %(default)s).",
+        )
+
+    export = sub.add_parser("export", help="Write a quantized embedding store from the CSV.")
+    common(export)
+    export.add_argument("--kind", choices=QUANT_KINDS, default=DEFAULT_KIND, help="Storage kind (default: %(default)s).")
+    export.add_argument(
+        "--out",
+        type=Path,
+        default=None,
+        help="Output .npz path (default: data/course_embeddings.<kind>.npz).",
+    )
+
+    report = sub.add_parser("report", help="Compare score_*_cos accuracy and sizes across storage kinds.")
+    common(report)
+    report.add_argument(
+        "--aspects-path",
+        type=Path,
+        default=Path(__file__).resolve().parent / "data" / "aspects.json",
+        help="Path to aspects.json (default: data/aspects.json).",
+    )
+    report.add_argument("--bias-json", type=Path, default=None, help="Bias JSON used when the scores were computed.")
+    report.add_argument("--device", choices=["auto", "cpu", "mps", "cuda"], default="auto", help="Model device.")
+    add_backend_arguments(report)
+    report.add_argument("--max-length", type=int, default=8192, help="Maximum token length (default: %(default)s).")
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = _parse_args(argv or sys.argv[1:])
+    if args.command == "export":
+        return _export(args)
+    return _report(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
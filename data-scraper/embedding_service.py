@@ -0,0 +1,302 @@
+"""Long-lived local BGEM3 encoding service and its client.
+
+Loading ``BAAI/bge-m3`` takes tens of seconds and several GB of RAM, so instead
+of paying that in every batch job this script keeps one model warm behind a
+small localhost HTTP API. Requests arriving concurrently (from several jobs or
+threads) are merged into a single ``model.encode`` call.
+
+Usage::
+
+    python embedding_service.py [--host 127.0.0.1] [--port 8765]
+                                [--device auto|cpu|mps|cuda] [--backend flag|onnx]
+                                [--max-batch 32] [--batch-wait-ms 10]
+
+API::
+
+    GET  /health  -> {"status": "ok", "model": ..., "backend": ..., "device": ..., "batches": N, "texts": N}
+    POST /encode  {"texts": [...], "max_length": 8192} -> {"dense_vecs": [[...], ...]}
+
+Clients (``compute_courses_embeddings.py``, ``compute_courses_scores.py`` via
+``--encoder-url http://127.0.0.1:8765``) use :class:`EmbeddingServiceClient`,
+which mirrors the ``BGEM3FlagModel.encode`` call they already make.
+``backend`` in ``/health`` is the ``backend_fingerprint`` of the encoder the
+service runs, which clients fold into their cache keys.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterable, List, Sequence
+
+import numpy as np
+
+MODEL_NAME = "BAAI/bge-m3"
+MAX_LENGTH = 8192
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_DEVICE = "auto"
+DEFAULT_MAX_BATCH = 32
+DEFAULT_BATCH_WAIT_MS = 10.0
+DEFAULT_TIMEOUT = 600.0
+
+
+class EmbeddingServiceClient:
+    """Drop-in stand-in for ``BGEM3FlagModel`` that encodes via the service."""
+
+    def __init__(self, base_url: str, timeout: float = DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, payload: Any | None = None) -> Any:
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        req = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            try:
+                err = json.loads(e.read()).get("error")
+            except Exception:
+                err = e.reason
+            raise RuntimeError(f"{method} {path} failed: {e.code} {err}") from e
+        except urllib.error.URLError as e:
+            raise RuntimeError(f"Embedding service unreachable at {self.base_url}: {e.reason}") from e
+
+    def health(self) -> dict:
+        return self._request("GET", "/health")
+
+    def encode(
+        self,
+        sentences: Sequence[str],
+        return_dense: bool = True,
+        return_sparse: bool = False,
+        return_colbert_vecs: bool = False,
+        max_length: int = MAX_LENGTH,
+        **_: Any,
+    ) -> dict:
+        if return_sparse or return_colbert_vecs or not return_dense:
+            raise ValueError("The embedding service only returns dense vectors")
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        data = self._request("POST", "/encode", {"texts": texts, "max_length": max_length})
+        return {"dense_vecs": np.asarray(data["dense_vecs"], dtype=np.float32)}
+
+
+@dataclass
+class _Job:
+    texts: List[str]
+    max_length: int
+    done: threading.Event = field(default_factory=threading.Event)
+    result: List[List[float]] | None = None
+    error: BaseException | None = None
+
+
+class _BatchingEncoder:
+    """Merge concurrent encode requests with the same ``max_length`` into one model call."""
+
+    def __init__(self, model: Any, max_batch: int, wait_seconds: float):
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.wait_seconds = max(0.0, wait_seconds)
+        self.batches = 0
+        self.texts = 0
+        self._queue: List[_Job] = []
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name="bgem3-encoder", daemon=True)
+        self._worker.start()
+
+    def encode(self, texts: List[str], max_length: int) -> List[List[float]]:
+        job = _Job(texts, max_length)
+        with self._cond:
+            self._queue.append(job)
+            self._cond.notify()
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result or []
+
+    def _pending_texts(self, max_length: int) -> int:
+        return sum(len(job.texts) for job in self._queue if job.max_length == max_length)
+
+    def _take_batch(self) -> List[_Job]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            max_length = self._queue[0].max_length
+            deadline = time.monotonic() + self.wait_seconds
+            while self._pending_texts(max_length) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            taken: List[_Job] = []
+            size = 0
+            for job in list(self._queue):
+                if job.max_length != max_length:
+                    continue
+                if taken and size + len(job.texts) > self.max_batch:
+                    break
+                taken.append(job)
+                size += len(job.texts)
+                self._queue.remove(job)
+            return taken
+
+    def _run(self) -> None:
+        while True:
+            jobs = self._take_batch()
+            texts = [text for job in jobs for text in job.texts]
+            try:
+                output = self.model.encode(
+                    texts,
+                    return_dense=True,
+                    return_sparse=False,
+                    return_colbert_vecs=False,
+                    max_length=jobs[0].max_length,
+                )
+                dense = output["dense_vecs"]
+                if hasattr(dense, "tolist"):
+                    dense = dense.tolist()
+                self.batches += 1
+                self.texts += len(texts)
+                start = 0
+                for job in jobs:
+                    job.result = dense[start : start + len(job.texts)]
+                    start += len(job.texts)
+            except Exception as e:  # surfaced to every waiting request
+                for job in jobs:
+                    job.error = e
+            for job in jobs:
+                job.done.set()
+
+
+def _make_handler(encoder: _BatchingEncoder, device: str, backend: str) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status: int, payload: Any) -> None:
+            body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:  # noqa: N802 (http.server naming)
+            if self.path.rstrip("/") != "/health":
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            self._send_json(200, {
+                "status": "ok",
+                "model": MODEL_NAME,
+                "backend": backend,
+                "device": device,
+                "batches": encoder.batches,
+                "texts": encoder.texts,
+            })
+
+        def do_POST(self) -> None:  # noqa: N802 (http.server naming)
+            if self.path.rstrip("/") != "/encode":
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                texts = payload.get("texts")
+                if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                    raise ValueError("'texts' must be a list of strings")
+                max_length = max(1, int(payload.get("max_length") or MAX_LENGTH))
+            except (ValueError, TypeError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            if not texts:
+                self._send_json(200, {"dense_vecs": []})
+                return
+            try:
+                dense = encoder.encode(texts, max_length)
+            except Exception as e:  # pylint: disable=broad-except
+                self._send_json(500, {"error": str(e)})
+                return
+            self._send_json(200, {"dense_vecs": dense})
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 (signature from base class)
+            pass
+
+    return Handler
+
+
+def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve BGEM3 dense embeddings over localhost HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to bind (default: %(default)s).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on (default: %(default)s).")
+    parser.add_argument(
+        "--device",
+        type=str,
+        choices=["auto", "cpu", "mps", "cuda"],
+        default=DEFAULT_DEVICE,
+        help="Device to run inference on (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["flag", "onnx"],
+        default="flag",
+        help="Encoder backend kept warm by the service (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--onnx-model",
+        type=Path,
+        default=None,
+        help="Exported ONNX model file or directory for --backend onnx.",
+    )
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=DEFAULT_MAX_BATCH,
+        help="Maximum number of texts merged into one model call (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--batch-wait-ms",
+        type=float,
+        default=DEFAULT_BATCH_WAIT_MS,
+        help="How long to wait for concurrent requests before encoding (default: %(default)s).",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = _parse_args(argv or sys.argv[1:])
+    from encoder_backends import backend_fingerprint, load_backend, resolve_device
+
+    device = resolve_device(args.device) if args.backend == "flag" else "cpu"
+    model = load_backend(args.backend, device=device, onnx_model=args.onnx_model)
+
+    encoder = _BatchingEncoder(model, args.max_batch, args.batch_wait_ms / 1000.0)
+    backend = backend_fingerprint(args.backend, onnx_model=args.onnx_model)
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(encoder, device, backend))
+    server.daemon_threads = True
+    print(f"[ok] Serving embeddings on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    print(f"[done] Encoded {encoder.texts} texts in {encoder.batches} batches.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,351 @@
+"""Pluggable dense-encoder backends for BGE-M3.
+
+Every backend exposes the same ``encode(...)`` call the batch jobs already make
+on ``BGEM3FlagModel`` and returns ``{"dense_vecs": float32 array}`` with
+L2-normalized rows:
+
+* ``flag``   – ``FlagEmbedding.BGEM3FlagModel`` (PyTorch, the reference)
+* ``onnx``   – an exported BGE-M3 encoder run with ``onnxruntime``; the dense
+  head is the normalized ``[CLS]`` hidden state, as in FlagEmbedding. The
+  export can be int8 dynamic-quantized for faster CPU inference.
+* ``remote`` – a running ``embedding_service.py`` (see ``--encoder-url``)
+
+Usage::
+
+    # one-off export (needs torch + transformers; add --quantize for int8 weights)
+    python encoder_backends.py export-onnx [--out data/onnx/bge-m3] [--quantize]
+
+    # throughput benchmark over course texts
+    python encoder_backends.py bench [--backends flag onnx] [--onnx-model PATH]
+                                     [--csv-path PATH] [--limit 64] [--batch-size 8]
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+from typing import Any, Iterable, List, Protocol, Sequence
+
+import numpy as np
+
+MODEL_NAME = "BAAI/bge-m3"
+MAX_LENGTH = 8192
+BACKENDS = ("flag", "onnx")
+DEFAULT_BACKEND = "flag"
+DEFAULT_ONNX_DIR = Path(__file__).resolve().parent / "data" / "onnx" / "bge-m3"
+ONNX_FILENAME = "model.onnx"
+ONNX_INT8_FILENAME = "model.int8.onnx"
+DEFAULT_ONNX_BATCH_SIZE = 8
+
+
+class EncoderBackend(Protocol):
+    def encode(
+        self,
+        sentences: Sequence[str],
+        return_dense: bool = True,
+        return_sparse: bool = False,
+        return_colbert_vecs: bool = False,
+        max_length: int = MAX_LENGTH,
+        **kwargs: Any,
+    ) -> dict: ...
+
+
+def resolve_device(choice: str) -> str:
+    if choice != "auto":
+        return choice
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def resolve_onnx_model(model_path: Path) -> Path:
+    """The ONNX file loaded for ``model_path``: a directory prefers its int8 export over ``model.onnx``."""
+    model_path = Path(model_path)
+    if model_path.is_dir():
+        int8_path = model_path / ONNX_INT8_FILENAME
+        return int8_path if int8_path.exists() else model_path / ONNX_FILENAME
+    return model_path
+
+
+class OnnxBackend:
+    """BGE-M3 dense encoder running on onnxruntime."""
+
+    def __init__(self, model_path: Path, batch_size: int = DEFAULT_ONNX_BATCH_SIZE, threads: int | None = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = Path(model_path)
+        model_dir = model_path.parent if model_path.is_file() else model_path
+        model_path = resolve_onnx_model(model_path)
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"ONNX model not found: {model_path} (run 'python encoder_backends.py export-onnx' first)"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.model_path = model_path
+        self.batch_size = max(1, batch_size)
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+    def encode(
+        self,
+        sentences: Sequence[str],
+        return_dense: bool = True,
+        return_sparse: bool = False,
+        return_colbert_vecs: bool = False,
+        max_length: int = MAX_LENGTH,
+        **_: Any,
+    ) -> dict:
+        if return_sparse or return_colbert_vecs or not return_dense:
+            raise ValueError("The ONNX backend only returns dense vectors")
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        out = np.zeros((len(texts), 0), dtype=np.float32)
+        # Sort by length so each batch pads to a similar size, then restore order.
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start : start + self.batch_size]
+            enc = self.tokenizer(
+                [texts[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=max_length,
+                return_tensors="np",
+            )
+            feeds = {name: enc[name].astype(np.int64) for name in ("input_ids", "attention_mask") if name in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            dense = _normalize_rows(hidden[:, 0].astype(np.float32))
+            if out.shape[1] == 0:
+                out = np.zeros((len(texts), dense.shape[1]), dtype=np.float32)
+            out[idx] = dense
+        return {"dense_vecs": out}
+
+
+def load_backend(
+    name: str = DEFAULT_BACKEND,
+    *,
+    device: str = "auto",
+    encoder_url: str | None = None,
+    onnx_model: Path | None = None,
+) -> EncoderBackend:
+    """Return a ready-to-use encoder; ``encoder_url`` takes precedence over ``name``."""
+    if encoder_url:
+        from embedding_service import EmbeddingServiceClient
+
+        print(f"[info] Using embedding service at {encoder_url}")
+        return EmbeddingServiceClient(encoder_url)
+    if name == "onnx":
+        backend = OnnxBackend(onnx_model or DEFAULT_ONNX_DIR)
+        print(f"[info] Loaded ONNX encoder {backend.model_path}")
+        return backend
+    if name == "flag":
+        from FlagEmbedding import BGEM3FlagModel
+
+        resolved_device = resolve_device(device)
+        print(f"[info] Loading model '{MODEL_NAME}' on {resolved_device}...")
+        return BGEM3FlagModel(MODEL_NAME, use_fp16=False, device=resolved_device)
+    raise ValueError(f"Unknown encoder backend: {name}")
+
+
+class LazyBackend:
+    """Defer ``load_backend`` until the first ``encode`` call, so fully cached runs never load a model."""
+
+    def __init__(self, name: str = DEFAULT_BACKEND, **kwargs: Any):
+        self.name = name
+        self.kwargs = kwargs
+        self._backend: EncoderBackend | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._backend is not None
+
+    def encode(self, sentences: Sequence[str], **kwargs: Any) -> dict:
+        if self._backend is None:
+            self._backend = load_backend(self.name, **self.kwargs)
+        return self._backend.encode(sentences, **kwargs)
+
+
+def backend_fingerprint(name: str = DEFAULT_BACKEND, *, encoder_url: str | None = None, onnx_model: Path | None = None) -> str:
+    """Identify which encoder produced a vector, for cache keys, without loading it.
+
+    A remote service is asked for the fingerprint of the encoder it runs, so a
+    URL that switches backends does not reuse cached vectors. An ONNX model is
+    identified by the file actually loaded (int8 or fp32) and its size and mtime,
+    so re-exporting it invalidates the caches too.
+    """
+    if encoder_url:
+        from embedding_service import EmbeddingServiceClient
+
+        url = encoder_url.rstrip("/")
+        try:
+            served = EmbeddingServiceClient(url, timeout=10.0).health().get("backend", "unknown")
+        except RuntimeError:
+            served = "unreachable"  # never matches a cache entry, so nothing stale is reused
+        return f"remote:{url}:{served}"
+    if name == "onnx":
+        model_path = resolve_onnx_model(Path(onnx_model or DEFAULT_ONNX_DIR)).resolve()
+        if not model_path.exists():
+            return f"onnx:{model_path}"
+        stat = model_path.stat()
+        return f"onnx:{model_path}:{stat.st_size}:{stat.st_mtime_ns}"
+    return name
+
+
+def add_backend_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default=DEFAULT_BACKEND,
+        help="Encoder backend: flag (FlagEmbedding/PyTorch) or onnx (onnxruntime) (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--onnx-model",
+        type=Path,
+        default=None,
+        help="Exported ONNX model file or directory for --backend onnx (default: data/onnx/bge-m3).",
+    )
+    parser.add_argument(
+        "--encoder-url",
+        type=str,
+        default=None,
+        help="Encode through a running embedding_service.py (e.g. http://127.0.0.1:8765) instead of loading the model.",
+    )
+
+
+def export_onnx(out_dir: Path, quantize: bool, opset: int = 17) -> Path:
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModel.from_pretrained(MODEL_NAME)
+    model.eval()
+    tokenizer.save_pretrained(out_dir)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    onnx_path = out_dir / ONNX_FILENAME
+    print(f"[info] Exporting {MODEL_NAME} to {onnx_path}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            str(onnx_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+        )
+    if not quantize:
+        return onnx_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = out_dir / ONNX_INT8_FILENAME
+    print(f"[info] Quantizing weights to int8 -> {int8_path}...")
+    quantize_dynamic(str(onnx_path), str(int8_path), weight_type=QuantType.QInt8, use_external_data_format=True)
+    return int8_path
+
+
+def _load_texts(csv_path: Path, limit: int) -> List[str]:
+    csv.field_size_limit(min(sys.maxsize, 2**31 - 1))
+    texts: List[str] = []
+    with csv_path.open("r", newline="", encoding="utf-8") as fp:
+        for row in csv.DictReader(fp):
+            text = row.get("text") or ""
+            if text:
+                texts.append(text)
+            if len(texts) >= limit:
+                break
+    return texts
+
+
+def _bench(args: argparse.Namespace) -> int:
+    texts = _load_texts(args.csv_path, args.limit)
+    if not texts:
+        raise SystemExit(f"No course texts found in {args.csv_path}")
+    print(f"[info] Benchmarking {len(texts)} texts, batch size {args.batch_size}, max length {args.max_length}")
+
+    reference: np.ndarray | None = None
+    for name in args.backends:
+        start = time.perf_counter()
+        backend = load_backend(name, device=args.device, onnx_model=args.onnx_model)
+        load_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parts = []
+        for offset in range(0, len(texts), args.batch_size):
+            batch = texts[offset : offset + args.batch_size]
+            parts.append(np.asarray(backend.encode(batch, max_length=args.max_length)["dense_vecs"], dtype=np.float32))
+        encode_s = time.perf_counter() - start
+        dense = _normalize_rows(np.vstack(parts))
+
+        parity = ""
+        if reference is None:
+            reference = dense
+        else:
+            cos = np.sum(reference * dense, axis=1)
+            parity = f", cosine vs {args.backends[0]}: min {cos.min():.5f} mean {cos.mean():.5f}"
+        print(
+            f"[ok] {name}: load {load_s:.1f}s, encode {encode_s:.2f}s "
+            f"({len(texts) / encode_s:.2f} texts/s){parity}"
+        )
+    return 0
+
+
+def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="BGE-M3 encoder backends: ONNX export and benchmark.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export-onnx", help="Export BGE-M3 to ONNX (optionally int8-quantized).")
+    export.add_argument("--out", type=Path, default=DEFAULT_ONNX_DIR, help="Output directory (default: data/onnx/bge-m3).")
+    export.add_argument("--quantize", action="store_true", help="Also write an int8 dynamic-quantized model.")
+    export.add_argument("--opset", type=int, default=17, help="ONNX opset version (default: %(default)s).")
+
+    bench = sub.add_parser("bench", help="Measure encode throughput and cosine parity across backends.")
+    bench.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS), help="Backends to compare.")
+    bench.add_argument("--onnx-model", type=Path, default=None, help="ONNX model file or directory.")
+    bench.add_argument(
+        "--csv-path",
+        type=Path,
+        default=Path(__file__).resolve().parent / "data" / "courses_scores.csv",
+        help="CSV with a 'text' column (default: data/courses_scores.csv).",
+    )
+    bench.add_argument("--limit", type=int, default=64, help="Number of texts to encode (default: %(default)s).")
+    bench.add_argument("--batch-size", type=int, default=8, help="Texts per encode call (default: %(default)s).")
+    bench.add_argument("--max-length", type=int, default=MAX_LENGTH, help="Maximum token length (default: %(default)s).")
+    bench.add_argument("--device", choices=["auto", "cpu", "mps", "cuda"], default="cpu", help="Device for the flag backend.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = _parse_args(argv or sys.argv[1:])
+    if args.command == "export-onnx":
+        path = export_onnx(args.out, args.quantize, args.opset)
+        print(f"[done] Wrote {path}")
+        return 0
+    return _bench(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,218 @@
+"""One-pass, mergeable per-column statistics for score calibration.
+
+:class:`RunningStats` keeps, for every column of a stream of ``(rows x k)``
+chunks, the count, Welford/Chan mean and sum of squared deviations, the
+running min/max and (optionally) a fixed-range histogram for approximate
+quantiles. Memory is constant in the number of rows, and accumulators from
+different shards combine exactly with :meth:`RunningStats.merge`, so parallel
+workers can each summarise their part of the corpus.
+
+Usage::
+
+    python online_stats.py merge shard1.json shard2.json ... --out merged.json
+    python online_stats.py show merged.json
+
+Shard files are written by ``compute_courses_scores.py --stats-out`` and can be
+fed back with ``--stats-in`` to calibrate every shard against global statistics.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Iterable, List, Sequence
+
+import numpy as np
+
+DEFAULT_HIST_RANGE = (-1.0, 1.0)  # cosine similarities
+DEFAULT_HIST_BINS = 2000
+REPORT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class RunningStats:
+    """Per-column count, mean, variance, min, max and histogram over a stream of chunks."""
+
+    def __init__(
+        self,
+        n_cols: int,
+        hist_range: tuple[float, float] = DEFAULT_HIST_RANGE,
+        hist_bins: int = DEFAULT_HIST_BINS,
+    ):
+        self.n_cols = n_cols
+        self.count = 0
+        self.mean = np.zeros(n_cols, dtype=np.float64)
+        self.m2 = np.zeros(n_cols, dtype=np.float64)
+        self.min = np.full(n_cols, np.inf, dtype=np.float64)
+        self.max = np.full(n_cols, -np.inf, dtype=np.float64)
+        self.hist_range = (float(hist_range[0]), float(hist_range[1]))
+        self.hist_bins = max(0, hist_bins)
+        self.hist = np.zeros((n_cols, self.hist_bins), dtype=np.int64) if self.hist_bins else None
+
+    def _combine(self, count: int, mean: np.ndarray, m2: np.ndarray) -> None:
+        # Chan et al. pairwise update of (count, mean, M2)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta**2 * (self.count * count / total)
+        self.count = total
+
+    def update(self, chunk: np.ndarray) -> "RunningStats":
+        chunk = np.asarray(chunk, dtype=np.float64).reshape(-1, self.n_cols)
+        if chunk.shape[0] == 0:
+            return self
+        chunk_mean = chunk.mean(axis=0)
+        chunk_m2 = ((chunk - chunk_mean) ** 2).sum(axis=0)
+        self._combine(chunk.shape[0], chunk_mean, chunk_m2)
+        self.min = np.minimum(self.min, chunk.min(axis=0))
+        self.max = np.maximum(self.max, chunk.max(axis=0))
+        if self.hist is not None:
+            lo, hi = self.hist_range
+            clipped = np.clip(chunk, lo, hi)
+            for col in range(self.n_cols):
+                counts, _ = np.histogram(clipped[:, col], bins=self.hist_bins, range=self.hist_range)
+                self.hist[col] += counts
+        return self
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        if other.n_cols != self.n_cols:
+            raise ValueError(f"Cannot merge stats with {other.n_cols} columns into {self.n_cols}")
+        if other.count == 0:
+            return self
+        if self.hist is not None:
+            if other.hist is None or other.hist_range != self.hist_range or other.hist_bins != self.hist_bins:
+                raise ValueError("Cannot merge stats with different histogram settings")
+            self.hist += other.hist
+        self._combine(other.count, other.mean, other.m2)
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    @property
+    def var(self) -> np.ndarray:
+        """Population variance (``ddof=0``, like ``np.std``)."""
+        if self.count == 0:
+            return np.zeros(self.n_cols, dtype=np.float64)
+        return self.m2 / self.count
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.var)
+
+    def quantile(self, q: float) -> np.ndarray:
+        """Approximate quantile per column, interpolated within histogram bins."""
+        if self.hist is None:
+            raise ValueError("Quantiles need a histogram (hist_bins > 0)")
+        lo, hi = self.hist_range
+        edges = np.linspace(lo, hi, self.hist_bins + 1)
+        out = np.empty(self.n_cols, dtype=np.float64)
+        for col in range(self.n_cols):
+            cum = np.cumsum(self.hist[col])
+            total = cum[-1] if cum.size else 0
+            if total == 0:
+                out[col] = np.nan
+                continue
+            target = q * total
+            idx = int(np.searchsorted(cum, target, side="left"))
+            idx = min(idx, self.hist_bins - 1)
+            prev = cum[idx - 1] if idx > 0 else 0
+            in_bin = self.hist[col, idx]
+            frac = (target - prev) / in_bin if in_bin else 0.0
+            out[col] = edges[idx] + frac * (edges[idx + 1] - edges[idx])
+        return np.clip(out, self.min, self.max)
+
+    def to_dict(self) -> dict:
+        data = {
+            "n_cols": self.n_cols,
+            "count": self.count,
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+            "min": self.min.tolist(),
+            "max": self.max.tolist(),
+            "hist_range": list(self.hist_range),
+            "hist_bins": self.hist_bins,
+        }
+        if self.hist is not None:
+            data["hist"] = self.hist.tolist()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunningStats":
+        stats = cls(int(data["n_cols"]), tuple(data["hist_range"]), int(data["hist_bins"]))
+        stats.count = int(data["count"])
+        stats.mean = np.asarray(data["mean"], dtype=np.float64)
+        stats.m2 = np.asarray(data["m2"], dtype=np.float64)
+        stats.min = np.asarray(data["min"], dtype=np.float64)
+        stats.max = np.asarray(data["max"], dtype=np.float64)
+        if stats.hist is not None:
+            stats.hist = np.asarray(data["hist"], dtype=np.int64).reshape(stats.n_cols, stats.hist_bins)
+        return stats
+
+
+def save_stats(path: Path, stats: RunningStats, labels: Sequence[str] | None = None) -> None:
+    data = stats.to_dict()
+    if labels is not None:
+        data["labels"] = list(labels)
+    path.write_text(json.dumps(data, separators=(",", ":")) + "\n", encoding="utf-8")
+
+
+def load_stats(path: Path) -> tuple[RunningStats, List[str] | None]:
+    if not path.exists():
+        raise FileNotFoundError(f"Stats file not found: {path}")
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return RunningStats.from_dict(data), data.get("labels")
+
+
+def merge_files(paths: Sequence[Path]) -> tuple[RunningStats, List[str] | None]:
+    if not paths:
+        raise ValueError("No stats files to merge")
+    merged, labels = load_stats(paths[0])
+    for path in paths[1:]:
+        stats, other_labels = load_stats(path)
+        if labels is not None and other_labels is not None and other_labels != labels:
+            raise ValueError(f"{path} has columns {other_labels}, expected {labels}")
+        merged.merge(stats)
+    return merged, labels
+
+
+def _show(stats: RunningStats, labels: Sequence[str] | None) -> None:
+    labels = list(labels or [f"col{i}" for i in range(stats.n_cols)])
+    print(f"[info] {stats.count} rows")
+    header = f"{'column':<14} {'mean':>9} {'std':>9} {'min':>9} {'max':>9}"
+    if stats.hist is not None:
+        header += "".join(f" {f'p{int(q * 100)}':>9}" for q in REPORT_QUANTILES)
+    print(header)
+    quantiles = [stats.quantile(q) for q in REPORT_QUANTILES] if stats.hist is not None else []
+    for col, label in enumerate(labels):
+        line = (
+            f"{label:<14} {stats.mean[col]:>9.5f} {stats.std[col]:>9.5f} "
+            f"{stats.min[col]:>9.5f} {stats.max[col]:>9.5f}"
+        )
+        line += "".join(f" {qv[col]:>9.5f}" for qv in quantiles)
+        print(line)
+
+
+def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Merge and inspect streaming calibration statistics.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    merge = sub.add_parser("merge", help="Merge shard statistics into one file.")
+    merge.add_argument("paths", type=Path, nargs="+", help="Shard stats JSON files.")
+    merge.add_argument("--out", type=Path, required=True, help="Output JSON path.")
+    show = sub.add_parser("show", help="Print mean/std/min/max and quantiles.")
+    show.add_argument("paths", type=Path, nargs="+", help="Stats JSON files (merged before printing).")
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = _parse_args(argv or sys.argv[1:])
+    stats, labels = merge_files(args.paths)
+    if args.command == "merge":
+        save_stats(args.out, stats, labels)
+        print(f"[done] Merged {len(args.paths)} files ({stats.count} rows) into {args.out}")
+    _show(stats, labels)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
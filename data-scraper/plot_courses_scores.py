@@ -1,26 +1,34 @@
 """Generate histograms for course aspect scores stored in the CSV output of
 ``compute_courses_scores.py``.
 
-Run with ``python plot_course_scores.py`` to produce one ``.png`` per score column
+Run with ``python plot_courses_scores.py`` to produce one ``.png`` per score column
 under ``data/plots`` (created if missing).
+
+Only the score columns are parsed (the ``text`` and ``embedding`` columns are
+skipped), plots are rendered with the non-interactive Agg backend in a process
+pool, and a plot is skipped when its column data and plot settings hash to the
+value recorded in ``data/plots/.plot_hashes.json`` and the image still exists.
+``--force`` re-renders everything.
+
+Usage::
+
+    python plot_courses_scores.py [--csv-path data/courses_scores.csv]
+                                  [--output-dir data/plots] [--jobs N] [--force]
 """
 
 from __future__ import annotations
 
+import argparse
+import csv
+import hashlib
+import json
 import os
-from typing import Iterable, List
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-
-plt.style.use("seaborn-v0_8")  # pleasant defaults without extra deps
-plt.rcParams.update({
-    "figure.facecolor": "white",
-    "axes.facecolor": "#f5f5f5",
-    "axes.edgecolor": "#d8d8d8",
-    "axes.titleweight": "bold",
-})
 
 CSV_PATH = os.path.join(os.path.dirname(__file__), "data", "courses_scores.csv")
 OUTPUT_DIR = os.path.join(os.path.dirname(CSV_PATH), "plots")
@@ -38,21 +46,71 @@ BINS = 40
 BAR_COLOR = "#3C6997"
 MEAN_COLOR = "#D45087"
 MEDIAN_COLOR = "#2A9D8F"
+HASHES_FILE = ".plot_hashes.json"
+# bump when the figure layout changes so cached plots are re-rendered
+PLOT_VERSION = 1
 
 
-def _ensure_columns(df: pd.DataFrame, columns: Iterable[str]) -> List[str]:
-    missing = [col for col in columns if col not in df.columns]
+def _ensure_columns(csv_path: str, columns: Iterable[str]) -> List[str]:
+    with open(csv_path, newline="", encoding="utf-8") as fp:
+        header = next(csv.reader(fp), [])
+    missing = [col for col in columns if col not in header]
     if missing:
         joined = ", ".join(missing)
         raise SystemExit(f"Missing column(s) in CSV: {joined}")
     return list(columns)
 
 
-def _plot_hist(series: pd.Series, title: str, out_path: str, bins: int) -> None:
-    data = series.dropna().values.astype(float)
+def _load_scores(csv_path: str, columns: List[str]) -> pd.DataFrame:
+    return pd.read_csv(csv_path, usecols=columns, dtype={col: np.float64 for col in columns})
+
+
+def _column_hash(values: np.ndarray, bins: int) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{PLOT_VERSION}\0{bins}\0".encode("utf-8"))
+    digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _load_hashes(path: str) -> Dict[str, str]:
+    try:
+        with open(path, encoding="utf-8") as fp:
+            data = json.load(fp)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_hashes(path: str, hashes: Dict[str, str]) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fp:
+        json.dump(hashes, fp, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _pyplot():
+    """Import pyplot on first use (in the worker), so runs with nothing to render skip it."""
+    import matplotlib
+
+    matplotlib.use("Agg")  # never needs a display; safe in worker processes
+    import matplotlib.pyplot as plt
+
+    plt.style.use("seaborn-v0_8")  # pleasant defaults without extra deps
+    plt.rcParams.update({
+        "figure.facecolor": "white",
+        "axes.facecolor": "#f5f5f5",
+        "axes.edgecolor": "#d8d8d8",
+        "axes.titleweight": "bold",
+    })
+    return plt
+
+
+def _plot_hist(values: np.ndarray, name: str, title: str, out_path: str, bins: int) -> bool:
+    data = values[~np.isnan(values)]
     if data.size == 0:
-        print(f"[warn] Column '{series.name}' has no numeric data after dropping NaNs; skipping")
-        return
+        print(f"[warn] Column '{name}' has no numeric data after dropping NaNs; skipping")
+        return False
+    plt = _pyplot()
 
     mean_val = float(np.mean(data))
     median_val = float(np.median(data))
@@ -64,7 +122,7 @@ def _plot_hist(series: pd.Series, title: str, out_path: str, bins: int) -> None:
     ax.axvline(median_val, color=MEDIAN_COLOR, linewidth=2, linestyle="-.", label=f"Median: {median_val:.3f}")
 
     ax.set_title(title)
-    ax.set_xlabel(series.name)
+    ax.set_xlabel(name)
     ax.set_ylabel("Course count")
 
     stats_text = (
@@ -92,22 +150,68 @@ def _plot_hist(series: pd.Series, title: str, out_path: str, bins: int) -> None:
     fig.savefig(out_path, dpi=150)
     print(f"[ok] Saved plot -> {out_path}")
     plt.close(fig)
+    return True
+
+
+def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Plot histograms of course aspect scores.")
+    parser.add_argument("--csv-path", default=CSV_PATH, help="Scored CSV (default: data/courses_scores.csv).")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Where to write the plots (default: data/plots).")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Worker processes for rendering (default: one per plot, up to the CPU count).",
+    )
+    parser.add_argument("--force", action="store_true", help="Re-render plots even if their data is unchanged.")
+    return parser.parse_args(argv)
 
 
-def main() -> None:
-    csv_path = os.path.realpath(CSV_PATH)
+def main(argv: Iterable[str] | None = None) -> int:
+    args = _parse_args(argv or sys.argv[1:])
+    csv_path = os.path.realpath(args.csv_path)
     if not os.path.exists(csv_path):
         raise SystemExit(f"CSV file not found: {csv_path}")
 
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_dir = args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    hashes_path = os.path.join(output_dir, HASHES_FILE)
+    hashes = {} if args.force else _load_hashes(hashes_path)
 
-    df = pd.read_csv(csv_path)
-    columns = _ensure_columns(df, SCORE_COLUMNS)
+    columns = _ensure_columns(csv_path, SCORE_COLUMNS)
+    df = _load_scores(csv_path, columns)
 
+    todo = []
+    new_hashes: Dict[str, str] = {}
     for col in columns:
-        out_path = os.path.join(OUTPUT_DIR, f"{col}.png")
-        _plot_hist(df[col], title=f"Distribution of {col}", out_path=out_path, bins=BINS)
+        values = df[col].to_numpy(dtype=np.float64)
+        out_path = os.path.join(output_dir, f"{col}.png")
+        new_hashes[col] = _column_hash(values, BINS)
+        if hashes.get(col) == new_hashes[col] and os.path.exists(out_path):
+            print(f"[info] {col} unchanged; keeping {out_path}")
+            continue
+        todo.append((col, values, out_path))
+
+    rendered: List[str] = []
+    if todo:
+        jobs = max(1, min(len(todo), args.jobs or os.cpu_count() or 1))
+        if jobs == 1:
+            results = [_plot_hist(values, col, f"Distribution of {col}", out_path, BINS) for col, values, out_path in todo]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [
+                    pool.submit(_plot_hist, values, col, f"Distribution of {col}", out_path, BINS)
+                    for col, values, out_path in todo
+                ]
+                results = [future.result() for future in futures]
+        rendered = [col for (col, _, _), ok in zip(todo, results) if ok]
+
+    # only record plots that exist, so a skipped (all-NaN) column is retried next time
+    stale = {col for col, _, _ in todo} - set(rendered)
+    _save_hashes(hashes_path, {col: digest for col, digest in new_hashes.items() if col not in stale})
+    print(f"[done] Rendered {len(rendered)} plot(s), {len(columns) - len(todo)} unchanged")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+"""Precompute a "related courses" kNN table from the course embeddings.
+
+For every course, find its ``k`` most similar other courses (cosine on the
+normalized BGEM3 vectors) and write them as a compact neighbour table::
+
+    row_id,neighbour_id,rank,score
+    cbc6f24060f53ac4,1b0f9c2e77a1d2aa,1,0.812345
+
+The similarity matrix is never materialised: rows are processed in blocks of
+``--block-rows`` against column blocks of ``--block-cols``, and only a running
+top-k (``np.argpartition``) per row is kept, so memory is
+``O(block_rows * (block_cols + k))``.
+
+Offerings of the same course share one embedding in Supabase
+(``course_embeddings`` is course-level), so with ``--courses-csv`` the job keeps
+one representative row per ``course_code`` (the first one with an embedding,
+like ``supabase/import_from_csv.py``) and never lists a course as related to
+itself. ``import_from_csv.py`` bulk-loads the table into
+``public.related_courses`` for O(1) lookups by course id.
+
+Usage::
+
+    python related_courses.py [--csv-path data/courses_scores.csv | --embedding-store PATH]
+                              [--courses-csv data/epfl_courses.csv] [--k 10]
+                              [--min-score 0.0] [--block-rows 1024] [--block-cols 8192]
+                              [--out data/related_courses.csv]
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, List
+
+import numpy as np
+
+from csv_stream import DEFAULT_CHUNK_SIZE, atomic_csv_writer, read_fieldnames
+from embedding_quant import EmbeddingStore, QuantizedMatrix, build_store, load_store
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+DEFAULT_CSV_PATH = DATA_DIR / "courses_scores.csv"
+DEFAULT_COURSES_CSV = DATA_DIR / "epfl_courses.csv"
+DEFAULT_OUT = DATA_DIR / "related_courses.csv"
+DEFAULT_K = 10
+DEFAULT_BLOCK_ROWS = 1024
+DEFAULT_BLOCK_COLS = 8192
+OUTPUT_COLUMNS = ["row_id", "neighbour_id", "rank", "score"]
+
+
+def top_k_neighbours(
+    matrix: QuantizedMatrix,
+    k: int,
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+    block_cols: int = DEFAULT_BLOCK_COLS,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return ``(indices, scores)`` of shape ``(n, k)``: each row's most similar other rows, best first.
+
+    Rows are assumed normalized, so the dot product is the cosine similarity.
+    Slots beyond ``n - 1`` neighbours hold index ``-1`` and score ``-inf``.
+    """
+    n = len(matrix)
+    k = max(1, k)
+    block_rows = max(1, block_rows)
+    block_cols = max(1, block_cols)
+    out_idx = np.full((n, k), -1, dtype=np.int64)
+    out_scores = np.full((n, k), -np.inf, dtype=np.float32)
+    for r0 in range(0, n, block_rows):
+        rows = matrix.dequantize(r0, r0 + block_rows)
+        r1 = r0 + len(rows)
+        best_idx = np.full((len(rows), 0), -1, dtype=np.int64)
+        best_scores = np.zeros((len(rows), 0), dtype=np.float32)
+        for c0 in range(0, n, block_cols):
+            cols = matrix.dequantize(c0, c0 + block_cols)
+            sims = rows @ cols.T
+            # a course is not its own neighbour
+            lo, hi = max(r0, c0), min(r1, c0 + len(cols))
+            if lo < hi:
+                diag = np.arange(lo, hi)
+                sims[diag - r0, diag - c0] = -np.inf
+            cand_idx = np.concatenate([best_idx, np.broadcast_to(np.arange(c0, c0 + len(cols)), sims.shape)], axis=1)
+            cand_scores = np.concatenate([best_scores, sims], axis=1)
+            keep = min(k, cand_scores.shape[1])
+            part = np.argpartition(-cand_scores, keep - 1, axis=1)[:, :keep]
+            best_idx = np.take_along_axis(cand_idx, part, axis=1)
+            best_scores = np.take_along_axis(cand_scores, part, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        width = best_scores.shape[1]
+        out_idx[r0:r1, :width] = np.take_along_axis(best_idx, order, axis=1)
+        out_scores[r0:r1, :width] = np.take_along_axis(best_scores, order, axis=1)
+    out_idx[~np.isfinite(out_scores)] = -1
+    return out_idx, out_scores
+
+
+def _course_representatives(store: EmbeddingStore, courses_csv: Path) -> EmbeddingStore:
+    """Keep the first embedded row per ``course_code``, in ``epfl_courses.csv`` order."""
+    read_fieldnames(courses_csv, required=["row_id", "course_code"])
+    index = store.index()
+    seen: set[str] = set()
+    picked: List[int] = []
+    with courses_csv.open("r", newline="", encoding="utf-8") as fp:
+        for row in csv.DictReader(fp):
+            code = (row.get("course_code") or "").strip()
+            pos = index.get((row.get("row_id") or "").strip())
+            if not code or pos is None or code in seen:
+                continue
+            seen.add(code)
+            picked.append(pos)
+    return EmbeddingStore([store.row_ids[p] for p in picked], store.matrix.take(picked))
+
+
+def write_neighbours(
+    out_path: Path,
+    row_ids: List[str],
+    indices: np.ndarray,
+    scores: np.ndarray,
+    min_score: float | None = None,
+) -> int:
+    count = 0
+    with atomic_csv_writer(out_path, OUTPUT_COLUMNS) as writer:
+        for row, (neigh, sims) in enumerate(zip(indices, scores)):
+            rank = 0
+            for idx, score in zip(neigh, sims):
+                if idx < 0 or (min_score is not None and score < min_score):
+                    continue
+                rank += 1
+                writer.writerow({
+                    "row_id": row_ids[row],
+                    "neighbour_id": row_ids[idx],
+                    "rank": rank,
+                    "score": f"{score:.6f}",
+                })
+                count += 1
+    return count
+
+
+def _parse_args(argv: Iterable[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Precompute top-k related courses from embeddings.")
+    parser.add_argument(
+        "--csv-path",
+        type=Path,
+        default=DEFAULT_CSV_PATH,
+        help="courses_scores.csv with an embedding column (default: data/courses_scores.csv).",
+    )
+    parser.add_argument(
+        "--embedding-store",
+        type=Path,
+        default=None,
+        help="Read vectors from an embedding_quant.py store instead of the CSV.",
+    )
+    parser.add_argument(
+        "--courses-csv",
+        type=str,
+        default=str(DEFAULT_COURSES_CSV),
+        help="epfl_courses.csv used to keep one row per course_code (default: data/epfl_courses.csv; '' to disable).",
+    )
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="Neighbours per course (default: %(default)s).")
+    parser.add_argument("--min-score", type=float, default=None, help="Drop neighbours below this cosine.")
+    parser.add_argument(
+        "--block-rows",
+        type=int,
+        default=DEFAULT_BLOCK_ROWS,
+        help="Query rows per block (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--block-cols",
+        type=int,
+        default=DEFAULT_BLOCK_COLS,
+        help="Candidate rows per block (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="CSV rows read at a time (default: %(default)s).",
+    )
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT, help="Output CSV (default: data/related_courses.csv).")
+    return parser.parse_args(argv)
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = _parse_args(argv or sys.argv[1:])
+    # Path("") is Path("."), so the disabling '' has to be caught before the conversion
+    courses_csv = Path(args.courses_csv) if args.courses_csv else None
+    if courses_csv is not None and not courses_csv.is_file():
+        # without it sibling offerings would be listed as each other's neighbours
+        raise FileNotFoundError(f"Courses CSV not found: {courses_csv} (pass --courses-csv '' to keep every offering)")
+    if args.embedding_store:
+        store = load_store(args.embedding_store)
+    else:
+        store, _ = build_store(args.csv_path, "float32", args.chunk_size)
+    if courses_csv is not None:
+        total = len(store.row_ids)
+        store = _course_representatives(store, courses_csv)
+        print(f"[info] {len(store.row_ids)} courses with embeddings (from {total} offerings)")
+
+    started = time.perf_counter()
+    indices, scores = top_k_neighbours(store.matrix, args.k, args.block_rows, args.block_cols)
+    elapsed = time.perf_counter() - started
+    count = write_neighbours(args.out, store.row_ids, indices, scores, args.min_score)
+    print(f"[done] Wrote {count} neighbour rows for {len(store.row_ids)} courses to {args.out} (kNN in {elapsed:.2f} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
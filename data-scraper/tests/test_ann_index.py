@@ -0,0 +1,98 @@
+import csv
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import ann_index  # noqa: E402
+from ann_index import IVFIndex  # noqa: E402
+
+
+def _clustered(n: int, dim: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dim))
+    vecs = centers[rng.integers(0, 20, n)] + rng.normal(scale=0.5, size=(n, dim))
+    return (vecs / np.linalg.norm(vecs, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_ivf_recall_insert_and_mmap_roundtrip():
+    vecs = _clustered(2000, 32, seed=0)
+    row_ids = [f"r{i}" for i in range(len(vecs))]
+    index = IVFIndex.build(row_ids, vecs, nlist=32)
+    queries = _clustered(50, 32, seed=1)
+    truth = [set(np.asarray(row_ids)[np.argsort(-(vecs @ q))[:10]]) for q in queries]
+
+    # probing every list is exact search
+    found, _ = index.search(queries, k=10, nprobe=index.nlist)
+    assert all(set(f) == t for f, t in zip(found, truth))
+    found, _ = index.search(queries, k=10, nprobe=4)
+    recall = np.mean([len(set(f) & t) / 10 for f, t in zip(found, truth)])
+    print(f"[ok] recall@10 with nprobe=4: {recall:.3f}")
+    assert recall > 0.6
+
+    # re-inserting a row_id replaces its vector; new row_ids are searchable before compaction
+    assert index.insert(["r0", "new"], np.stack([-vecs[0], queries[0]])) == 1
+    assert len(index) == 2001
+    ids, scores = index.search(queries[0], k=1, nprobe=index.nlist)
+    assert ids[0][0] == "new" and abs(scores[0][0] - 1.0) < 1e-5
+    ids, _ = index.search(vecs[0], k=5, nprobe=index.nlist)
+    assert "r0" not in ids[0]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "ann"
+        index.save(path)
+        loaded = IVFIndex.load(path, mmap=True)
+        assert isinstance(loaded.vectors, np.memmap)
+        assert np.array_equal(loaded.search(queries, k=10, nprobe=8)[0], index.search(queries, k=10, nprobe=8)[0])
+        compacted = loaded.compact()
+        assert len(compacted) == 2001 and len(compacted.delta_vectors) == 0
+        assert np.array_equal(
+            compacted.search(queries, k=10, nprobe=compacted.nlist)[0],
+            index.search(queries, k=10, nprobe=index.nlist)[0],
+        )
+        del loaded
+
+
+def _write_scores(path: Path, row_ids: list, vecs: np.ndarray) -> None:
+    with path.open("w", newline="", encoding="utf-8") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(["row_id", "embedding"])
+        for row_id, vec in zip(row_ids, vecs):
+            writer.writerow([row_id, json.dumps(vec.tolist())])
+
+
+def test_insert_cli_only_adds_changed_rows():
+    vecs = _clustered(300, 16, seed=2)
+    row_ids = [f"r{i}" for i in range(len(vecs))]
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, index_dir = Path(tmp) / "courses_scores.csv", Path(tmp) / "ann"
+        _write_scores(csv_path, row_ids, vecs)
+        assert ann_index.main(["build", "--csv-path", str(csv_path), "--out", str(index_dir), "--nlist", "8"]) == 0
+
+        # two runs over an unchanged source leave the delta empty
+        for _ in range(2):
+            assert ann_index.main(["insert", "--csv-path", str(csv_path), "--index", str(index_dir)]) == 0
+            index = IVFIndex.load(index_dir)
+            assert len(index.delta_vectors) == 0 and len(index) == 300
+
+        # one changed vector, one new row_id and one row_id gone from the source
+        vecs[5] = -vecs[5]
+        _write_scores(csv_path, row_ids[1:] + ["new"], np.concatenate([vecs[1:], vecs[:1]]))
+        assert ann_index.main(["insert", "--csv-path", str(csv_path), "--index", str(index_dir)]) == 0
+        index = IVFIndex.load(index_dir)
+        assert sorted(index.delta_row_ids) == ["new", "r5"] and len(index) == 301
+        assert ann_index.main(["insert", "--csv-path", str(csv_path), "--index", str(index_dir), "--remove-missing"]) == 0
+        index = IVFIndex.load(index_dir)
+        assert len(index.delta_vectors) == 2 and len(index) == 300 and "r0" not in index.live_row_ids()
+        del index
+    print("[ok] insert skips unchanged rows and drops row_ids gone from the source")
+
+
+if __name__ == "__main__":
+    test_ivf_recall_insert_and_mmap_roundtrip()
+    test_insert_cli_only_adds_changed_rows()
@@ -1,7 +1,18 @@
-from FlagEmbedding import BGEM3FlagModel
 import json
+import os
+import sys
 
-model = BGEM3FlagModel('BAAI/bge-m3', use_fp16=False)
+# Set BGEM3_ENCODER_URL (e.g. http://127.0.0.1:8765) to reuse a warm embedding_service.py
+encoder_url = os.environ.get("BGEM3_ENCODER_URL")
+if encoder_url:
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+    from embedding_service import EmbeddingServiceClient
+
+    model = EmbeddingServiceClient(encoder_url)
+else:
+    from FlagEmbedding import BGEM3FlagModel
+
+    model = BGEM3FlagModel('BAAI/bge-m3', use_fp16=False)
 
 courses = [
     """Summary
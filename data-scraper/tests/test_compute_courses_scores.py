@@ -0,0 +1,55 @@
+import csv
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import compute_courses_scores as scores  # noqa: E402
+from compute_courses_scores import ASPECT_CONFIG, _aspect_cache_key, _save_aspect_cache  # noqa: E402
+
+
+def _unit_rows(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    vecs = np.random.default_rng(seed).normal(size=(n, dim))
+    return (vecs / np.linalg.norm(vecs, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_sweep_columns_are_safe_and_replaced_between_runs():
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, aspects_path = Path(tmp) / "courses_scores.csv", Path(tmp) / "aspects.json"
+        texts = {key: f"about {key}" for _, key in ASPECT_CONFIG}
+        aspects_path.write_text(json.dumps(texts), encoding="utf-8")
+        # cached aspect vectors and precomputed embeddings: no encoder is loaded
+        _save_aspect_cache(
+            aspects_path.with_suffix(scores.ASPECT_CACHE_SUFFIX),
+            _aspect_cache_key(list(texts.values()), scores.MAX_LENGTH, "flag"),
+            _unit_rows(len(ASPECT_CONFIG), 8, seed=1),
+        )
+        with csv_path.open("w", newline="", encoding="utf-8") as fp:
+            writer = csv.writer(fp)
+            writer.writerow(["row_id", "text", "embedding"])
+            writer.writerows([f"r{i}", f"course {i}", json.dumps(vec.tolist())] for i, vec in enumerate(_unit_rows(5, 8)))
+
+        def columns(*extra: str) -> list:
+            argv = ["--csv-path", str(csv_path), "--aspects-path", str(aspects_path), *extra]
+            assert scores.main(argv) == 0
+            with csv_path.open(newline="", encoding="utf-8") as fp:
+                return [col for col in next(csv.reader(fp)) if "__" in col]
+
+        swept = columns("--sweep-tau", "0.5", "1e-05", "1e+06")
+        assert swept and all(scores.SET_NAME_RE.match(col) for col in swept), swept
+        assert "default_multi_zscore_tau1em05__score_skills_sigmoid" in swept
+        assert "default_multi_zscore_tau1e06__score_skills_sigmoid" in swept
+        assert columns("--sweep-tau", "0.1") == [
+            f"default_multi_zscore_tau0p1__score_{label}_sigmoid" for label, _ in ASPECT_CONFIG
+        ]
+        assert columns() == []
+    print("[ok] sweep column names stay [A-Za-z0-9_] and earlier sweeps are dropped")
+
+
+if __name__ == "__main__":
+    test_sweep_columns_are_safe_and_replaced_between_runs()
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from course_search import CourseSearchIndex  # noqa: E402
+from embedding_quant import EmbeddingStore, quantize  # noqa: E402
+
+ROWS = [
+    {"row_id": "a", "course_code": "CS-433", "course_name": "Machine learning", "section": "IN", "credits": "8",
+     "keywords": "['neural networks', 'regression']", "available_programs": "['MA1 Computer Science']"},
+    {"row_id": "b", "course_code": "MICRO-453", "course_name": "Robotics practicals", "section": "MT", "credits": "2",
+     "keywords": "['robots', 'control']", "available_programs": "['MA2 Robotics']"},
+    {"row_id": "c", "course_code": "BIO-322", "course_name": "Biological data science", "section": "SV",
+     "credits": "4", "keywords": "['machine learning', 'genomics']", "available_programs": "['BA5 Life Sciences Engineering']"},
+]
+
+
+def _index() -> CourseSearchIndex:
+    vectors = np.eye(3, 8, dtype=np.float32)
+    store = EmbeddingStore(["a", "b", "c"], quantize(vectors, "float32"))
+    return CourseSearchIndex(ROWS, {"b": "Build and program mobile robots."}, store)
+
+
+def test_bm25_ranks_name_matches_first_and_filters():
+    index = _index()
+    hits = index.search("machine learning", w_dense=0.0)
+    assert [hit.row_id for hit in hits] == ["a", "c"]
+    assert abs(hits[0].score - 0.6) < 1e-6  # best BM25 match is scaled to w_fts
+
+    assert [hit.row_id for hit in index.search("machine learning", w_dense=0.0, levels=["BA"])] == ["c"]
+    assert [hit.row_id for hit in index.search("machine learning", w_dense=0.0, sections=["SV", "IN"], min_credits=5)] == ["a"]
+    assert index.search("robots", w_dense=0.0, sections=["IN"]) == []
+    print("[ok] BM25 ranking and filters")
+
+
+def test_dense_only_match_is_returned():
+    index = _index()
+    query_vector = np.eye(3, 8, dtype=np.float32)[1]
+    hits = index.search("nothing matches this", query_vector, k=2)
+    assert [hit.row_id for hit in hits] == ["b"]
+    assert abs(hits[0].dense - 1.0) < 1e-6 and hits[0].bm25 == 0.0
+    print("[ok] dense-only match")
+
+
+if __name__ == "__main__":
+    test_bm25_ranks_name_matches_first_and_filters()
+    test_dense_only_match_is_returned()
@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dedup_courses import CanonicalTexts, cluster_rows, write_clusters  # noqa: E402
+
+BASE = (
+    "Studio BA5 (Weinand) ['sustainable building materials', 'assembly and disassembly', 'vernacular architecture', "
+    "'digitisation', 'fabrication', 'local resources', 'carbon footprint reduction', 'timber structures']"
+)
+TEXTS = [
+    BASE,
+    "Machine learning ['neural networks', 'regression', 'classification', 'kernel methods', 'optimization']",
+    BASE.replace("BA5", "BA6"),
+    BASE.replace("BA5", "MA1"),
+    "Public law for architects ['planning procedure', 'building permit', 'sources of law']",
+]
+
+
+def test_near_duplicates_cluster_around_first_row():
+    canonical = cluster_rows(TEXTS)
+    assert canonical.tolist() == [0, 1, 0, 0, 4]
+
+    # an embedding disagreement keeps a textual near-duplicate apart
+    vectors = np.eye(5, 8, dtype=np.float32)
+    vectors[2] = vectors[0]
+    assert cluster_rows(TEXTS, vectors).tolist() == [0, 1, 0, 3, 4]
+    print("[ok] MinHash clusters confirmed by Jaccard and cosine")
+
+
+def test_canonical_texts_fan_out():
+    row_ids = ["a", "b", "c", "d", "e"]
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "courses_scores.csv"
+        csv_path.write_text(
+            "row_id,text\n" + "".join(f'{r},"{t}"\n' for r, t in zip(row_ids, TEXTS)), encoding="utf-8"
+        )
+        clusters_path = Path(tmp) / "course_clusters.csv"
+        assert write_clusters(clusters_path, row_ids, cluster_rows(TEXTS)) == 3
+        canonical = CanonicalTexts.load(clusters_path, csv_path)
+    assert len(canonical) == 2
+    assert canonical.text_for({"row_id": "d", "text": TEXTS[3]}) == TEXTS[0]
+    assert canonical.text_for({"row_id": "e", "text": TEXTS[4]}) == TEXTS[4]
+    print("[ok] canonical text substitution")
+
+
+if __name__ == "__main__":
+    test_near_duplicates_cluster_around_first_row()
+    test_canonical_texts_fan_out()
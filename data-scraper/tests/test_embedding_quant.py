@@ -0,0 +1,71 @@
+import csv
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from compute_courses_scores import _chunk_raw_scores  # noqa: E402
+from embedding_quant import build_store, load_store, quantize, save_store  # noqa: E402
+
+
+def _unit_rows(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    vecs = np.random.default_rng(seed).normal(size=(n, dim))
+    return (vecs / np.linalg.norm(vecs, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_quantize_roundtrip_and_matmul_error():
+    vecs = _unit_rows(300, 64)
+    aspects = _unit_rows(4, 64, seed=1)
+    exact = vecs @ aspects.T
+    # element bounds: float16 rounds to 11 significant bits, int8 to half a step of max|x| / 127
+    bounds = {
+        "float32": np.zeros_like(vecs),
+        "float16": np.abs(vecs) * 2.0**-11,
+        "int8": np.repeat(np.abs(vecs).max(axis=1, keepdims=True) / 254, vecs.shape[1], axis=1),
+    }
+    for kind, bound in bounds.items():
+        matrix = quantize(vecs, kind)
+        assert matrix.data.dtype == np.dtype(kind) and matrix.shape == vecs.shape
+        restored = matrix.dequantize()
+        assert np.all(np.abs(restored - vecs) <= bound + 1e-7), kind
+
+        product = matrix.matmul(aspects.T, block_rows=64)
+        assert np.allclose(product, restored @ aspects.T, atol=1e-5), kind
+        assert np.all(np.abs(product - exact) <= bound @ np.abs(aspects.T) + 1e-5), kind
+        assert np.array_equal(matrix.take([5, 2]).dequantize(), restored[[5, 2]])
+        print(f"[ok] {kind}: max cosine error {np.abs(product - exact).max():.2e}")
+
+
+def test_store_digests_flag_recomputed_embeddings():
+    vecs = _unit_rows(3, 8)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, store_path = Path(tmp) / "courses_scores.csv", Path(tmp) / "store.npz"
+        cells = [json.dumps(vec.tolist()) for vec in vecs]
+        with csv_path.open("w", newline="", encoding="utf-8") as fp:
+            writer = csv.writer(fp)
+            writer.writerow(["row_id", "embedding"])
+            writer.writerows([f"r{i}", cell] for i, cell in enumerate(cells))
+        store, _ = build_store(csv_path, "int8")
+        save_store(store_path, store)
+        loaded = load_store(store_path)
+        assert loaded.row_ids == ["r0", "r1", "r2"] and np.array_equal(loaded.digests, store.digests)
+        assert all(loaded.is_current(pos, cell) for pos, cell in enumerate(cells))
+        assert loaded.is_current(0, "")  # no CSV vector to compare with
+        assert not loaded.is_current(1, json.dumps((-vecs[1]).tolist()))
+
+        # scoring takes the recomputed r1 from the CSV and the rest from the store (no encoder needed)
+        rows = [{"row_id": f"r{i}", "embedding": cell} for i, cell in enumerate(cells)]
+        rows[1]["embedding"] = json.dumps((-vecs[1]).tolist())
+        raw = _chunk_raw_scores(rows, vecs, None, 8, 512, loaded, loaded.index())
+        assert np.allclose(np.diag(raw), [1.0, -1.0, 1.0], atol=0.02)
+    print("[ok] store digests spot embeddings recomputed after the export")
+
+
+if __name__ == "__main__":
+    test_quantize_roundtrip_and_matmul_error()
+    test_store_digests_flag_recomputed_embeddings()
@@ -0,0 +1,64 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from embedding_service import EmbeddingServiceClient, _BatchingEncoder, _make_handler  # noqa: E402
+from encoder_backends import backend_fingerprint  # noqa: E402
+
+
+class _StubModel:
+    """Encodes a text as [len(text), sum of its code points]; records the size of every call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, max_length=8192, **_):
+        self.calls.append(len(texts))
+        return {"dense_vecs": np.array([[len(t), sum(map(ord, t))] for t in texts], dtype=np.float32)}
+
+
+def _expected(texts):
+    return [[float(len(t)), float(sum(map(ord, t)))] for t in texts]
+
+
+def test_concurrent_requests_are_batched_over_http():
+    model = _StubModel()
+    encoder = _BatchingEncoder(model, max_batch=64, wait_seconds=0.5)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(encoder, "cpu", "onnx:/models/bge-m3"))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        requests_texts = [[f"request {i} text {j}" for j in range(i + 1)] for i in range(8)]
+        results = [None] * len(requests_texts)
+        barrier = threading.Barrier(len(requests_texts))
+
+        def send(i):
+            barrier.wait()
+            results[i] = EmbeddingServiceClient(url).encode(requests_texts[i], max_length=512)["dense_vecs"].tolist()
+
+        threads = [threading.Thread(target=send, args=(i,)) for i in range(len(requests_texts))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert all(result == _expected(texts) for result, texts in zip(results, requests_texts))
+        assert sum(model.calls) == 36 and len(model.calls) < len(requests_texts), model.calls
+
+        health = EmbeddingServiceClient(url).health()
+        assert health["backend"] == "onnx:/models/bge-m3" and health["texts"] == 36
+        assert backend_fingerprint("flag", encoder_url=url + "/") == f"remote:{url}:onnx:/models/bge-m3"
+    finally:
+        server.shutdown()
+        server.server_close()
+    print(f"[ok] 8 concurrent requests encoded in {len(model.calls)} model calls")
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_are_batched_over_http()
@@ -0,0 +1,81 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from encoder_backends import (  # noqa: E402
+    DEFAULT_ONNX_DIR,
+    ONNX_FILENAME,
+    ONNX_INT8_FILENAME,
+    backend_fingerprint,
+    load_backend,
+)
+
+
+def _skip(reason: str) -> None:
+    """``pytest.skip`` under pytest; a plain message when run as a script."""
+    if "pytest" in sys.modules:
+        import pytest
+
+        pytest.skip(reason)
+    print(f"[skip] {reason}")
+
+
+TEXTS = [
+    "This course provides the foundations of sustainable management and finance: market failures, "
+    "externalities, CSR, green finance, ESG and climate risk pricing.",
+    "Students design, prototype and test a mechatronic product, from user research to CAD and pitching.",
+    "Introduction à l'analyse réelle : suites, séries, continuité, dérivabilité et intégrale de Riemann.",
+    "Short text",
+]
+
+
+def test_onnx_cosine_parity_with_flagembedding():
+    """The ONNX dense head should match FlagEmbedding up to fp32 (or int8-quantization) noise."""
+    onnx_path = os.environ.get("BGEM3_ONNX_PATH", str(DEFAULT_ONNX_DIR))
+    if not os.path.exists(onnx_path):
+        _skip(f"No exported ONNX model at {onnx_path}; run 'python encoder_backends.py export-onnx'")
+        return
+    try:
+        flag = load_backend("flag", device="cpu")
+        onnx = load_backend("onnx", onnx_model=onnx_path)
+    except ImportError as e:
+        _skip(f"Encoder backend dependencies missing: {e}")
+        return
+
+    ref = flag.encode(TEXTS, max_length=512)["dense_vecs"]
+    got = onnx.encode(TEXTS, max_length=512)["dense_vecs"]
+    assert got.shape == ref.shape
+
+    cos = np.sum(np.asarray(ref, dtype=np.float32) * got, axis=1)
+    threshold = 0.98 if "int8" in str(onnx.model_path) else 0.999
+    print(f"[ok] cosine parity: min {cos.min():.5f}, mean {cos.mean():.5f}")
+    assert cos.min() > threshold
+
+
+def test_onnx_fingerprint_follows_the_loaded_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        model_dir = Path(tmp)
+        (model_dir / ONNX_FILENAME).write_bytes(b"fp32 weights")
+        fp32 = backend_fingerprint("onnx", onnx_model=model_dir)
+        assert fp32 == backend_fingerprint("onnx", onnx_model=model_dir / ONNX_FILENAME)
+
+        # adding an int8 export switches what the directory loads, and so its key
+        (model_dir / ONNX_INT8_FILENAME).write_bytes(b"int8")
+        int8 = backend_fingerprint("onnx", onnx_model=model_dir)
+        assert int8 != fp32 and int8 == backend_fingerprint("onnx", onnx_model=model_dir / ONNX_INT8_FILENAME)
+        assert backend_fingerprint("onnx", onnx_model=model_dir / ONNX_FILENAME) == fp32
+
+        # re-exporting the same file changes its size or mtime
+        (model_dir / ONNX_INT8_FILENAME).write_bytes(b"int8 re-exported")
+        assert backend_fingerprint("onnx", onnx_model=model_dir) != int8
+    print("[ok] ONNX fingerprints follow the int8/fp32 file actually loaded")
+
+
+if __name__ == "__main__":
+    test_onnx_cosine_parity_with_flagembedding()
+    test_onnx_fingerprint_follows_the_loaded_file()
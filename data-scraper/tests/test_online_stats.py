@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from online_stats import RunningStats  # noqa: E402
+
+
+def test_sharded_stats_match_full_matrix():
+    """Chunked updates merged across shards should equal the statistics of the whole matrix."""
+    rng = np.random.default_rng(0)
+    raw = rng.normal(0.0, 0.05, size=(1000, 4)).astype(np.float32)
+
+    shards = []
+    for part in np.array_split(raw, 3):
+        stats = RunningStats(4)
+        for chunk in np.array_split(part, 7):
+            stats.update(chunk)
+        shards.append(RunningStats.from_dict(stats.to_dict()))
+    merged = shards[0]
+    for other in shards[1:]:
+        merged.merge(other)
+
+    ref = raw.astype(np.float64)
+    assert merged.count == raw.shape[0]
+    assert np.allclose(merged.mean, ref.mean(axis=0), atol=1e-12)
+    assert np.allclose(merged.std, ref.std(axis=0), atol=1e-12)
+    assert np.array_equal(merged.min, ref.min(axis=0))
+    assert np.array_equal(merged.max, ref.max(axis=0))
+
+    bin_width = 2.0 / merged.hist_bins
+    for q in (0.05, 0.5, 0.95):
+        assert np.abs(merged.quantile(q) - np.quantile(ref, q, axis=0)).max() <= 2 * bin_width
+    print("[ok] merged stats match the full matrix")
+
+
+if __name__ == "__main__":
+    test_sharded_stats_match_full_matrix()
@@ -0,0 +1,72 @@
+import csv
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from embedding_quant import quantize  # noqa: E402
+import related_courses  # noqa: E402
+from related_courses import top_k_neighbours  # noqa: E402
+
+
+def test_blocked_knn_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(500, 32)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+
+    # odd block sizes so diagonal blocks straddle row/column block boundaries
+    indices, scores = top_k_neighbours(quantize(vecs, "float32"), k=7, block_rows=64, block_cols=111)
+    sims = vecs @ vecs.T
+    np.fill_diagonal(sims, -np.inf)
+    expected = np.argsort(-sims, axis=1)[:, :7]
+    assert np.array_equal(indices, expected)
+    assert np.allclose(scores, np.take_along_axis(sims, expected, axis=1))
+    print("[ok] blocked kNN equals brute force")
+
+
+def test_fewer_rows_than_k_pads_with_minus_one():
+    vecs = np.eye(3, 4, dtype=np.float32)
+    indices, scores = top_k_neighbours(quantize(vecs, "float32"), k=5)
+    assert (indices[:, 2:] == -1).all() and np.isneginf(scores[:, 2:]).all()
+    assert all(i not in row for i, row in enumerate(indices[:, :2]))
+    print("[ok] padding when n <= k")
+
+
+def test_empty_courses_csv_disables_course_dedup():
+    vecs = np.eye(3, 4, dtype=np.float32)
+    with tempfile.TemporaryDirectory() as tmp:
+        scores_csv, courses_csv, out = Path(tmp) / "scores.csv", Path(tmp) / "courses.csv", Path(tmp) / "related.csv"
+        with scores_csv.open("w", newline="", encoding="utf-8") as fp:
+            writer = csv.writer(fp)
+            writer.writerow(["row_id", "embedding"])
+            writer.writerows([f"r{i}", json.dumps(vec.tolist())] for i, vec in enumerate(vecs))
+        with courses_csv.open("w", newline="", encoding="utf-8") as fp:
+            writer = csv.writer(fp)
+            writer.writerow(["row_id", "course_code"])
+            writer.writerows([["r0", "CS-101"], ["r1", "CS-101"], ["r2", "MATH-200"]])
+
+        def sources(*extra: str) -> set:
+            assert related_courses.main(["--csv-path", str(scores_csv), "--out", str(out), "--k", "2", *extra]) == 0
+            with out.open(newline="", encoding="utf-8") as fp:
+                return {row["row_id"] for row in csv.DictReader(fp)}
+
+        assert sources("--courses-csv", str(courses_csv)) == {"r0", "r2"}
+        assert sources("--courses-csv", "") == {"r0", "r1", "r2"}
+        try:
+            sources("--courses-csv", str(Path(tmp) / "missing.csv"))
+        except FileNotFoundError:
+            pass
+        else:
+            raise AssertionError("a missing --courses-csv must not silently disable the dedup")
+    print("[ok] --courses-csv '' keeps every offering; a missing file is an error")
+
+
+if __name__ == "__main__":
+    test_blocked_knn_matches_brute_force()
+    test_fewer_rows_than_k_pads_with_minus_one()
+    test_empty_courses_csv_disables_course_dedup()
@@ -0,0 +1,238 @@
+"""
+Benchmark import_from_csv.py against the local PostgREST stand-in.
+
+Usage:
+  python supabase/bench_import.py [--offerings 10000 50000 500000] [--dim 1024]
+                                  [--latency-ms 0] [--change-fraction 0.01]
+                                  [--import-args "--max-in-flight 8 --compress gzip"] [--keep DIR]
+
+For every corpus size a synthetic epfl_courses.csv / courses_scores.csv pair
+is generated (about 1.5 offerings per course, 14 keywords and 5-6 program
+labels per offering, float32 embeddings written like compute_courses_scores.py
+does), then three imports run against a fresh SQLite-backed stand-in
+(supabase/local_postgrest.py):
+  1. full       -- empty database, no manifest
+  2. no-op      -- --delta with unchanged CSVs
+  3. changed    -- --delta --delete-missing after changing a prof name on,
+                   adding a keyword to and dropping --change-fraction of the offerings
+
+Each import runs in its own process; wall time, peak RSS of the importer,
+requests and request-body bytes seen by the stand-in are reported per run.
+At 1024 dimensions the scores CSV is about 10 KB per offering, so the 500k
+corpus needs ~5 GB of scratch space.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from local_postgrest import LocalPostgrest
+
+
+IMPORTER = Path(__file__).resolve().parent / "import_from_csv.py"
+COURSE_FIELDS = ["row_id", "course_code", "lang", "section", "semester", "prof_name", "course_name", "credits",
+                 "exam_form", "workload", "type", "keywords", "available_programs", "course_url"]
+SCORE_FIELDS = ["row_id", "text", "score_skills_sigmoid", "score_product_sigmoid", "score_venture_sigmoid",
+                "score_foundations_sigmoid", "embedding"]
+LEVELS = ["BA1", "BA2", "BA3", "BA4", "BA5", "BA6", "MA1", "MA2", "MA3", "MA4"]
+PROGRAMS = 66
+KEYWORDS_PER_OFFERING = 14
+VECTOR_POOL = 256  # distinct vectors cycled through; the importer parses every row regardless
+
+
+def _row_id(seed: int, index: int) -> str:
+    return hashlib.sha1(f"{seed}:{index}".encode("utf-8")).hexdigest()[:16]
+
+
+def write_corpus(directory: Path, offerings: int, dim: int = 1024, seed: int = 0) -> Tuple[Path, Path]:
+    """Write a synthetic epfl_courses.csv and courses_scores.csv with ``offerings`` rows."""
+    rng = random.Random(seed)
+    courses = max(1, round(offerings / 1.5))
+    vocabulary = max(100, int(offerings * 6.6))
+    pool = []
+    for _ in range(VECTOR_POOL):
+        vector = array("f", (rng.gauss(0.0, 1.0) for _ in range(dim)))
+        norm = sum(x * x for x in vector) ** 0.5 or 1.0
+        pool.append(json.dumps(array("f", (x / norm for x in vector)).tolist(), separators=(",", ":")))
+
+    courses_csv, scores_csv = directory / "epfl_courses.csv", directory / "courses_scores.csv"
+    with courses_csv.open("w", newline="", encoding="utf-8") as cfp, scores_csv.open("w", newline="", encoding="utf-8") as sfp:
+        course_writer = csv.DictWriter(cfp, fieldnames=COURSE_FIELDS)
+        score_writer = csv.DictWriter(sfp, fieldnames=SCORE_FIELDS)
+        course_writer.writeheader()
+        score_writer.writeheader()
+        for index in range(offerings):
+            course, occurrence = index % courses, index // courses
+            row_id = _row_id(seed, index)
+            name = f"Synthetic course {course}"
+            keywords = sorted({f"keyword {rng.randrange(vocabulary)}" for _ in range(KEYWORDS_PER_OFFERING)})
+            programs = sorted({f"{rng.choice(LEVELS)} Program {rng.randrange(PROGRAMS)}" for _ in range(rng.randint(3, 8))})
+            course_writer.writerow({
+                "row_id": row_id,
+                "course_code": f"SYN-{course:06d}",
+                "lang": rng.choice(["english", "french"]),
+                "section": f"S{occurrence}",
+                "semester": rng.choice(["winter", "summer"]),
+                "prof_name": f"Prof {rng.randrange(offerings // 3 + 1)}",
+                "course_name": name,
+                "credits": str(rng.randint(2, 8)),
+                "exam_form": rng.choice(["Written", "Oral", "During the semester"]),
+                "workload": f"{rng.randint(2, 6)}hrs/week",
+                "type": rng.choice(["mandatory", "optional"]),
+                "keywords": str(keywords),
+                "available_programs": str(programs),
+                "course_url": f"https://edu.epfl.ch/coursebook/en/SYN-{course:06d}",
+            })
+            score_writer.writerow({
+                "row_id": row_id,
+                "text": f"{name} {keywords}",
+                "score_skills_sigmoid": f"{rng.random():.5f}",
+                "score_product_sigmoid": f"{rng.random():.5f}",
+                "score_venture_sigmoid": f"{rng.random():.5f}",
+                "score_foundations_sigmoid": f"{rng.random():.5f}",
+                "embedding": pool[index % VECTOR_POOL],
+            })
+    return courses_csv, scores_csv
+
+
+def change_corpus(courses_csv: Path, fraction: float, seed: int = 1) -> Dict[str, int]:
+    """Edit ``fraction`` of the offerings in place: new prof name, an extra keyword, or dropped."""
+    rng = random.Random(seed)
+    tmp_path = courses_csv.with_suffix(".tmp")
+    changes = {"prof_name": 0, "keyword": 0, "dropped": 0}
+    with courses_csv.open(newline="", encoding="utf-8") as src, tmp_path.open("w", newline="", encoding="utf-8") as dst:
+        reader = csv.DictReader(src)
+        writer = csv.DictWriter(dst, fieldnames=reader.fieldnames or COURSE_FIELDS)
+        writer.writeheader()
+        for row in reader:
+            if rng.random() < fraction:
+                kind = rng.choice(list(changes))
+                changes[kind] += 1
+                if kind == "dropped":
+                    continue
+                if kind == "prof_name":
+                    row["prof_name"] = f"{row['prof_name']} Jr"
+                else:
+                    row["keywords"] = row["keywords"][:-1] + ", 'changed keyword']"
+            writer.writerow(row)
+    os.replace(tmp_path, courses_csv)
+    return changes
+
+
+def _run_import(args: List[str], log_path: Path) -> Tuple[float, float | None]:
+    """Run the importer in a child process; returns (seconds, peak RSS in MiB)."""
+    started = time.perf_counter()
+    with log_path.open("a", encoding="utf-8") as log:
+        log.write(f"$ import_from_csv.py {' '.join(args)}\n")
+        log.flush()
+        proc = subprocess.Popen([sys.executable, str(IMPORTER), *args], stdout=log, stderr=subprocess.STDOUT)
+        peak = None
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            peak = usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        else:
+            proc.wait()
+    elapsed = time.perf_counter() - started
+    if proc.returncode:
+        tail = log_path.read_text(encoding="utf-8").splitlines()[-20:]
+        raise RuntimeError("import failed:\n" + "\n".join(tail))
+    return elapsed, peak
+
+
+def _snapshot(server: LocalPostgrest) -> Tuple[int, int]:
+    requests_made = sum(entry["requests"] for entry in server.stats.values())
+    return requests_made, sum(entry["bytes_in"] for entry in server.stats.values())
+
+
+def bench_size(offerings: int, args: argparse.Namespace, workdir: Path) -> List[Dict[str, object]]:
+    workdir.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    courses_csv, scores_csv = write_corpus(workdir, offerings, args.dim, args.seed)
+    size_mb = (courses_csv.stat().st_size + scores_csv.stat().st_size) / 2**20
+    print(f"Generated {offerings} offerings ({size_mb:.0f} MiB of CSV) in {time.perf_counter() - started:.1f}s")
+
+    results = []
+    with LocalPostgrest(str(workdir / "stand-in.sqlite3"), latency=args.latency_ms / 1000) as server:
+        base = [
+            "--supabase-url", server.url,
+            "--service-role-key", "local",
+            "--courses-csv", str(courses_csv),
+            "--scores-csv", str(scores_csv),
+            "--related-csv", str(workdir / "related_courses.csv"),
+            "--manifest", str(workdir / "manifest.json"),
+            *shlex.split(args.import_args),
+        ]
+        runs = [("full", []), ("no-op delta", ["--delta"]), (f"changed {args.change_fraction:.0%}", ["--delta", "--delete-missing"])]
+        for label, extra in runs:
+            if extra and "--delete-missing" in extra:
+                changes = change_corpus(courses_csv, args.change_fraction, args.seed + 1)
+                print(f"Changed offerings: {changes}")
+            before = _snapshot(server)
+            seconds, peak = _run_import(base + extra, workdir / "import.log")
+            after = _snapshot(server)
+            results.append({
+                "offerings": offerings,
+                "run": label,
+                "seconds": seconds,
+                "peak_mib": peak,
+                "requests": after[0] - before[0],
+                "sent_mib": (after[1] - before[1]) / 2**20,
+            })
+            print(_format(results[-1]))
+        rows = {table: server.query(f'select count(*) from "{table}"')[0][0] for table in ("courses", "course_offerings", "offering_tags", "course_embeddings")}
+        print(f"Stand-in rows: {rows}")
+    return results
+
+
+def _format(result: Dict[str, object]) -> str:
+    peak = "n/a" if result["peak_mib"] is None else f"{result['peak_mib']:.0f}"
+    return (f"{result['offerings']:>9}  {result['run']:<14} {result['seconds']:>8.1f}  {peak:>8}  "
+            f"{result['requests']:>8}  {result['sent_mib']:>9.1f}")
+
+
+def _parse_args(argv: List[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark full and delta imports against a local PostgREST stand-in")
+    parser.add_argument("--offerings", type=int, nargs="+", default=[10_000, 50_000], help="Corpus sizes (default: 10000 50000)")
+    parser.add_argument("--dim", type=int, default=1024, help="Embedding dimensions (default: 1024)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay the stand-in adds to every response (default: 0)")
+    parser.add_argument("--change-fraction", type=float, default=0.01, help="Share of offerings edited before the last run (default: 0.01)")
+    parser.add_argument("--import-args", default="", help="Extra import_from_csv.py arguments, e.g. \"--max-in-flight 8\"")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus seed (default: 0)")
+    parser.add_argument("--keep", type=Path, default=None, help="Keep corpora, stand-in databases and logs in this directory")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = _parse_args(argv)
+    root = args.keep or Path(tempfile.mkdtemp(prefix="bench-import-"))
+    results = []
+    try:
+        for offerings in args.offerings:
+            results.extend(bench_size(offerings, args, root / f"offerings-{offerings}"))
+    finally:
+        if args.keep is None:
+            shutil.rmtree(root, ignore_errors=True)
+    print()
+    print(f"{'offerings':>9}  {'run':<14} {'seconds':>8}  {'peak MiB':>8}  {'requests':>8}  {'sent MiB':>9}")
+    for result in results:
+        print(_format(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
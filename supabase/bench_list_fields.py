@@ -0,0 +1,93 @@
+"""
+Benchmark the list-cell and program-label parsing done by import_from_csv.py.
+
+Usage:
+  python supabase/bench_list_fields.py [--courses-csv data-scraper/data/epfl_courses.csv]
+                                       [--repeat 5] [--scale 1]
+
+Times, over the keywords and available_programs cells of epfl_courses.csv:
+  1. literal  -- literal_list_field (ast.literal_eval per cell) and the uncached
+                 program-label regexes, as the importer used to do
+  2. fast     -- parse_list_field and the memoized parse_program_label
+and checks that both produce identical output. --scale repeats the rows to
+approximate larger corpora (program labels repeat the same way they would).
+The best of --repeat runs is reported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import import_from_csv as importer
+
+
+def _cells(courses_csv: Path, scale: int) -> Tuple[List[str], List[str]]:
+    with courses_csv.open(newline="", encoding="utf-8") as handle:
+        rows = list(csv.DictReader(handle))
+    keywords = [row.get("keywords", "") for row in rows] * scale
+    programs = [row.get("available_programs", "") for row in rows] * scale
+    return keywords, programs
+
+
+def _parse(keywords: List[str], programs: List[str], parse_list: Callable, parse_label: Callable) -> list:
+    parsed = [parse_list(cell) for cell in keywords]
+    for cell in programs:
+        labels = parse_list(cell)
+        parsed.append([(label, parse_label(label)) for label in labels])
+    return parsed
+
+
+def _best(repeat: int, run: Callable[[], list], before: Callable[[], None] = lambda: None) -> Tuple[float, list]:
+    best, result = float("inf"), []
+    for _ in range(repeat):
+        before()
+        started = time.perf_counter()
+        result = run()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def _parse_args(argv: List[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark list-cell and program-label parsing")
+    parser.add_argument("--courses-csv", type=Path, default=importer.COURSES_CSV,
+                        help="Default: data-scraper/data/epfl_courses.csv")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per parser; the fastest is reported (default: 5)")
+    parser.add_argument("--scale", type=int, default=1, help="Repeat the CSV rows this many times (default: 1)")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = _parse_args(argv)
+    keywords, programs = _cells(args.courses_csv, args.scale)
+    print(f"{len(keywords)} rows from {args.courses_csv}")
+
+    uncached_label = importer.parse_program_label.__wrapped__
+    literal_seconds, expected = _best(
+        args.repeat, lambda: _parse(keywords, programs, importer.literal_list_field, uncached_label)
+    )
+    # the label cache starts empty on every run, as it does for one import
+    fast_seconds, actual = _best(
+        args.repeat,
+        lambda: _parse(keywords, programs, importer.parse_list_field, importer.parse_program_label),
+        importer.parse_program_label.cache_clear,
+    )
+    if actual != expected:
+        print("[error] fast parsers disagree with ast.literal_eval / uncached labels", file=sys.stderr)
+        return 1
+
+    cells = len(keywords) + len(programs)
+    for label, seconds in (("literal", literal_seconds), ("fast", fast_seconds)):
+        print(f"  {label:<8} {seconds * 1000:8.1f} ms  {seconds / cells * 1e6:6.2f} us/cell")
+    info = importer.parse_program_label.cache_info()
+    print(f"[ok] identical output, {literal_seconds / fast_seconds:.1f}x faster; "
+          f"program labels: {info.hits} cache hits, {info.misses} misses")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,19 +8,65 @@ Usage:
 
 Requirements:
   - Python 3.11+
-  - pip install requests
+  - pip install requests (and psycopg[binary] for --backend postgres)
   - CSV inputs generated by data-scraper:
       data-scraper/data/epfl_courses.csv
       data-scraper/data/courses_scores.csv
+      data-scraper/data/related_courses.csv (optional, from data-scraper/related_courses.py)
 
 The script performs bulk upserts in this order:
   1. courses
   2. tags (keywords)
   3. course_offerings
-  4. offering_tags (keywords)
-  5. programs
-  6. levels
-  7. offering_program_levels
+  4. programs, levels
+  5. (id lookups for tags, offerings, programs and levels, fetched concurrently)
+  6. offering_tags (keywords)
+  7. course_embeddings
+  8. offering_program_levels
+  9. related_courses (only if related_courses.csv exists)
+
+Writes use Prefer: return=minimal; only the courses upsert asks for
+id,course_code back. The timing summary includes bytes sent and received per
+table.
+
+courses_scores.csv is read once into a small per-row score index; embeddings
+are spilled to a temporary file as float32 and read back one at a time when
+the embedding batches are uploaded, so memory does not grow with the vectors.
+
+Bodies are compact JSON; embedding floats are rounded to --float-digits
+significant digits (9 by default, which is exact for pgvector's float4
+storage), and --compress gzip|zstd sends them with a Content-Encoding for
+gateways that accept compressed requests.
+
+Batches are sent --max-in-flight at a time on a thread pool, transient
+failures (connection errors, 429/5xx) are retried, and a per-table timing
+summary is printed at the end.
+
+Id lookups read the exact row count first (HEAD with Prefer: count=exact)
+and then fetch every page range concurrently, merging pages in id order.
+--pagination keyset walks the table with id=gt.<last id> instead, which stays
+cheap on very large tables where deep offsets get slow.
+
+Every run records a fingerprint of each pushed row in a local manifest
+(supabase/.import-manifest.json, per project URL). With --delta only rows that
+are new or changed since the last successful import are sent; with
+--delete-missing, courses, offerings, embeddings and link rows that were
+imported before but are gone from the CSVs are deleted. Run without --delta
+after resetting the database, since the manifest cannot see remote changes.
+
+--backend postgres skips PostgREST: it connects with psycopg (--database-url),
+COPYs every table into temporary staging tables and merges them with
+INSERT ... ON CONFLICT in one transaction, resolving ids with joins. Rows
+whose content is unchanged are not rewritten, and --delete-missing makes the
+tables mirror the CSVs.
+
+--backend rpc keeps PostgREST but moves the merge into the database: each
+course becomes one JSON document with its offerings, keywords, program labels
+and embedding nested, and batches of --batch-size documents are POSTed to
+/rest/v1/rpc/import_courses_batch (see init_postgres.sql), which upserts and
+links everything in one transaction per call. --delta sends only courses whose
+document changed; --delete-missing also prunes offerings and links missing
+from a sent document and deletes courses gone from the CSVs.
 
 It matches the schema created by supabase/init_postgres.sql.
 """
@@ -30,13 +76,22 @@ from __future__ import annotations
 import argparse
 import ast
 import csv
+import functools
+import gzip
+import hashlib
 import json
 import os
 import re
 import sys
-from collections import defaultdict
+import threading
+import tempfile
+import time
+from array import array
+from collections import defaultdict, deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Tuple
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
 
 import requests
 
@@ -46,6 +101,12 @@ ENV_PATH = Path(__file__).resolve().parent / ".env"
 DATA_DIR = ROOT / "data-scraper" / "data"
 COURSES_CSV = DATA_DIR / "epfl_courses.csv"
 SCORES_CSV = DATA_DIR / "courses_scores.csv"
+RELATED_CSV = DATA_DIR / "related_courses.csv"
+MANIFEST_PATH = Path(__file__).resolve().parent / ".import-manifest.json"
+# pgvector columns; their floats are rounded to --float-digits significant digits on the wire
+VECTOR_COLUMNS = ("embedding",)
+# --backend rpc: defined in init_postgres.sql
+RPC_FUNCTION = "import_courses_batch"
 
 
 def load_env_file(path: Path) -> None:
@@ -63,7 +124,7 @@ def load_env_file(path: Path) -> None:
             os.environ[key] = value
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
     load_env_file(ENV_PATH)
     parser = argparse.ArgumentParser(description="Import EPFL courses into Supabase")
     parser.add_argument("--supabase-url", default=os.getenv("SUPABASE_URL"), help="Supabase project URL")
@@ -72,27 +133,180 @@ def parse_args() -> argparse.Namespace:
         default=os.getenv("SUPABASE_SERVICE_ROLE_KEY"),
         help="Supabase service role key (required for inserts)",
     )
+    parser.add_argument(
+        "--backend",
+        choices=["rest", "rpc", "postgres"],
+        default="rest",
+        help="rest: PostgREST upserts (default); rpc: batches of course documents sent to "
+             "public.import_courses_batch; postgres: COPY + INSERT ... ON CONFLICT over a direct connection",
+    )
+    parser.add_argument(
+        "--database-url",
+        default=os.getenv("SUPABASE_DB_URL") or os.getenv("DATABASE_URL"),
+        help="Postgres connection string for --backend postgres (Project Settings → Database)",
+    )
     parser.add_argument(
         "--batch-size",
         type=int,
         default=200,
-        help="Number of rows per upsert batch (default: 200)",
+        help="Number of rows per upsert batch, or courses per call with --backend rpc (default: 200)",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=4,
+        help="Number of batches uploaded concurrently (default: 4)",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=3,
+        help="Retries per request on connection errors or 429/5xx responses (default: 3)",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=["none", "gzip", "zstd"],
+        default="none",
+        help="Content-Encoding for write bodies; falls back to uncompressed if the server answers 415 (default: none)",
+    )
+    parser.add_argument(
+        "--float-digits",
+        type=int,
+        default=9,
+        help="Significant digits sent for embedding floats; 9 is exact for pgvector's float4, 0 sends them unrounded "
+             "(default: 9)",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--pagination",
+        choices=["parallel", "keyset"],
+        default="parallel",
+        help="How id lookups page through tables: concurrent Range pages after an exact count (default), "
+             "or sequential keyset pages on id for very large tables",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Only send rows that are new or changed since the last import recorded in the manifest",
+    )
+    parser.add_argument(
+        "--delete-missing",
+        action="store_true",
+        help="Delete courses, offerings, embeddings and links that were imported before but are no longer in the CSVs",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=MANIFEST_PATH,
+        help="Fingerprints of the last import (default: supabase/.import-manifest.json)",
+    )
+    parser.add_argument("--courses-csv", type=Path, default=COURSES_CSV, help="Default: data-scraper/data/epfl_courses.csv")
+    parser.add_argument("--scores-csv", type=Path, default=SCORES_CSV, help="Default: data-scraper/data/courses_scores.csv")
+    parser.add_argument(
+        "--related-csv",
+        type=Path,
+        default=RELATED_CSV,
+        help="Default: data-scraper/data/related_courses.csv (skipped if missing)",
+    )
+    return parser.parse_args(argv)
+
+
+class UnsupportedEncoding(RuntimeError):
+    """The server rejected a compressed request body (HTTP 415)."""
+
+
+def compact_vector(values: Iterable[float], digits: int) -> List[float]:
+    """Round to ``digits`` significant digits; json.dumps then writes the short repr."""
+    fmt = f".{digits}g"
+    return [float(format(value, fmt)) for value in values]
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6, mtime=0)
+    if encoding == "zstd":
+        try:
+            import zstandard
+        except ImportError as exc:  # optional dependency, only needed for --compress zstd
+            raise RuntimeError("--compress zstd requires zstandard: pip install zstandard") from exc
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    return body
 
 
 class SupabaseClient:
-    def __init__(self, base_url: str, service_role_key: str, batch_size: int = 200):
+    """Minimal PostgREST client.
+
+    Chunked writes run on a bounded thread pool (``max_in_flight`` requests at
+    a time); results come back in chunk order. Every write here is idempotent
+    (merge-duplicates / ignore-duplicates upserts), so requests that fail with
+    a connection error or a retryable status are retried with backoff.
+
+    Write bodies are compact JSON with ``VECTOR_COLUMNS`` rounded to
+    ``float_digits`` significant digits, optionally gzip/zstd compressed. If
+    the server answers 415 to a compressed body, compression is switched off
+    for the rest of the run and the chunk is resent as-is.
+    """
+
+    RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        base_url: str,
+        service_role_key: str,
+        batch_size: int = 200,
+        max_in_flight: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        pagination: str = "parallel",
+        compression: str = "none",
+        float_digits: int | None = 9,
+    ):
         self.base_url = base_url.rstrip("/")
         self.service_role_key = service_role_key
         self.batch_size = max(1, batch_size)
-        self.session = requests.Session()
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.pagination = pagination
+        self.compression = compression
+        self.float_digits = float_digits or None
+        compress_body(b"", compression)  # fail early if the codec is not installed
+        # caps requests in flight across all pools (lookups run paged selects concurrently)
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self._local = threading.local()
         self.default_headers = {
             "apikey": service_role_key,
             "Authorization": f"Bearer {service_role_key}",
             "Content-Type": "application/json",
             "Accept": "application/json",
         }
+        self._timings_lock = threading.Lock()
+        self.timings: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def session(self) -> requests.Session:
+        # requests.Session is not thread-safe; keep one per worker thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def _record(self, table: str, *, requests_made: int = 0, rows: int = 0, retries: int = 0,
+                request_seconds: float = 0.0, wall_seconds: float = 0.0,
+                bytes_sent: int = 0, bytes_received: int = 0) -> None:
+        with self._timings_lock:
+            entry = self.timings.setdefault(
+                table,
+                {"requests": 0, "rows": 0, "retries": 0, "request_seconds": 0.0, "wall_seconds": 0.0,
+                 "bytes_sent": 0, "bytes_received": 0},
+            )
+            entry["bytes_sent"] += bytes_sent
+            entry["bytes_received"] += bytes_received
+            entry["requests"] += requests_made
+            entry["rows"] += rows
+            entry["retries"] += retries
+            entry["request_seconds"] += request_seconds
+            entry["wall_seconds"] += wall_seconds
 
     def _request(
         self,
@@ -102,19 +316,45 @@ class SupabaseClient:
         params: Dict[str, Any] | None = None,
         headers: Dict[str, str] | None = None,
         data: Any | None = None,
+        retry: bool = True,
     ) -> requests.Response:
+        """Send one request; ``retry=False`` for anything that is not safe to replay."""
         url = f"{self.base_url}{path}"
         all_headers = dict(self.default_headers)
         if headers:
             all_headers.update(headers)
-        resp = self.session.request(
-            method,
-            url,
-            params=params,
-            data=data,
-            headers=all_headers,
-            timeout=60,
-        )
+        table = path.rsplit("/", 1)[-1]
+        sent = len(data) if isinstance(data, (str, bytes)) else 0
+        attempts = self.max_retries + 1 if retry else 1
+        for attempt in range(attempts):
+            started = time.perf_counter()
+            try:
+                with self._in_flight:
+                    resp = self.session.request(
+                        method,
+                        url,
+                        params=params,
+                        data=data,
+                        headers=all_headers,
+                        timeout=60,
+                    )
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(table, requests_made=1, retries=int(attempt > 0), bytes_sent=sent,
+                             request_seconds=time.perf_counter() - started)
+                if attempt + 1 >= attempts:
+                    raise
+                time.sleep(self.retry_backoff * 2**attempt)
+                continue
+            self._record(table, requests_made=1, retries=int(attempt > 0), bytes_sent=sent,
+                         bytes_received=len(resp.content), request_seconds=time.perf_counter() - started)
+            if resp.status_code == 415 and "Content-Encoding" in all_headers:
+                raise UnsupportedEncoding(f"{method} {path}: server does not accept {all_headers['Content-Encoding']} bodies")
+            if resp.status_code in self.RETRY_STATUSES and attempt + 1 < attempts:
+                retry_after = resp.headers.get("Retry-After", "")
+                delay = float(retry_after) if retry_after.isdigit() else self.retry_backoff * 2**attempt
+                time.sleep(delay)
+                continue
+            break
         if not resp.ok:
             try:
                 err = resp.json()
@@ -123,25 +363,162 @@ class SupabaseClient:
             raise RuntimeError(f"{method} {path} failed: {resp.status_code} {err}")
         return resp
 
-    def upsert(self, table: str, rows: Iterable[Dict[str, Any]], on_conflict: str) -> List[Dict[str, Any]]:
-        all_rows = list(rows)
+    def _post_chunks(
+        self,
+        table: str,
+        rows: Iterable[Dict[str, Any]],
+        headers: Dict[str, str],
+        params: Dict[str, Any] | None = None,
+        path: str | None = None,
+        wrap: Callable[[List[Dict[str, Any]]], Any] | None = None,
+    ) -> List[requests.Response]:
+        """POST ``rows`` in ``batch_size`` chunks, up to ``max_in_flight`` at once; responses keep chunk order.
+
+        ``rows`` may be a generator: chunks are pulled only as uploads finish,
+        so at most ``2 * max_in_flight`` chunks are held at a time. ``wrap``
+        builds the body around a chunk (e.g. RPC arguments) for ``path``.
+        """
+        started = time.perf_counter()
+        path = path or f"/rest/v1/{table}"
+
+        def send(chunk: List[Dict[str, Any]]) -> requests.Response:
+            body = self._encode(chunk, wrap)
+            encoding = self.compression
+            if encoding != "none":
+                try:
+                    return self._request(
+                        "POST",
+                        path,
+                        params=params,
+                        headers={**headers, "Content-Encoding": encoding},
+                        data=compress_body(body, encoding),
+                    )
+                except UnsupportedEncoding as exc:
+                    if self.compression != "none":
+                        self.compression = "none"
+                        print(f"Warning: {exc}; sending uncompressed")
+            return self._request("POST", path, params=params, headers=headers, data=body)
+
+        responses: List[requests.Response] = []
+        row_count = 0
+        if self.max_in_flight == 1:
+            for chunk in chunked(rows, self.batch_size):
+                row_count += len(chunk)
+                responses.append(send(chunk))
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+                pending: deque = deque()
+                for chunk in chunked(rows, self.batch_size):
+                    row_count += len(chunk)
+                    pending.append(pool.submit(send, chunk))
+                    if len(pending) >= 2 * self.max_in_flight:
+                        responses.append(pending.popleft().result())
+                responses.extend(future.result() for future in pending)
+        if row_count:
+            self._record(table, rows=row_count, wall_seconds=time.perf_counter() - started)
+        return responses
+
+    def rows_written(self, table: str) -> int:
+        return int(self.timings.get(table, {}).get("rows", 0))
+
+    def _encode(
+        self, chunk: List[Dict[str, Any]], wrap: Callable[[List[Dict[str, Any]]], Any] | None = None
+    ) -> bytes:
+        vector_columns = [col for col in VECTOR_COLUMNS if chunk and col in chunk[0]]
+        if self.float_digits and vector_columns:
+            chunk = [
+                {**row, **{col: compact_vector(row[col], self.float_digits) for col in vector_columns if row[col] is not None}}
+                for row in chunk
+            ]
+        body = wrap(chunk) if wrap else chunk
+        return json.dumps(body, separators=(",", ":"), default=list).encode("utf-8")
+
+    def upsert(
+        self, table: str, rows: Iterable[Dict[str, Any]], on_conflict: str, returning: str | None = None
+    ) -> List[Dict[str, Any]]:
+        """Merge ``rows`` on ``on_conflict``.
+
+        Nothing is sent back (``return=minimal``) unless ``returning`` names the
+        columns to return, e.g. ``"id,course_code"``.
+        """
         results: List[Dict[str, Any]] = []
-        if not all_rows:
-            return results
-        headers = {"Prefer": "resolution=merge-duplicates,return=representation"}
         params = {"on_conflict": on_conflict}
-        for chunk in chunked(all_rows, self.batch_size):
-            resp = self._request("POST", f"/rest/v1/{table}", params=params, headers=headers, data=json.dumps(chunk))
-            results.extend(resp.json())
+        if returning:
+            headers = {"Prefer": "resolution=merge-duplicates,return=representation"}
+            params["select"] = returning
+        else:
+            headers = {"Prefer": "resolution=merge-duplicates,return=minimal"}
+        for resp in self._post_chunks(table, rows, headers, params):
+            if returning:
+                results.extend(resp.json())
         return results
 
     def insert_ignore(self, table: str, rows: Iterable[Dict[str, Any]]) -> None:
-        rows = list(rows)
-        if not rows:
-            return
-        headers = {"Prefer": "resolution=ignore-duplicates"}
-        for chunk in chunked(rows, self.batch_size):
-            self._request("POST", f"/rest/v1/{table}", headers=headers, data=json.dumps(chunk))
+        headers = {"Prefer": "resolution=ignore-duplicates,return=minimal"}
+        self._post_chunks(table, rows, headers)
+
+    def rpc_batches(self, function: str, items: Iterable[Dict[str, Any]], arg: str, **kwargs: Any) -> List[Any]:
+        """Call ``function`` once per ``batch_size`` chunk of ``items`` (passed as ``arg``, plus ``kwargs``)."""
+        responses = self._post_chunks(
+            function,
+            items,
+            {},
+            path=f"/rest/v1/rpc/{function}",
+            wrap=lambda chunk: {arg: chunk, **kwargs},
+        )
+        return [resp.json() for resp in responses]
+
+    def lookup(self, table: str, key_columns: List[str]) -> Dict[Any, int]:
+        """Map key -> id for every row of ``table``, selecting only ``id`` and the key columns.
+
+        Single-column keys map by value, composite keys by tuple.
+        """
+        columns = ",".join(["id", *key_columns])
+        if self.pagination == "keyset":
+            rows = self.select_all_keyset(table, columns=columns)
+        else:
+            rows = self.select_all(table, columns=columns, order="id")
+        if len(key_columns) == 1:
+            return {row[key_columns[0]]: row["id"] for row in rows}
+        return {tuple(row[col] for col in key_columns): row["id"] for row in rows}
+
+    def lookups(self, specs: Dict[str, List[str]]) -> Dict[str, Dict[Any, int]]:
+        """Run several ``lookup`` calls concurrently (up to ``max_in_flight``)."""
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_in_flight, len(specs)))) as pool:
+            futures = {table: pool.submit(self.lookup, table, key_columns) for table, key_columns in specs.items()}
+            return {table: future.result() for table, future in futures.items()}
+
+    def timing_report(self) -> List[str]:
+        lines = []
+        for table, entry in self.timings.items():
+            line = (
+                f"  {table}: {entry['requests']} requests, {entry['rows']} rows written, "
+                f"{entry['bytes_sent'] / 1024:.1f} KiB sent, {entry['bytes_received'] / 1024:.1f} KiB received, "
+                f"{entry['request_seconds']:.2f}s in requests"
+            )
+            if entry["wall_seconds"]:
+                line += f", {entry['wall_seconds']:.2f}s wall for writes"
+            if entry["retries"]:
+                line += f", {entry['retries']} retries"
+            lines.append(line)
+        return lines
+
+    def delete(self, table: str, filters: Dict[str, str]) -> None:
+        self._request("DELETE", f"/rest/v1/{table}", params=filters)
+
+    def delete_keys(self, table: str, key_columns: List[str], keys: Iterable[List[Any]], chunk_size: int = 100) -> None:
+        """Delete rows by (possibly composite) key, ``chunk_size`` keys per request."""
+        for chunk in chunked(keys, chunk_size):
+            if len(key_columns) == 1:
+                values = ",".join(postgrest_value(key[0]) for key in chunk)
+                filters = {key_columns[0]: f"in.({values})"}
+            else:
+                terms = (
+                    "and(" + ",".join(f"{col}.eq.{postgrest_value(v)}" for col, v in zip(key_columns, key)) + ")"
+                    for key in chunk
+                )
+                filters = {"or": "(" + ",".join(terms) + ")"}
+            self.delete(table, filters)
 
     def select(self, table: str, *, filters: Dict[str, str] | None = None, columns: str = "*") -> List[Dict[str, Any]]:
         params = {"select": columns}
@@ -150,6 +527,36 @@ class SupabaseClient:
         resp = self._request("GET", f"/rest/v1/{table}", params=params)
         return resp.json()
 
+    def count(self, table: str, *, filters: Dict[str, str] | None = None) -> int | None:
+        """Exact row count from a HEAD request (``Prefer: count=exact``), or None if not reported."""
+        resp = self._request(
+            "HEAD",
+            f"/rest/v1/{table}",
+            params=dict(filters or {}),
+            headers={"Prefer": "count=exact", "Range-Unit": "items", "Range": "0-0"},
+        )
+        total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+
+    def _select_range(
+        self, table: str, params: Dict[str, str], start: int, end: int
+    ) -> List[Dict[str, Any]]:
+        """Rows ``start..end`` inclusive; re-requests the tail if the server caps page sizes (max-rows)."""
+        rows: List[Dict[str, Any]] = []
+        while start <= end:
+            resp = self._request(
+                "GET",
+                f"/rest/v1/{table}",
+                params=params,
+                headers={"Range-Unit": "items", "Range": f"{start}-{end}"},
+            )
+            batch = resp.json()
+            rows.extend(batch)
+            if not batch:
+                break
+            start += len(batch)
+        return rows
+
     def select_all(
         self,
         table: str,
@@ -157,26 +564,69 @@ class SupabaseClient:
         filters: Dict[str, str] | None = None,
         columns: str = "*",
         page_size: int = 1000,
+        order: str | None = None,
     ) -> List[Dict[str, Any]]:
-        """Fetch all rows by paging with Range headers (PostgREST default limit is 1000)."""
+        """Fetch all rows by paging with Range headers (PostgREST default limit is 1000).
+
+        With an ``order`` (e.g. ``"id"``), the row count is fetched first and all
+        pages are requested concurrently on the worker pool, then concatenated in
+        order. Without one, pages are fetched one after another, since unordered
+        range pages are not stable.
+        """
+        params = {"select": columns}
+        if filters:
+            params.update(filters)
+        total = None
+        if order:
+            params["order"] = order
+            total = self.count(table, filters=filters)
+
         rows: List[Dict[str, Any]] = []
         start = 0
+        if total:
+            ranges = [(lo, min(lo + page_size, total) - 1) for lo in range(0, total, page_size)]
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_in_flight, len(ranges)))) as pool:
+                for batch in pool.map(lambda bounds: self._select_range(table, params, *bounds), ranges):
+                    rows.extend(batch)
+            start = total
+        # sequential pages (or rows added since the count)
         while True:
-            end = start + page_size - 1
-            params = {"select": columns}
+            batch = self._select_range(table, params, start, start + page_size - 1)
+            rows.extend(batch)
+            if len(batch) < page_size:
+                break
+            start += page_size
+        return rows
+
+    def select_all_keyset(
+        self,
+        table: str,
+        *,
+        filters: Dict[str, str] | None = None,
+        columns: str = "*",
+        page_size: int = 1000,
+        key: str = "id",
+    ) -> List[Dict[str, Any]]:
+        """Fetch all rows ordered by ``key``, each page starting after the last key seen.
+
+        Unlike offset ranges, every page is an index range scan, so the cost per
+        page does not grow with the table size; pages are sequential by nature.
+        """
+        if columns != "*" and key not in columns.split(","):
+            columns = f"{key},{columns}"
+        rows: List[Dict[str, Any]] = []
+        last = None
+        while True:
+            params = {"select": columns, "order": f"{key}.asc", "limit": str(page_size)}
             if filters:
                 params.update(filters)
-            resp = self._request(
-                "GET",
-                f"/rest/v1/{table}",
-                params=params,
-                headers={"Range-Unit": "items", "Range": f"{start}-{end}"},
-            )
-            batch = resp.json()
+            if last is not None:
+                params[key] = f"gt.{last}"
+            batch = self._request("GET", f"/rest/v1/{table}", params=params).json()
             rows.extend(batch)
             if len(batch) < page_size:
                 break
-            start += page_size
+            last = batch[-1][key]
         return rows
 
 
@@ -191,7 +641,129 @@ def chunked(items: Iterable[Any], size: int) -> Iterable[List[Any]]:
         yield chunk
 
 
+def postgrest_value(value: Any) -> str:
+    """Format a filter value for PostgREST ``in``/``or`` lists, quoting strings."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def row_fingerprint(row: Dict[str, Any]) -> str:
+    payload = json.dumps(row, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=list)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ImportManifest:
+    """Fingerprints of the rows last pushed to one Supabase project, per table.
+
+    ``changed`` records the fingerprint of every current row (keyed by its
+    conflict columns) and, in delta mode, returns only rows that are new or
+    differ from the last successful import. Keys that were pushed before but
+    are no longer produced are reported by ``vanished``; they stay in the
+    manifest until ``forget`` is called after deleting them remotely.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: Path, target: str, delta: bool, tables: Dict[str, Dict[str, str]] | None = None):
+        self.path = path
+        self.target = target
+        self.delta = delta
+        self.previous = tables or {}
+        self.current: Dict[str, Dict[str, str]] = {}
+
+    @classmethod
+    def load(cls, path: Path, target: str, delta: bool) -> "ImportManifest":
+        tables = None
+        if path.exists():
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") == cls.VERSION and data.get("target") == target:
+                tables = data.get("tables") or {}
+            elif delta:
+                print(f"Warning: {path} was written for another project or format; doing a full import")
+        elif delta:
+            print(f"Warning: no import manifest at {path}; doing a full import")
+        return cls(path, target, delta, tables)
+
+    def changed(self, table: str, rows: Iterable[Dict[str, Any]], key_columns: List[str]) -> List[Dict[str, Any]]:
+        return list(self.iter_changed(table, rows, key_columns))
+
+    def iter_changed(
+        self, table: str, rows: Iterable[Dict[str, Any]], key_columns: List[str]
+    ) -> Iterator[Dict[str, Any]]:
+        """Lazy ``changed``; the manifest is updated as rows are consumed."""
+        previous = self.previous.get(table, {})
+        current = self.current.setdefault(table, {})
+        for row in rows:
+            key = json.dumps([row[col] for col in key_columns], ensure_ascii=False)
+            digest = row_fingerprint(row)
+            current[key] = digest
+            if not self.delta or previous.get(key) != digest:
+                yield row
+
+    def vanished(self, table: str) -> List[List[Any]]:
+        current = self.current.get(table, {})
+        return [json.loads(key) for key in self.previous.get(table, {}) if key not in current]
+
+    def forget(self, table: str, keys: Iterable[List[Any]] | None = None) -> None:
+        """Drop vanished keys of ``table``, or just ``keys`` (call once they are deleted remotely)."""
+        if keys is None:
+            self.previous[table] = {}
+            return
+        previous = self.previous.get(table, {})
+        for key in keys:
+            previous.pop(json.dumps(key, ensure_ascii=False), None)
+
+    def save(self) -> None:
+        tables: Dict[str, Dict[str, str]] = {}
+        for table in set(self.previous) | set(self.current):
+            merged = dict(self.previous.get(table, {}))
+            merged.update(self.current.get(table, {}))
+            tables[table] = merged
+        data = {"version": self.VERSION, "target": self.target, "tables": tables}
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+
+# A Python list of plain str literals, as pandas writes list cells: ['a', "b's", 'c\xa0d']. Items may
+# hold backslash escapes; prefixes, implicit concatenation, newlines and other element types do not match.
+QUOTED_ITEM = "|".join(
+    rf"{q}[^{q}\\\n\r\x00\ud800-\udfff]*(?:\\[^\n\r\x00\ud800-\udfff][^{q}\\\n\r\x00\ud800-\udfff]*)*{q}" for q in "'\""
+)
+LIST_FIELD_RE = re.compile(rf"\[[ \t]*(?:(?:{QUOTED_ITEM})[ \t]*,[ \t]*)*(?:(?:{QUOTED_ITEM})[ \t]*)?\]")
+LIST_ITEM_RE = re.compile(QUOTED_ITEM)
+
+
 def parse_list_field(value: str) -> List[str]:
+    """Stripped, non-empty items of a list cell; same result as ``literal_list_field``.
+
+    Cells that are plain lists of string literals (all of epfl_courses.csv) are
+    split with a regex and only items with escapes are evaluated; anything else
+    is left to ``ast.literal_eval``.
+    """
+    if not value:
+        return []
+    if not LIST_FIELD_RE.fullmatch(value):
+        return literal_list_field(value)
+    items = []
+    for token in LIST_ITEM_RE.findall(value):
+        if "\\" in token:
+            try:
+                token = ast.literal_eval(token)
+            except (SyntaxError, ValueError):
+                return []
+        else:
+            token = token[1:-1]
+        token = token.strip()
+        if token:
+            items.append(token)
+    return items
+
+
+def literal_list_field(value: str) -> List[str]:
+    """Reference decoder for list cells: evaluates the whole cell with ``ast.literal_eval``."""
     if not value:
         return []
     try:
@@ -220,6 +792,7 @@ def normalize_degree(token: str) -> str | None:
     return None
 
 
+@functools.lru_cache(maxsize=4096)  # labels repeat across offerings; results are immutable tuples
 def parse_program_label(label: str) -> Tuple[str, int | None, str, str] | None:
     if not label:
         return None
@@ -276,34 +849,124 @@ def coalesce(*values: Any, fallback: Any) -> Any:
     return fallback
 
 
-def load_scores(path: Path) -> Dict[str, Dict[str, Any]]:
-    scores: Dict[str, Dict[str, Any]] = {}
+SCORE_COLUMNS = ("score_skills_sigmoid", "score_product_sigmoid", "score_venture_sigmoid", "score_foundations_sigmoid")
+
+
+def parse_embedding(raw: str | None) -> array | None:
+    """JSON list -> float32 array (pgvector stores float4 anyway); None if missing, empty or malformed."""
+    if not raw:
+        return None
+    try:
+        parsed = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(parsed, list) or not parsed:
+        return None
+    try:
+        return array("f", map(float, parsed))
+    except (TypeError, ValueError):
+        return None
+
+
+class ScoresIndex:
+    """Scores per row_id, with embeddings spilled to a temporary file.
+
+    ``courses_scores.csv`` is read once; each parsed vector is appended to the
+    spill file as raw float32 and only its offset is kept in memory, so the
+    join with ``epfl_courses.csv`` reads vectors back one at a time instead of
+    holding every embedding as a list of Python floats.
+    """
+
+    def __init__(self) -> None:
+        self._scores: Dict[str, Tuple[float | None, ...]] = {}
+        self._vectors: Dict[str, Tuple[int, int]] = {}  # row_id -> (offset, length)
+        self._spill = tempfile.TemporaryFile(prefix="import-embeddings-")
+
+    @classmethod
+    def load(cls, path: Path) -> "ScoresIndex":
+        index = cls()
+        with path.open(newline="", encoding="utf-8") as handle:
+            reader = csv.DictReader(handle)
+            for row in reader:
+                row_id = row.get("row_id")
+                if not row_id:
+                    continue
+                index._scores[row_id] = tuple(parse_float(row.get(col)) for col in SCORE_COLUMNS)
+                vector = parse_embedding(row.get("embeddings") or row.get("embedding"))
+                if vector is not None:
+                    index._vectors[row_id] = (index._spill.tell(), len(vector))
+                    vector.tofile(index._spill)
+        index._spill.flush()
+        return index
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def scores(self, row_id: str) -> Dict[str, float | None]:
+        return dict(zip(SCORE_COLUMNS, self._scores.get(row_id, (None,) * len(SCORE_COLUMNS))))
+
+    def has_embedding(self, row_id: str) -> bool:
+        return row_id in self._vectors
+
+    def embedding(self, row_id: str) -> array | None:
+        location = self._vectors.get(row_id)
+        if location is None:
+            return None
+        offset, length = location
+        vector = array("f")
+        self._spill.seek(offset)
+        vector.fromfile(self._spill, length)
+        return vector
+
+
+def load_scores(path: Path) -> ScoresIndex:
+    return ScoresIndex.load(path)
+
+
+class EmbeddingsMap(Mapping):
+    """course_code -> {"embedding", "preview", "row_id"}, reading the vector from a ``ScoresIndex`` on access.
+
+    Iterating ``items()`` holds one vector at a time.
+    """
+
+    def __init__(self, scores: ScoresIndex) -> None:
+        self._scores = scores
+        self._entries: Dict[str, Tuple[str, str | None]] = {}
+
+    def add(self, course_code: str, row_id: str, preview: str | None) -> None:
+        self._entries[course_code] = (row_id, preview)
+
+    def __getitem__(self, course_code: str) -> Dict[str, Any]:
+        row_id, preview = self._entries[course_code]
+        return {"embedding": self._scores.embedding(row_id), "preview": preview, "row_id": row_id}
+
+    def __contains__(self, course_code: object) -> bool:
+        return course_code in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def load_related(path: Path) -> List[Tuple[str, str, int, float]]:
+    """Read (row_id, neighbour_id, rank, score) rows written by data-scraper/related_courses.py."""
+    related: List[Tuple[str, str, int, float]] = []
     with path.open(newline="", encoding="utf-8") as handle:
         reader = csv.DictReader(handle)
         for row in reader:
             row_id = row.get("row_id")
-            if not row_id:
+            neighbour_id = row.get("neighbour_id")
+            score = parse_float(row.get("score"))
+            if not row_id or not neighbour_id or score is None:
                 continue
-            embeddings_raw = row.get("embeddings") or row.get("embedding")
-            embeddings_vec = None
-            if embeddings_raw:
-                try:
-                    parsed = json.loads(embeddings_raw)
-                    if isinstance(parsed, list):
-                        try:
-                            embeddings_vec = [float(x) for x in parsed]
-                        except (TypeError, ValueError):
-                            embeddings_vec = None
-                except json.JSONDecodeError:
-                    embeddings_vec = None
-            scores[row_id] = {
-                "score_skills_sigmoid": parse_float(row.get("score_skills_sigmoid")),
-                "score_product_sigmoid": parse_float(row.get("score_product_sigmoid")),
-                "score_venture_sigmoid": parse_float(row.get("score_venture_sigmoid")),
-                "score_foundations_sigmoid": parse_float(row.get("score_foundations_sigmoid")),
-                "embeddings": embeddings_vec,
-            }
-    return scores
+            try:
+                rank = int(row.get("rank") or "")
+            except ValueError:
+                continue
+            related.append((row_id, neighbour_id, rank, score))
+    return related
 
 
 def parse_float(value: str | None) -> float | None:
@@ -323,7 +986,7 @@ def build_payloads(
     Dict[str, set[str]],        # keywords per course_code (for tag creation)
     set[Tuple[str, str]],       # offering_keyword_links: (row_id, keyword)
     set[Tuple[str, str, str, int | None, str]],  # offering_program_links: (row_id, degree, level_label, semester, program_name)
-    Dict[str, Dict[str, Any]],  # embeddings per course_code
+    EmbeddingsMap,              # embeddings per course_code, loaded lazily from the scores spill file
     set[str],                   # unparsed program labels (for logging)
 ]:
     if not courses_csv.exists():
@@ -331,14 +994,14 @@ def build_payloads(
     if not scores_csv.exists():
         raise FileNotFoundError(f"Missing CSV {scores_csv}")
 
-    scores_map = load_scores(scores_csv)
+    scores_index = load_scores(scores_csv)
 
     courses_map: Dict[str, Dict[str, Any]] = {}
     offerings: List[Dict[str, Any]] = []
     keywords_map: Dict[str, set[str]] = defaultdict(set)
     keyword_tag_links: set[Tuple[str, str]] = set()
     offering_program_links: set[Tuple[str, str, str, int | None, str]] = set()
-    embeddings_map: Dict[str, Dict[str, Any]] = {}
+    embeddings_map = EmbeddingsMap(scores_index)
     unparsed_program_labels: set[str] = set()
 
     with courses_csv.open(newline="", encoding="utf-8") as handle:
@@ -374,27 +1037,17 @@ def build_payloads(
 
             row_id = row.get("row_id", "").strip()
             if row_id:
-                score = scores_map.get(row_id, {})
                 offerings.append({
                     "course_code": course_code,
                     "row_id": row_id,
                     "section": row.get("section", "").strip() or "",
                     "type": row.get("type", "mandatory").strip() or "mandatory",
                     "prof_name": row.get("prof_name", "").strip() or None,
-                    "score_skills_sigmoid": score.get("score_skills_sigmoid"),
-                    "score_product_sigmoid": score.get("score_product_sigmoid"),
-                    "score_venture_sigmoid": score.get("score_venture_sigmoid"),
-                    "score_foundations_sigmoid": score.get("score_foundations_sigmoid"),
-                    "embeddings": score.get("embeddings"),
+                    **scores_index.scores(row_id),
                 })
-                emb = score.get("embeddings")
-                if emb and course_code not in embeddings_map:
+                if scores_index.has_embedding(row_id) and course_code not in embeddings_map:
                     preview = (row.get("text") or "").strip()
-                    embeddings_map[course_code] = {
-                        "embedding": emb,
-                        "preview": preview[:1000] if preview else None,
-                        "row_id": row_id,
-                    }
+                    embeddings_map.add(course_code, row_id, preview[:1000] if preview else None)
 
             keywords = parse_list_field(row.get("keywords", ""))
             for kw in keywords:
@@ -422,13 +1075,472 @@ def build_payloads(
     )
 
 
-def main() -> None:
-    args = parse_args()
+def build_program_rows(offering_program_links: Iterable[Tuple[str, str, str, int | None, str]]) -> List[Dict[str, Any]]:
+    return [
+        {"name": program_name.strip()}
+        for program_name in sorted({entry[4].strip() for entry in offering_program_links if entry[4].strip()})
+    ]
+
+
+def build_level_rows(offering_program_links: Iterable[Tuple[str, str, str, int | None, str]]) -> List[Dict[str, Any]]:
+    return [
+        {"degree": degree, "semester": semester, "label": level_label}
+        for degree, semester, level_label in sorted({(entry[1], entry[3] if entry[3] is not None else 10_000, entry[2]) for entry in offering_program_links})
+    ]
+
+
+def build_course_documents(
+    courses_map: Dict[str, Dict[str, Any]],
+    offerings: List[Dict[str, Any]],
+    keyword_tag_links: Iterable[Tuple[str, str]],
+    offering_program_links: Iterable[Tuple[str, str, str, int | None, str]],
+    embeddings_map: Mapping,
+) -> Iterator[Dict[str, Any]]:
+    """One document per course, with its offerings, keywords and program labels nested.
+
+    This is the ``courses`` argument of ``public.import_courses_batch``. Lists
+    are sorted so unchanged courses fingerprint the same; embeddings are read
+    one course at a time as the documents are consumed.
+    """
+    keywords: Dict[str, List[str]] = defaultdict(list)
+    for row_id, keyword in sorted(keyword_tag_links):
+        keywords[row_id].append(keyword)
+    programs: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row_id, degree, level_label, semester, program_name in sorted(
+        offering_program_links, key=lambda link: (link[0], link[1], link[2], -1 if link[3] is None else link[3], link[4])
+    ):
+        programs[row_id].append(
+            {"degree": degree, "level_label": level_label, "semester": semester, "program_name": program_name}
+        )
+    course_offerings: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for item in offerings:
+        offering = {key: value for key, value in item.items() if key != "course_code"}
+        offering["keywords"] = keywords.get(item["row_id"], [])
+        offering["programs"] = programs.get(item["row_id"], [])
+        course_offerings[item["course_code"]].append(offering)
+
+    for course_code, course in courses_map.items():
+        data = embeddings_map[course_code] if course_code in embeddings_map else {}
+        yield {
+            **course,
+            "embedding": data.get("embedding"),
+            "preview": data.get("preview"),
+            "offerings": course_offerings.get(course_code, []),
+        }
+
+
+# --- Direct Postgres backend -------------------------------------------------
+#
+# Each table is COPY'd into an ON COMMIT DROP staging table keyed by natural
+# keys (course_code, row_id, names), then merged with INSERT ... ON CONFLICT.
+# Foreign keys are resolved with joins against the target tables, so there are
+# no id round-trips, and the whole import is one transaction.
+
+PG_STAGING_TABLES = {
+    "stage_courses": "course_code text, course_name text, course_url text, credits integer, lang text, "
+                     "semester text, exam_form text, workload text",
+    "stage_tags": "name text",
+    "stage_offerings": "course_code text, row_id text, section text, type text, prof_name text, "
+                       "score_skills_sigmoid numeric, score_product_sigmoid numeric, "
+                       "score_venture_sigmoid numeric, score_foundations_sigmoid numeric",
+    "stage_offering_tags": "row_id text, name text",
+    "stage_embeddings": "course_code text, embedding text, preview text",
+    "stage_programs": "name text",
+    "stage_levels": "degree text, semester smallint, label text",
+    "stage_program_links": "row_id text, degree text, level_label text, program_name text",
+    "stage_related": "ord integer, row_id text, neighbour_row_id text, rank smallint, score real",
+}
+
+PG_MERGES = [
+    ("courses", """
+        insert into public.courses as t (course_code, course_name, course_url, credits, lang, semester, exam_form, workload)
+        select course_code, course_name, course_url, credits, lang, semester, exam_form, workload from stage_courses
+        on conflict (course_code) do update set
+          course_name = excluded.course_name, course_url = excluded.course_url, credits = excluded.credits,
+          lang = excluded.lang, semester = excluded.semester, exam_form = excluded.exam_form, workload = excluded.workload
+        where (t.course_name, t.course_url, t.credits, t.lang, t.semester, t.exam_form, t.workload)
+          is distinct from (excluded.course_name, excluded.course_url, excluded.credits, excluded.lang,
+                            excluded.semester, excluded.exam_form, excluded.workload)
+    """),
+    ("tags", """
+        insert into public.tags (tag_type_id, name)
+        select tt.id, s.name from stage_tags s join public.tag_types tt on tt.name = 'keywords'
+        on conflict (tag_type_id, name) do nothing
+    """),
+    ("course_offerings", """
+        insert into public.course_offerings as t (course_id, row_id, section, type, prof_name, score_skills_sigmoid,
+                                                  score_product_sigmoid, score_venture_sigmoid, score_foundations_sigmoid)
+        select c.id, s.row_id, s.section, s.type::course_type, s.prof_name, s.score_skills_sigmoid,
+               s.score_product_sigmoid, s.score_venture_sigmoid, s.score_foundations_sigmoid
+        from stage_offerings s join public.courses c on c.course_code = s.course_code
+        on conflict (row_id) do update set
+          course_id = excluded.course_id, section = excluded.section, type = excluded.type, prof_name = excluded.prof_name,
+          score_skills_sigmoid = excluded.score_skills_sigmoid, score_product_sigmoid = excluded.score_product_sigmoid,
+          score_venture_sigmoid = excluded.score_venture_sigmoid, score_foundations_sigmoid = excluded.score_foundations_sigmoid
+        where (t.course_id, t.section, t.type, t.prof_name, t.score_skills_sigmoid, t.score_product_sigmoid,
+               t.score_venture_sigmoid, t.score_foundations_sigmoid)
+          is distinct from (excluded.course_id, excluded.section, excluded.type, excluded.prof_name,
+                            excluded.score_skills_sigmoid, excluded.score_product_sigmoid,
+                            excluded.score_venture_sigmoid, excluded.score_foundations_sigmoid)
+    """),
+    ("offering_tags", """
+        insert into public.offering_tags (offering_id, tag_id)
+        select distinct o.id, tg.id
+        from stage_offering_tags s
+        join public.course_offerings o on o.row_id = s.row_id
+        join public.tag_types tt on tt.name = 'keywords'
+        join public.tags tg on tg.tag_type_id = tt.id and tg.name = s.name
+        on conflict do nothing
+    """),
+    ("course_embeddings", """
+        insert into public.course_embeddings as t (course_id, embedding, preview, source_url)
+        select c.id, s.embedding::vector, s.preview, c.course_url
+        from stage_embeddings s join public.courses c on c.course_code = s.course_code
+        on conflict (course_id) do update set
+          embedding = excluded.embedding, preview = excluded.preview, source_url = excluded.source_url
+        where (t.embedding, t.preview, t.source_url) is distinct from (excluded.embedding, excluded.preview, excluded.source_url)
+    """),
+    ("programs", """
+        insert into public.programs (name) select name from stage_programs
+        on conflict (name) do nothing
+    """),
+    ("levels", """
+        insert into public.levels as t (degree, semester, label)
+        select degree::degree_type, semester, label from stage_levels
+        on conflict (degree, label) do update set semester = excluded.semester
+        where t.semester is distinct from excluded.semester
+    """),
+    ("offering_program_levels", """
+        insert into public.offering_program_levels (offering_id, program_id, level_id)
+        select distinct o.id, p.id, l.id
+        from stage_program_links s
+        join public.course_offerings o on o.row_id = s.row_id
+        join public.programs p on p.name = s.program_name
+        join public.levels l on l.degree = s.degree::degree_type and l.label = s.level_label
+        on conflict do nothing
+    """),
+    ("related_courses", """
+        insert into public.related_courses as t (course_id, rank, neighbour_id, score)
+        select distinct on (o.course_id, s.rank) o.course_id, s.rank, n.course_id, s.score
+        from stage_related s
+        join public.course_offerings o on o.row_id = s.row_id
+        join public.course_offerings n on n.row_id = s.neighbour_row_id
+        where o.course_id <> n.course_id
+        order by o.course_id, s.rank, s.ord
+        on conflict (course_id, rank) do update set neighbour_id = excluded.neighbour_id, score = excluded.score
+        where (t.neighbour_id, t.score) is distinct from (excluded.neighbour_id, excluded.score)
+    """),
+]
+
+# Each imported course's neighbours are replaced as a set: ranks it no longer has (a smaller k,
+# --min-score, neighbours that no longer resolve) are deleted even without --delete-missing.
+PG_RELATED_PRUNE = """
+    delete from public.related_courses t
+    using public.courses c
+    where c.id = t.course_id
+      and exists (select 1 from stage_courses s where s.course_code = c.course_code)
+      and not exists (
+        select 1 from stage_related s
+        join public.course_offerings o on o.row_id = s.row_id
+        join public.course_offerings n on n.row_id = s.neighbour_row_id
+        where o.course_id = t.course_id and s.rank = t.rank and o.course_id <> n.course_id)
+"""
+
+# children first; tags, programs and levels are shared lookup rows and are kept
+PG_DELETES = [
+    ("related_courses", """
+        delete from public.related_courses t where not exists (
+          select 1 from stage_related s join public.course_offerings o on o.row_id = s.row_id
+          where o.course_id = t.course_id and s.rank = t.rank)
+    """),
+    ("offering_program_levels", """
+        delete from public.offering_program_levels t where not exists (
+          select 1 from stage_program_links s
+          join public.course_offerings o on o.row_id = s.row_id
+          join public.programs p on p.name = s.program_name
+          join public.levels l on l.degree = s.degree::degree_type and l.label = s.level_label
+          where o.id = t.offering_id and p.id = t.program_id and l.id = t.level_id)
+    """),
+    ("offering_tags", """
+        delete from public.offering_tags t where not exists (
+          select 1 from stage_offering_tags s
+          join public.course_offerings o on o.row_id = s.row_id
+          join public.tag_types tt on tt.name = 'keywords'
+          join public.tags tg on tg.tag_type_id = tt.id and tg.name = s.name
+          where o.id = t.offering_id and tg.id = t.tag_id)
+    """),
+    ("course_embeddings", """
+        delete from public.course_embeddings t where not exists (
+          select 1 from stage_embeddings s join public.courses c on c.course_code = s.course_code where c.id = t.course_id)
+    """),
+    ("course_offerings", """
+        delete from public.course_offerings t where not exists (select 1 from stage_offerings s where s.row_id = t.row_id)
+    """),
+    ("courses", """
+        delete from public.courses t where not exists (select 1 from stage_courses s where s.course_code = t.course_code)
+    """),
+]
+
+
+def import_via_postgres(
+    database_url: str,
+    courses_map: Dict[str, Dict[str, Any]],
+    offerings: List[Dict[str, Any]],
+    keywords_map: Dict[str, set[str]],
+    keyword_tag_links: set[Tuple[str, str]],
+    offering_program_links: set[Tuple[str, str, str, int | None, str]],
+    embeddings_map: Mapping,
+    related: List[Tuple[str, str, int, float]] | None = None,
+    delete_missing: bool = False,
+) -> Dict[str, int]:
+    """COPY the payloads into staging tables and merge them in one transaction.
+
+    Returns the number of rows inserted or changed (or deleted, as ``-<table>``) per table.
+    ``related=None`` leaves related_courses untouched.
+    """
+    try:
+        import psycopg
+    except ImportError as exc:  # optional dependency, only needed for --backend postgres
+        raise RuntimeError("--backend postgres requires psycopg: pip install 'psycopg[binary]'") from exc
+
+    staged: Dict[str, Iterable[Tuple[Any, ...]]] = {
+        "stage_courses": (
+            (c["course_code"], c["course_name"], c["course_url"], c["credits"], c["lang"], c["semester"],
+             c["exam_form"], c["workload"])
+            for c in courses_map.values()
+        ),
+        "stage_tags": ((name,) for name in sorted({kw for tags in keywords_map.values() for kw in tags})),
+        "stage_offerings": (
+            (o["course_code"], o["row_id"], o["section"], o["type"], o["prof_name"], o["score_skills_sigmoid"],
+             o["score_product_sigmoid"], o["score_venture_sigmoid"], o["score_foundations_sigmoid"])
+            for o in offerings
+        ),
+        "stage_offering_tags": iter(keyword_tag_links),
+        "stage_embeddings": (
+            (code, json.dumps(compact_vector(data["embedding"], 9), separators=(",", ":")), data.get("preview"))
+            for code, data in embeddings_map.items()
+            if data.get("embedding") is not None
+        ),
+        "stage_programs": ((row["name"],) for row in build_program_rows(offering_program_links)),
+        "stage_levels": ((row["degree"], row["semester"], row["label"]) for row in build_level_rows(offering_program_links)),
+        "stage_program_links": (
+            (row_id, degree, level_label, program_name)
+            for row_id, degree, level_label, _semester, program_name in offering_program_links
+        ),
+        "stage_related": ((ord_, *entry) for ord_, entry in enumerate(related or [])),
+    }
+
+    counts: Dict[str, int] = {}
+    with psycopg.connect(database_url) as conn, conn.cursor() as cur:
+        started = time.perf_counter()
+        if not cur.execute("select 1 from public.tag_types where name = 'keywords'").fetchone():
+            raise RuntimeError("Missing tag types in Postgres: {'keywords'}")
+        for table, columns in PG_STAGING_TABLES.items():
+            cur.execute(f"create temp table {table} ({columns}) on commit drop")
+            names = ", ".join(col.split()[0] for col in columns.split(", "))
+            with cur.copy(f"copy {table} ({names}) from stdin") as copy:
+                for row in staged[table]:
+                    copy.write_row(row)
+        print(f"Staged rows with COPY in {time.perf_counter() - started:.2f}s")
+
+        for table, sql in PG_MERGES:
+            if table == "related_courses" and related is None:
+                continue
+            started = time.perf_counter()
+            cur.execute(sql)
+            counts[table] = cur.rowcount
+            print(f"  {table}: {cur.rowcount} rows inserted or changed in {time.perf_counter() - started:.2f}s")
+        if related is not None:
+            cur.execute(PG_RELATED_PRUNE)
+            counts["-related_courses"] = cur.rowcount
+
+        if delete_missing:
+            for table, sql in PG_DELETES:
+                if table == "related_courses" and related is None:
+                    continue
+                cur.execute(sql)
+                counts[f"-{table}"] = counts.get(f"-{table}", 0) + cur.rowcount
+                if cur.rowcount:
+                    print(f"Deleted {cur.rowcount} rows from {table} that are no longer in the CSVs")
+        cur.execute("analyze public.courses, public.course_offerings, public.course_embeddings")
+    return counts
+
+
+def main_postgres(args: argparse.Namespace) -> None:
+    if args.delta:
+        print("Note: --delta is ignored with --backend postgres; unchanged rows are skipped by the merge itself")
+    (
+        courses_map,
+        offerings,
+        keywords_map,
+        keyword_tag_links,
+        offering_program_links,
+        embeddings_map,
+        unparsed_program_labels,
+    ) = build_payloads(args.courses_csv, args.scores_csv)
+    related = load_related(args.related_csv) if args.related_csv.exists() else None
+    print(f"Preparing to import {len(courses_map)} courses, {len(offerings)} offerings over a direct connection")
+    import_via_postgres(
+        args.database_url,
+        courses_map,
+        offerings,
+        keywords_map,
+        keyword_tag_links,
+        offering_program_links,
+        embeddings_map,
+        related,
+        delete_missing=args.delete_missing,
+    )
+    if unparsed_program_labels:
+        print(
+            f"Warning: skipped {len(unparsed_program_labels)} available_program labels that could not be parsed."
+        )
+    print("Import completed")
+
+
+def import_related(
+    client: SupabaseClient,
+    manifest: ImportManifest,
+    related_csv: Path,
+    offerings: List[Dict[str, Any]],
+    course_ids: Dict[str, int],
+) -> List[Dict[str, Any]]:
+    """Upsert related_courses.csv (row_id pairs) as course id pairs; returns the rows built."""
+    related_rows: List[Dict[str, Any]] = []
+    if not related_csv.exists():
+        return related_rows
+    rowid_to_code = {item["row_id"]: item["course_code"] for item in offerings}
+    seen_related: set[Tuple[int, int]] = set()
+    for row_id, neighbour_row_id, rank, score in load_related(related_csv):
+        course_id = course_ids.get(rowid_to_code.get(row_id, ""))
+        neighbour_id = course_ids.get(rowid_to_code.get(neighbour_row_id, ""))
+        if not course_id or not neighbour_id or course_id == neighbour_id:
+            continue
+        key = (course_id, rank)
+        if key in seen_related:
+            continue
+        seen_related.add(key)
+        related_rows.append({
+            "course_id": course_id,
+            "rank": rank,
+            "neighbour_id": neighbour_id,
+            "score": round(score, 6),
+        })
+    changed = manifest.changed("related_courses", related_rows, ["course_id", "rank"])
+    if changed:
+        client.upsert("related_courses", changed, on_conflict="course_id,rank")
+
+    # Each imported course's neighbours are replaced as a set: ranks it no longer has (a smaller k,
+    # --min-score, neighbours that no longer resolve) are deleted. Courses sharing the same set of
+    # ranks, normally all of them, share one filtered delete per chunk of ids.
+    ranks_by_course: Dict[int, set[int]] = defaultdict(set)
+    for row in related_rows:
+        ranks_by_course[row["course_id"]].add(row["rank"])
+    imported = {course_ids[code] for code in rowid_to_code.values() if code in course_ids}
+    groups: Dict[Tuple[int, ...], List[int]] = defaultdict(list)
+    for course_id in sorted(imported):
+        groups[tuple(sorted(ranks_by_course.get(course_id, ())))].append(course_id)
+    for ranks, ids in groups.items():
+        for chunk in chunked(ids, 200):
+            filters = {"course_id": f"in.({','.join(map(str, chunk))})"}
+            if ranks:
+                filters["rank"] = f"not.in.({','.join(map(str, ranks))})"
+            client.delete("related_courses", filters)
+    # the pruned ranks are gone remotely, so a later --delta run must send them again if they return
+    manifest.forget("related_courses", [key for key in manifest.vanished("related_courses") if key[0] in imported])
+    return related_rows
+
+
+def main_rpc(args: argparse.Namespace, client: SupabaseClient) -> None:
+    """Send one course document per course to public.import_courses_batch, --batch-size courses per call."""
+    (
+        courses_map,
+        offerings,
+        _keywords_map,
+        keyword_tag_links,
+        offering_program_links,
+        embeddings_map,
+        unparsed_program_labels,
+    ) = build_payloads(args.courses_csv, args.scores_csv)
+
+    # documents nest rows of several tables, so they are fingerprinted apart from the REST backend's rows
+    manifest = ImportManifest.load(args.manifest, f"{client.base_url}#rpc", args.delta)
+    print(f"Preparing to import {len(courses_map)} courses, {len(offerings)} offerings with {RPC_FUNCTION}")
+
+    documents = build_course_documents(courses_map, offerings, keyword_tag_links, offering_program_links, embeddings_map)
+    counts: Dict[str, int] = defaultdict(int)
+    for result in client.rpc_batches(
+        RPC_FUNCTION,
+        manifest.iter_changed("course_documents", documents, ["course_code"]),
+        "courses",
+        prune=args.delete_missing,
+    ):
+        for table, count in result.items():
+            counts[table] += count
+    print(f"Sent {client.rows_written(RPC_FUNCTION)} changed course documents")
+    for table, count in sorted(counts.items()):
+        if table.startswith("-"):
+            if count:
+                print(f"  {table[1:]}: {count} rows deleted that are no longer in their course's CSV rows")
+        else:
+            print(f"  {table}: {count} rows inserted or changed")
+
+    related_rows: List[Dict[str, Any]] = []
+    if args.related_csv.exists():
+        course_ids = client.lookup("courses", ["course_code"])
+        related_rows = import_related(client, manifest, args.related_csv, offerings, course_ids)
+        if related_rows:
+            print(f"Upserted related courses: {len(related_rows)}")
+
+    # courses gone from the CSVs; their offerings, links and embeddings cascade
+    if args.delete_missing:
+        for table, manifest_table, key_columns in (
+            ("related_courses", "related_courses", ["course_id", "rank"]),
+            ("courses", "course_documents", ["course_code"]),
+        ):
+            vanished = manifest.vanished(manifest_table)
+            if vanished:
+                client.delete_keys(table, key_columns, vanished)
+                print(f"Deleted {len(vanished)} rows from {table} that are no longer in the CSVs")
+            manifest.forget(manifest_table)
+
+    if unparsed_program_labels:
+        print(
+            f"Warning: skipped {len(unparsed_program_labels)} available_program labels that could not be parsed."
+        )
+
+    manifest.save()
+    print("Time per table:")
+    for line in client.timing_report():
+        print(line)
+    print("Import completed")
+
+
+def main(argv: List[str] | None = None) -> None:
+    args = parse_args(argv)
+    if args.backend == "postgres":
+        if not args.database_url:
+            print("--database-url (or SUPABASE_DB_URL) is required for --backend postgres", file=sys.stderr)
+            sys.exit(1)
+        main_postgres(args)
+        return
     if not args.supabase_url or not args.service_role_key:
         print("Supabase URL and service role key are required", file=sys.stderr)
         sys.exit(1)
 
-    client = SupabaseClient(args.supabase_url, args.service_role_key, args.batch_size)
+    client = SupabaseClient(
+        args.supabase_url,
+        args.service_role_key,
+        args.batch_size,
+        max_in_flight=args.max_in_flight,
+        max_retries=args.max_retries,
+        pagination=args.pagination,
+        compression=args.compress,
+        float_digits=args.float_digits,
+    )
+    if args.backend == "rpc":
+        main_rpc(args, client)
+        return
 
     (
         courses_map,
@@ -438,22 +1550,23 @@ def main() -> None:
         offering_program_links,
         embeddings_map,
         unparsed_program_labels,
-    ) = build_payloads(COURSES_CSV, SCORES_CSV)
+    ) = build_payloads(args.courses_csv, args.scores_csv)
 
+    manifest = ImportManifest.load(args.manifest, client.base_url, args.delta)
     print(f"Preparing to upsert {len(courses_map)} courses, {len(offerings)} offerings")
 
     # 1. Upsert courses and capture IDs
-    course_rows = list(courses_map.values())
-    upserted_courses = client.upsert("courses", course_rows, on_conflict="course_code")
+    course_rows = manifest.changed("courses", list(courses_map.values()), ["course_code"])
+    upserted_courses = client.upsert("courses", course_rows, on_conflict="course_code", returning="id,course_code")
     course_ids: Dict[str, int] = {}
     for row in upserted_courses:
         course_ids[row["course_code"]] = row["id"]
     if len(course_ids) != len(courses_map):
-        print("Warning: upserted course count mismatch; fetching remaining ids")
-        rows = client.select("courses", columns="id,course_code")
-        for row in rows:
-            if row["course_code"] in courses_map:
-                course_ids[row["course_code"]] = row["id"]
+        if not args.delta:
+            print("Warning: upserted course count mismatch; fetching remaining ids")
+        for course_code, course_id in client.lookup("courses", ["course_code"]).items():
+            if course_code in courses_map:
+                course_ids[course_code] = course_id
 
     # 2. Ensure tags exist
     tag_types = {item["name"]: item["id"] for item in client.select("tag_types", columns="id,name")}
@@ -472,15 +1585,10 @@ def main() -> None:
             tag_pairs.add(key)
             tag_rows.append({"tag_type_id": key[0], "name": name})
 
+    tag_rows = manifest.changed("tags", tag_rows, ["tag_type_id", "name"])
     if tag_rows:
         client.upsert("tags", tag_rows, on_conflict="tag_type_id,name")
 
-    # Fetch tag IDs for mapping (page through all rows to avoid 1000-row default cap)
-    all_tags = client.select_all("tags", columns="id,name,tag_type_id")
-    tag_lookup: Dict[Tuple[int, str], int] = {}
-    for tag in all_tags:
-        tag_lookup[(tag["tag_type_id"], tag["name"])] = tag["id"]
-
     # 3. Upsert course_offerings with resolved course_id
     offering_rows = []
     for item in offerings:
@@ -499,13 +1607,35 @@ def main() -> None:
             "score_foundations_sigmoid": item["score_foundations_sigmoid"],
         })
 
+    offering_rows = manifest.changed("course_offerings", offering_rows, ["row_id"])
     if offering_rows:
         client.upsert("course_offerings", offering_rows, on_conflict="row_id")
 
-    # 4. Link offerings to tags (offering_tags)
-    #    First, resolve offering row_id -> offering id
-    offering_rows_all = client.select_all("course_offerings", columns="id,row_id")
-    rowid_to_offid: Dict[str, int] = {r["row_id"]: r["id"] for r in offering_rows_all}
+    # 4. Structured program / level data
+    program_rows = build_program_rows(offering_program_links)
+    program_rows = manifest.changed("programs", program_rows, ["name"])
+    if program_rows:
+        client.upsert("programs", program_rows, on_conflict="name")
+
+    level_rows = build_level_rows(offering_program_links)
+    level_rows = manifest.changed("levels", level_rows, ["degree", "label"])
+    if level_rows:
+        client.upsert("levels", level_rows, on_conflict="degree,label")
+
+    # 5. Resolve ids for the link tables: key columns only, all tables at once
+    # (select_all pages through the 1000-row default cap)
+    lookups = client.lookups({
+        "tags": ["tag_type_id", "name"],
+        "course_offerings": ["row_id"],
+        "programs": ["name"],
+        "levels": ["degree", "label"],
+    })
+    tag_lookup: Dict[Tuple[int, str], int] = lookups["tags"]
+    rowid_to_offid: Dict[str, int] = lookups["course_offerings"]
+    program_lookup: Dict[str, int] = lookups["programs"]
+    level_lookup: Dict[Tuple[str, str], int] = lookups["levels"]
+
+    # 6. Link offerings to tags (offering_tags)
 
     offering_tag_rows = []
     seen_pairs: set[Tuple[int, int]] = set()
@@ -520,48 +1650,28 @@ def main() -> None:
         seen_pairs.add(key)
         offering_tag_rows.append({"offering_id": off_id, "tag_id": tag_id})
 
+    offering_tag_rows = manifest.changed("offering_tags", offering_tag_rows, ["offering_id", "tag_id"])
     if offering_tag_rows:
         client.insert_ignore("offering_tags", offering_tag_rows)
 
-    embedding_rows = []
-    for course_code, data in embeddings_map.items():
-        course_id = course_ids.get(course_code)
-        embedding_vec = data.get("embedding")
-        if not course_id or embedding_vec is None:
-            continue
-        preview_text = data.get("preview")
-        source_url = courses_map.get(course_code, {}).get("course_url")
-        embedding_rows.append({
-            "course_id": course_id,
-            "embedding": embedding_vec,
-            "preview": preview_text,
-            "source_url": source_url,
-        })
-    if embedding_rows:
-        client.upsert("course_embeddings", embedding_rows, on_conflict="course_id")
-
-    # Summary
-    # 5. Structured program / level data
-    program_rows = [
-        {"name": program_name.strip()}
-        for program_name in sorted({entry[4].strip() for entry in offering_program_links if entry[4].strip()})
-    ]
-    if program_rows:
-        client.upsert("programs", program_rows, on_conflict="name")
-
-    level_rows = [
-        {"degree": degree, "semester": semester, "label": level_label}
-        for degree, semester, level_label in sorted({(entry[1], entry[3] if entry[3] is not None else 10_000, entry[2]) for entry in offering_program_links})
-    ]
-    if level_rows:
-        client.upsert("levels", level_rows, on_conflict="degree,label")
-
-    program_lookup = {row["name"]: row["id"] for row in client.select_all("programs", columns="id,name")}
-    level_lookup = {
-        (row["degree"], row["label"]): row["id"]
-        for row in client.select_all("levels", columns="id,degree,label")
-    }
+    # 7. Course embeddings (streamed: vectors are read from the spill file chunk by chunk)
+    embedding_rows = (
+        {
+            "course_id": course_ids[course_code],
+            "embedding": data["embedding"],
+            "preview": data.get("preview"),
+            "source_url": courses_map.get(course_code, {}).get("course_url"),
+        }
+        for course_code, data in embeddings_map.items()
+        if course_ids.get(course_code)
+    )
+    client.upsert(
+        "course_embeddings",
+        manifest.iter_changed("course_embeddings", embedding_rows, ["course_id"]),
+        on_conflict="course_id",
+    )
 
+    # 8. Offering -> program / level links
     opl_rows = []
     seen_opl: set[Tuple[int, int, int]] = set()
     for row_id, degree, level_label, semester, program_name in offering_program_links:
@@ -580,12 +1690,33 @@ def main() -> None:
             "level_id": level_id,
         })
 
+    opl_rows = manifest.changed("offering_program_levels", opl_rows, ["offering_id", "program_id", "level_id"])
     if opl_rows:
         client.insert_ignore("offering_program_levels", opl_rows)
 
+    # 9. Related courses (row_id pairs -> course ids)
+    related_rows = import_related(client, manifest, args.related_csv, offerings, course_ids)
+
+    # 10. Rows imported before but gone from the CSVs (children first; tags,
+    #    programs and levels are shared lookup rows and are kept)
+    if args.delete_missing:
+        for table, key_columns in (
+            ("related_courses", ["course_id", "rank"]),
+            ("offering_program_levels", ["offering_id", "program_id", "level_id"]),
+            ("offering_tags", ["offering_id", "tag_id"]),
+            ("course_embeddings", ["course_id"]),
+            ("course_offerings", ["row_id"]),
+            ("courses", ["course_code"]),
+        ):
+            vanished = manifest.vanished(table)
+            if vanished:
+                client.delete_keys(table, key_columns, vanished)
+                print(f"Deleted {len(vanished)} rows from {table} that are no longer in the CSVs")
+            manifest.forget(table)
+
     kw_count = len(keyword_tag_links)
     structured_count = len(offering_program_links)
-    embedding_count = len(embedding_rows)
+    embedding_count = client.rows_written("course_embeddings")
     print(
         f"Linked offering↔tags (keywords): {kw_count} (rows inserted may be fewer due to dedupe)"
     )
@@ -595,6 +1726,8 @@ def main() -> None:
     print(
         f"Upserted course embeddings: {embedding_count}"
     )
+    if related_rows:
+        print(f"Upserted related courses: {len(related_rows)}")
 
     if unparsed_program_labels:
         print(
@@ -603,6 +1736,10 @@ def main() -> None:
         for label in sorted(unparsed_program_labels):
             print(f"  - {label}")
 
+    manifest.save()
+    print("Time per table:")
+    for line in client.timing_report():
+        print(line)
     print("Import completed")
 
 
@@ -124,6 +124,38 @@ DO $$ BEGIN
   END IF;
 END $$;
 
+-- 4) Related courses: top-k embedding neighbours precomputed by data-scraper/related_courses.py.
+-- "Similar courses" is a primary-key range scan: where course_id = $1 order by rank.
+create table if not exists public.related_courses (
+  course_id bigint not null references public.courses(id) on delete cascade,
+  rank smallint not null,
+  neighbour_id bigint not null references public.courses(id) on delete cascade,
+  score real not null,
+  primary key (course_id, rank)
+);
+
+DO $$ BEGIN
+  PERFORM 1 FROM pg_roles WHERE rolname = 'anon';
+  IF FOUND THEN
+    GRANT SELECT   ON public.related_courses TO anon;
+  END IF;
+  PERFORM 1 FROM pg_roles WHERE rolname = 'authenticated';
+  IF FOUND THEN
+    GRANT SELECT   ON public.related_courses TO authenticated;
+  END IF;
+END $$;
+
+alter table public.related_courses enable row level security;
+DO $$ BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_policies WHERE schemaname='public' AND tablename='related_courses' AND policyname='read_related_courses'
+  ) THEN
+    CREATE POLICY read_related_courses ON public.related_courses FOR SELECT
+      TO anon, authenticated
+      USING (true);
+  END IF;
+END $$;
+
 create table if not exists public.course_offerings (
   id bigint generated by default as identity primary key,
   course_id bigint not null references public.courses(id) on delete cascade,
@@ -477,6 +509,198 @@ DO $$ BEGIN
   END IF;
 END $$;
 
+-- === Bulk import RPC (used by `import_from_csv.py --backend rpc`) ===
+-- One call upserts a batch of course documents and resolves every foreign key with joins,
+-- all in the request's transaction:
+--   courses: [{"course_code", "course_name", "course_url", "credits", "lang", "semester", "exam_form",
+--              "workload", "embedding": [floats] | null, "preview",
+--              "offerings": [{"row_id", "section", "type", "prof_name", "score_skills_sigmoid",
+--                             "score_product_sigmoid", "score_venture_sigmoid", "score_foundations_sigmoid",
+--                             "keywords": [text],
+--                             "programs": [{"degree", "level_label", "semester", "program_name"}]}]}]
+--   prune:   also delete the offerings, keyword/program links and embedding of these courses
+--            that are missing from their documents, so each course mirrors its document.
+-- Returns the rows written per table ("-<table>" for pruned rows). Rows are written in key
+-- order so concurrent batches lock shared tags/programs/levels in the same order.
+create or replace function public.import_courses_batch(courses jsonb, prune boolean default false)
+returns jsonb
+language plpgsql
+set search_path = public, extensions
+as $$
+declare
+  counts jsonb := '{}'::jsonb;
+  affected bigint;
+  keywords_type bigint;
+begin
+  select id into keywords_type from public.tag_types where name = 'keywords';
+  if keywords_type is null then
+    raise exception 'tag type "keywords" is missing';
+  end if;
+
+  drop table if exists pg_temp.batch_courses, pg_temp.batch_offerings, pg_temp.batch_keywords, pg_temp.batch_programs;
+  create temp table batch_courses on commit drop as
+    select * from jsonb_to_recordset(courses) as x(
+      course_code text, course_name text, course_url text, credits integer, lang text, semester text,
+      exam_form text, workload text, embedding text, preview text, offerings jsonb);
+  create temp table batch_offerings on commit drop as
+    select distinct on (o.row_id) c.course_code, o.*
+    from batch_courses c
+    cross join lateral jsonb_to_recordset(coalesce(c.offerings, '[]'::jsonb)) as o(
+      row_id text, section text, type text, prof_name text, score_skills_sigmoid numeric,
+      score_product_sigmoid numeric, score_venture_sigmoid numeric, score_foundations_sigmoid numeric,
+      keywords jsonb, programs jsonb)
+    order by o.row_id;
+  create temp table batch_keywords on commit drop as
+    select distinct o.row_id, k.name
+    from batch_offerings o
+    cross join lateral jsonb_array_elements_text(coalesce(o.keywords, '[]'::jsonb)) as k(name);
+  create temp table batch_programs on commit drop as
+    select distinct o.row_id, p.degree, p.level_label, p.semester, p.program_name
+    from batch_offerings o
+    cross join lateral jsonb_to_recordset(coalesce(o.programs, '[]'::jsonb)) as p(
+      degree text, level_label text, semester smallint, program_name text);
+
+  insert into public.courses as t (course_code, course_name, course_url, credits, lang, semester, exam_form, workload)
+  select course_code, course_name, course_url, credits, lang, semester, exam_form, workload
+  from batch_courses order by course_code
+  on conflict (course_code) do update set
+    course_name = excluded.course_name, course_url = excluded.course_url, credits = excluded.credits,
+    lang = excluded.lang, semester = excluded.semester, exam_form = excluded.exam_form, workload = excluded.workload
+  where (t.course_name, t.course_url, t.credits, t.lang, t.semester, t.exam_form, t.workload)
+    is distinct from (excluded.course_name, excluded.course_url, excluded.credits, excluded.lang,
+                      excluded.semester, excluded.exam_form, excluded.workload);
+  get diagnostics affected = row_count;
+  counts := counts || jsonb_build_object('courses', affected);
+
+  insert into public.tags (tag_type_id, name)
+  select distinct keywords_type, name from batch_keywords order by 2
+  on conflict (tag_type_id, name) do nothing;
+  get diagnostics affected = row_count;
+  counts := counts || jsonb_build_object('tags', affected);
+
+  insert into public.course_offerings as t (course_id, row_id, section, type, prof_name, score_skills_sigmoid,
+                                            score_product_sigmoid, score_venture_sigmoid, score_foundations_sigmoid)
+  select c.id, o.row_id, o.section, o.type::course_type, o.prof_name, o.score_skills_sigmoid,
+         o.score_product_sigmoid, o.score_venture_sigmoid, o.score_foundations_sigmoid
+  from batch_offerings o join public.courses c on c.course_code = o.course_code
+  order by o.row_id
+  on conflict (row_id) do update set
+    course_id = excluded.course_id, section = excluded.section, type = excluded.type, prof_name = excluded.prof_name,
+    score_skills_sigmoid = excluded.score_skills_sigmoid, score_product_sigmoid = excluded.score_product_sigmoid,
+    score_venture_sigmoid = excluded.score_venture_sigmoid, score_foundations_sigmoid = excluded.score_foundations_sigmoid
+  where (t.course_id, t.section, t.type, t.prof_name, t.score_skills_sigmoid, t.score_product_sigmoid,
+         t.score_venture_sigmoid, t.score_foundations_sigmoid)
+    is distinct from (excluded.course_id, excluded.section, excluded.type, excluded.prof_name,
+                      excluded.score_skills_sigmoid, excluded.score_product_sigmoid,
+                      excluded.score_venture_sigmoid, excluded.score_foundations_sigmoid);
+  get diagnostics affected = row_count;
+  counts := counts || jsonb_build_object('course_offerings', affected);
+
+  insert into public.offering_tags (offering_id, tag_id)
+  select o.id, tg.id
+  from batch_keywords k
+  join public.course_offerings o on o.row_id = k.row_id
+  join public.tags tg on tg.tag_type_id = keywords_type and tg.name = k.name
+  order by 1, 2
+  on conflict do nothing;
+  get diagnostics affected = row_count;
+  counts := counts || jsonb_build_object('offering_tags', affected);
+
+  insert into public.course_embeddings as t (course_id, embedding, preview, source_url)
+  select c.id, b.embedding::vector, b.preview, c.course_url
+  from batch_courses b join public.courses c on c.course_code = b.course_code
+  where b.embedding is not null
+  order by c.id
+  on conflict (course_id) do update set
+    embedding = excluded.embedding, preview = excluded.preview, source_url = excluded.source_url
+  where (t.embedding, t.preview, t.source_url) is distinct from (excluded.embedding, excluded.preview, excluded.source_url);
+  get diagnostics affected = row_count;
+  counts := counts || jsonb_build_object('course_embeddings', affected);
+
+  insert into public.programs (name)
+  select distinct btrim(program_name) from batch_programs where btrim(program_name) <> '' order by 1
+  on conflict (name) do nothing;
+  get diagnostics affected = row_count;
+  counts := counts || jsonb_build_object('programs', affected);
+
+  -- a missing semester sorts last, as in the REST and COPY import paths
+  insert into public.levels as t (degree, semester, label)
+  select distinct on (degree, level_label) degree::degree_type, coalesce(semester, 10000), level_label
+  from batch_programs
+  order by degree, level_label, coalesce(semester, 10000)
+  on conflict (degree, label) do update set semester = excluded.semester
+  where t.semester is distinct from excluded.semester;
+  get diagnostics affected = row_count;
+  counts := counts || jsonb_build_object('levels', affected);
+
+  insert into public.offering_program_levels (offering_id, program_id, level_id)
+  select distinct o.id, p.id, l.id
+  from batch_programs s
+  join public.course_offerings o on o.row_id = s.row_id
+  join public.programs p on p.name = s.program_name
+  join public.levels l on l.degree = s.degree::degree_type and l.label = s.level_label
+  order by 1, 2, 3
+  on conflict do nothing;
+  get diagnostics affected = row_count;
+  counts := counts || jsonb_build_object('offering_program_levels', affected);
+
+  if prune then
+    delete from public.offering_program_levels t
+    using public.course_offerings o, batch_offerings b
+    where o.row_id = b.row_id and t.offering_id = o.id
+      and not exists (
+        select 1 from batch_programs s
+        join public.programs p on p.name = s.program_name
+        join public.levels l on l.degree = s.degree::degree_type and l.label = s.level_label
+        where s.row_id = b.row_id and p.id = t.program_id and l.id = t.level_id);
+    get diagnostics affected = row_count;
+    counts := counts || jsonb_build_object('-offering_program_levels', affected);
+
+    delete from public.offering_tags t
+    using public.course_offerings o, batch_offerings b
+    where o.row_id = b.row_id and t.offering_id = o.id
+      and not exists (
+        select 1 from batch_keywords k
+        join public.tags tg on tg.tag_type_id = keywords_type and tg.name = k.name
+        where k.row_id = b.row_id and tg.id = t.tag_id);
+    get diagnostics affected = row_count;
+    counts := counts || jsonb_build_object('-offering_tags', affected);
+
+    delete from public.course_embeddings t
+    using public.courses c, batch_courses b
+    where c.course_code = b.course_code and t.course_id = c.id and b.embedding is null;
+    get diagnostics affected = row_count;
+    counts := counts || jsonb_build_object('-course_embeddings', affected);
+
+    delete from public.course_offerings t
+    using public.courses c, batch_courses b
+    where c.course_code = b.course_code and t.course_id = c.id
+      and not exists (select 1 from batch_offerings o where o.row_id = t.row_id);
+    get diagnostics affected = row_count;
+    counts := counts || jsonb_build_object('-course_offerings', affected);
+  end if;
+
+  return counts;
+end;
+$$;
+
+-- Import only: Supabase grants EXECUTE on new functions to the API roles by default, so keep it to the service role.
+revoke execute on function public.import_courses_batch(jsonb, boolean) from public;
+DO $$ BEGIN
+  PERFORM 1 FROM pg_roles WHERE rolname = 'anon';
+  IF FOUND THEN
+    REVOKE EXECUTE ON FUNCTION public.import_courses_batch(jsonb, boolean) FROM anon;
+  END IF;
+  PERFORM 1 FROM pg_roles WHERE rolname = 'authenticated';
+  IF FOUND THEN
+    REVOKE EXECUTE ON FUNCTION public.import_courses_batch(jsonb, boolean) FROM authenticated;
+  END IF;
+  PERFORM 1 FROM pg_roles WHERE rolname = 'service_role';
+  IF FOUND THEN
+    GRANT EXECUTE ON FUNCTION public.import_courses_batch(jsonb, boolean) TO service_role;
+  END IF;
+END $$;
+
 -- === Runnable migration: normalize legacy 'available_programs' tags into structured tables ===
 WITH src AS (
   SELECT
@@ -0,0 +1,569 @@
+"""
+Local stand-in for the subset of PostgREST that import_from_csv.py uses.
+
+Usage:
+  python supabase/local_postgrest.py [--port 54321] [--db :memory:] [--latency-ms 0] [--max-rows N]
+  python supabase/import_from_csv.py --supabase-url http://127.0.0.1:54321 --service-role-key local
+
+Serves /rest/v1/<table> from SQLite, with the tables, keys and foreign keys
+of supabase/init_postgres.sql (no views, RPCs or RLS; any key is accepted):
+  - POST: bulk inserts and upserts (on_conflict, Prefer resolution=merge-duplicates
+    or ignore-duplicates, return=minimal or representation, select), with gzip or
+    zstd request bodies
+  - GET / HEAD: select, order, limit, offset, eq/neq/gt/gte/lt/lte/in/is filters,
+    Range paging and Prefer count=exact
+  - DELETE: the same filters plus or=(...) / and=(...) trees
+
+--latency-ms delays every response to mimic the round trip to a hosted
+project, and --max-rows caps page sizes like PostgREST's db-max-rows.
+Requests and bytes per method are counted in LocalPostgrest.stats.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+
+SCHEMA_SQL = """
+create table courses (
+  id integer primary key autoincrement,
+  course_name text not null,
+  course_code text not null unique,
+  course_url text,
+  credits integer not null,
+  lang text not null,
+  semester text not null,
+  exam_form text,
+  workload text
+);
+create table course_embeddings (
+  course_id integer primary key references courses(id) on delete cascade,
+  embedding text not null,
+  preview text,
+  source_url text
+);
+create table related_courses (
+  course_id integer not null references courses(id) on delete cascade,
+  rank integer not null,
+  neighbour_id integer not null references courses(id) on delete cascade,
+  score real not null,
+  primary key (course_id, rank)
+);
+create table course_offerings (
+  id integer primary key autoincrement,
+  course_id integer not null references courses(id) on delete cascade,
+  row_id text not null unique,
+  section text not null,
+  type text not null,
+  prof_name text,
+  score_skills_sigmoid real,
+  score_product_sigmoid real,
+  score_venture_sigmoid real,
+  score_foundations_sigmoid real,
+  unique (course_id, section)
+);
+create table tag_types (
+  id integer primary key autoincrement,
+  name text not null unique
+);
+insert into tag_types (name) values ('keywords'), ('available_programs');
+create table tags (
+  id integer primary key autoincrement,
+  tag_type_id integer not null references tag_types(id) on delete cascade,
+  name text not null,
+  unique (tag_type_id, name)
+);
+create table offering_tags (
+  offering_id integer not null references course_offerings(id) on delete cascade,
+  tag_id integer not null references tags(id) on delete cascade,
+  primary key (offering_id, tag_id)
+);
+create table programs (
+  id integer primary key autoincrement,
+  name text not null unique
+);
+create table levels (
+  id integer primary key autoincrement,
+  degree text not null check (degree in ('BA', 'MA', 'PhD')),
+  semester integer,
+  label text not null,
+  unique (degree, label)
+);
+create table offering_program_levels (
+  offering_id integer not null references course_offerings(id) on delete cascade,
+  program_id integer not null references programs(id) on delete cascade,
+  level_id integer not null references levels(id) on delete cascade,
+  primary key (offering_id, program_id, level_id)
+);
+"""
+
+OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+
+class ApiError(Exception):
+    """Answered as a PostgREST-style JSON error."""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def split_items(text: str) -> List[str]:
+    """Split on top-level commas, keeping quoted strings and parenthesised groups intact."""
+    items: List[str] = []
+    current: List[str] = []
+    depth = 0
+    quoted = False
+    escaped = False
+    for char in text:
+        if escaped:
+            escaped = False
+        elif char == "\\" and quoted:
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            items.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    if current or items:
+        items.append("".join(current))
+    return items
+
+
+def unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        out: List[str] = []
+        escaped = False
+        for char in value[1:-1]:
+            if escaped or char != "\\":
+                out.append(char)
+                escaped = False
+            else:
+                escaped = True
+        return "".join(out)
+    return value
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class _Table:
+    def __init__(self, name: str, columns: List[str], primary_key: List[str]):
+        self.name = name
+        self.columns = columns
+        self.primary_key = primary_key
+
+    def column(self, name: str) -> str:
+        if name not in self.columns:
+            raise ApiError(400, "42703", f"column {self.name}.{name} does not exist")
+        return _quote_ident(name)
+
+    def condition(self, column: str, expression: str) -> Tuple[str, List[Any]]:
+        """``column=op.value`` -> SQL with ``?`` placeholders."""
+        op, _, value = expression.partition(".")
+        if op == "not":
+            sql, params = self.condition(column, value)
+            return f"not ({sql})", params
+        col = self.column(column)
+        if op in OPERATORS:
+            return f"{col} {OPERATORS[op]} ?", [unquote(value)]
+        if op == "in":
+            if not (value.startswith("(") and value.endswith(")")):
+                raise ApiError(400, "PGRST100", f"malformed in filter: {expression}")
+            values = [unquote(item) for item in split_items(value[1:-1])]
+            if not values:
+                return "0", []
+            return f"{col} in ({','.join('?' * len(values))})", values
+        if op == "is":
+            keyword = {"null": "null", "true": "1", "false": "0"}.get(value.lower())
+            if keyword is None:
+                raise ApiError(400, "PGRST100", f"malformed is filter: {expression}")
+            return (f"{col} is null", []) if keyword == "null" else (f"{col} = {keyword}", [])
+        raise ApiError(400, "PGRST100", f"unsupported operator: {op}")
+
+    def logic(self, operator: str, expression: str) -> Tuple[str, List[Any]]:
+        """``or=(a.eq.1,and(b.eq.2,c.eq.3))`` -> SQL."""
+        if not (expression.startswith("(") and expression.endswith(")")):
+            raise ApiError(400, "PGRST100", f"malformed logic tree: {operator}={expression}")
+        parts: List[str] = []
+        params: List[Any] = []
+        for item in split_items(expression[1:-1]):
+            name, paren, rest = item.partition("(")
+            if paren and name in ("and", "or", "not.and", "not.or"):
+                sql, item_params = self.logic(name.rsplit(".", 1)[-1], "(" + rest)
+                if name.startswith("not."):
+                    sql = f"not {sql}"
+            else:
+                column, _, condition = item.partition(".")
+                sql, item_params = self.condition(column, condition)
+            parts.append(sql)
+            params.extend(item_params)
+        if not parts:
+            raise ApiError(400, "PGRST100", f"empty logic tree: {operator}")
+        return "(" + f" {operator} ".join(parts) + ")", params
+
+    def where(self, query: List[Tuple[str, str]]) -> Tuple[str, List[Any]]:
+        parts: List[str] = []
+        params: List[Any] = []
+        for key, value in query:
+            if key in RESERVED_PARAMS:
+                continue
+            if key in ("or", "and", "not.or", "not.and"):
+                sql, item_params = self.logic(key.rsplit(".", 1)[-1], value)
+                if key.startswith("not."):
+                    sql = f"not {sql}"
+            else:
+                sql, item_params = self.condition(key, value)
+            parts.append(sql)
+            params.extend(item_params)
+        return (" where " + " and ".join(parts) if parts else ""), params
+
+    def select_list(self, select: str | None) -> List[str]:
+        if not select or select == "*":
+            return list(self.columns)
+        names = [name.strip() for name in select.split(",") if name.strip()]
+        for name in names:
+            self.column(name)
+        return names
+
+    def order_by(self, order: str | None) -> str:
+        if not order:
+            return ""
+        terms = []
+        for term in order.split(","):
+            column, *modifiers = term.strip().split(".")
+            sql = self.column(column)
+            for modifier in modifiers:
+                if modifier in ("asc", "desc"):
+                    sql += f" {modifier}"
+                elif modifier in ("nullsfirst", "nullslast"):
+                    sql += " nulls " + modifier[5:]
+                else:
+                    raise ApiError(400, "PGRST100", f"malformed order: {order}")
+            terms.append(sql)
+        return " order by " + ", ".join(terms)
+
+
+def _parse_prefer(header: str | None) -> Dict[str, str]:
+    prefer: Dict[str, str] = {}
+    for item in (header or "").replace(";", ",").split(","):
+        key, _, value = item.strip().partition("=")
+        if key:
+            prefer[key] = value
+    return prefer
+
+
+def _parse_range(header: str | None) -> Tuple[int, int | None]:
+    if not header:
+        return 0, None
+    start, _, end = header.strip().partition("-")
+    try:
+        return int(start), (int(end) if end else None)
+    except ValueError as exc:
+        raise ApiError(416, "PGRST103", f"invalid range: {header}") from exc
+
+
+def _decode_body(raw: bytes, encoding: str | None) -> bytes:
+    if not encoding or encoding == "identity":
+        return raw
+    if encoding == "gzip":
+        return gzip.decompress(raw)
+    if encoding == "zstd":
+        try:
+            import zstandard
+        except ImportError as exc:  # optional dependency, only for zstd bodies
+            raise ApiError(415, "PGRST107", "zstd bodies need the zstandard package") from exc
+        return zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    raise ApiError(415, "PGRST107", f"unsupported Content-Encoding: {encoding}")
+
+
+def _db_value(value: Any) -> Any:
+    # arrays (vectors) and objects are stored as their JSON text, like a vector's text form
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, separators=(",", ":"))
+    return value
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled sessions reuse connections
+    server: "_Server"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - BaseHTTPRequestHandler signature
+        pass
+
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+
+    def do_HEAD(self) -> None:
+        self._dispatch("HEAD")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def do_DELETE(self) -> None:
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str) -> None:
+        api = self.server.api
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            url = urlsplit(self.path)
+            if not url.path.startswith("/rest/v1/"):
+                raise ApiError(404, "PGRST125", f"unknown path: {url.path}")
+            table = api.tables.get(url.path[len("/rest/v1/"):])
+            if table is None:
+                raise ApiError(404, "42P01", f"relation {url.path[len('/rest/v1/'):]} does not exist")
+            query = parse_qsl(url.query, keep_blank_values=True)
+            handler = {"GET": api.handle_select, "HEAD": api.handle_select, "POST": api.handle_insert,
+                       "DELETE": api.handle_delete}[method]
+            status, headers, body = handler(table, query, self.headers, raw)
+        except ApiError as exc:
+            status, headers, body = exc.status, {}, {"code": exc.code, "message": str(exc), "details": None, "hint": None}
+        except (ValueError, gzip.BadGzipFile, zlib.error) as exc:
+            status, headers, body = 400, {}, {"code": "PGRST102", "message": f"invalid body: {exc}", "details": None,
+                                              "hint": None}
+        payload = b"" if body is None else json.dumps(body, separators=(",", ":")).encode("utf-8")
+        if api.latency:
+            time.sleep(api.latency)
+        api.count(method, len(raw), len(payload))
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if body is not None:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if method != "HEAD":
+            self.wfile.write(payload)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    api: "LocalPostgrest"
+
+
+class LocalPostgrest:
+    """SQLite-backed PostgREST stand-in served from a background thread.
+
+    Use as a context manager; ``url`` is the value for ``--supabase-url``.
+    All requests share one SQLite connection behind a lock, and every write
+    request runs in its own transaction, so a failing batch leaves no rows.
+    """
+
+    def __init__(
+        self,
+        db: str = ":memory:",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        max_rows: int | None = None,
+    ):
+        self.latency = latency
+        self.max_rows = max_rows
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db, check_same_thread=False, isolation_level=None)
+        self._conn.execute("pragma foreign_keys = on")
+        self._conn.execute("pragma synchronous = off")
+        if db != ":memory:":
+            self._conn.execute("pragma journal_mode = wal")
+        if not self._conn.execute("select 1 from sqlite_master where name = 'courses'").fetchone():
+            self._conn.executescript(SCHEMA_SQL)
+        self.tables: Dict[str, _Table] = {}
+        for (name,) in self._conn.execute("select name from sqlite_master where type = 'table' and name not like 'sqlite_%'"):
+            info = self._conn.execute(f"pragma table_info({_quote_ident(name)})").fetchall()
+            columns = [row[1] for row in info]
+            primary_key = [row[1] for row in sorted((row for row in info if row[5]), key=lambda row: row[5])]
+            self.tables[name] = _Table(name, columns, primary_key)
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.api = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "LocalPostgrest":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="local-postgrest", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """Serve on the calling thread until interrupted."""
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+            self._conn.close()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        self._conn.close()
+
+    def __enter__(self) -> "LocalPostgrest":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def query(self, sql: str, params: Tuple[Any, ...] = ()) -> List[Tuple[Any, ...]]:
+        """Run SQL against the backing database (for tests and benchmarks)."""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def count(self, method: str, bytes_in: int, bytes_out: int) -> None:
+        with self._lock:
+            entry = self.stats.setdefault(method, {"requests": 0, "bytes_in": 0, "bytes_out": 0})
+            entry["requests"] += 1
+            entry["bytes_in"] += bytes_in
+            entry["bytes_out"] += bytes_out
+
+    def handle_select(
+        self, table: _Table, query: List[Tuple[str, str]], headers: Any, _raw: bytes
+    ) -> Tuple[int, Dict[str, str], Any]:
+        params = dict(query)
+        columns = table.select_list(params.get("select"))
+        where, where_params = table.where(query)
+        start, end = _parse_range(headers.get("Range"))
+        start += int(params.get("offset") or 0)
+        limit = None if end is None else max(0, end - start + 1)
+        if params.get("limit"):
+            limit = int(params["limit"]) if limit is None else min(limit, int(params["limit"]))
+        if self.max_rows is not None:
+            limit = self.max_rows if limit is None else min(limit, self.max_rows)
+        sql = f"select {', '.join(map(_quote_ident, columns))} from {_quote_ident(table.name)}{where}"
+        sql += table.order_by(params.get("order"))
+        sql += f" limit {-1 if limit is None else limit} offset {start}"
+        counted = _parse_prefer(headers.get("Prefer")).get("count") == "exact"
+        with self._lock:
+            rows = self._conn.execute(sql, where_params).fetchall()
+            total = None
+            if counted:
+                total = self._conn.execute(f"select count(*) from {_quote_ident(table.name)}{where}", where_params).fetchone()[0]
+        shown = f"{start}-{start + len(rows) - 1}" if rows else "*"
+        headers_out = {"Content-Range": f"{shown}/{'*' if total is None else total}"}
+        status = 206 if total is not None and start + len(rows) < total else 200
+        return status, headers_out, [dict(zip(columns, row)) for row in rows]
+
+    def handle_insert(
+        self, table: _Table, query: List[Tuple[str, str]], headers: Any, raw: bytes
+    ) -> Tuple[int, Dict[str, str], Any]:
+        params = dict(query)
+        body = json.loads(_decode_body(raw, headers.get("Content-Encoding")) or b"[]")
+        rows = body if isinstance(body, list) else [body]
+        prefer = _parse_prefer(headers.get("Prefer"))
+        representation = prefer.get("return") == "representation"
+        if not rows:
+            return 201, {}, [] if representation else None
+        if params.get("columns"):
+            columns = [name.strip() for name in params["columns"].split(",")]
+        else:
+            columns = list(dict.fromkeys(key for row in rows for key in row))
+        column_sql = ", ".join(table.column(name) for name in columns)
+        sql = f"insert into {_quote_ident(table.name)} ({column_sql}) values ({', '.join('?' * len(columns))})"
+        resolution = prefer.get("resolution")
+        if resolution in ("merge-duplicates", "ignore-duplicates"):
+            target = [name.strip() for name in params["on_conflict"].split(",")] if params.get("on_conflict") else table.primary_key
+            sql += f" on conflict ({', '.join(table.column(name) for name in target)})"
+            updates = [name for name in columns if name not in target]
+            if resolution == "merge-duplicates" and updates:
+                sql += " do update set " + ", ".join(f"{_quote_ident(name)} = excluded.{_quote_ident(name)}" for name in updates)
+            else:
+                sql += " do nothing"
+        returned = table.select_list(params.get("select")) if representation else []
+        if returned:
+            sql += " returning " + ", ".join(map(_quote_ident, returned))
+        values = [tuple(_db_value(row.get(name)) for name in columns) for row in rows]
+        out: List[Dict[str, Any]] = []
+        with self._lock:
+            try:
+                self._conn.execute("begin")
+                if returned:
+                    for row_values in values:
+                        out.extend(dict(zip(returned, row)) for row in self._conn.execute(sql, row_values).fetchall())
+                else:
+                    self._conn.executemany(sql, values)
+                self._conn.execute("commit")
+            except sqlite3.Error as exc:
+                self._conn.execute("rollback")
+                raise self._error(exc) from exc
+        return 201, {}, out if representation else None
+
+    def handle_delete(
+        self, table: _Table, query: List[Tuple[str, str]], headers: Any, _raw: bytes
+    ) -> Tuple[int, Dict[str, str], Any]:
+        where, where_params = table.where(query)
+        with self._lock:
+            try:
+                self._conn.execute("begin")
+                self._conn.execute(f"delete from {_quote_ident(table.name)}{where}", where_params)
+                self._conn.execute("commit")
+            except sqlite3.Error as exc:
+                self._conn.execute("rollback")
+                raise self._error(exc) from exc
+        return 204, {}, None
+
+    @staticmethod
+    def _error(exc: sqlite3.Error) -> ApiError:
+        message = str(exc)
+        if "UNIQUE" in message:
+            return ApiError(409, "23505", message)
+        if "FOREIGN KEY" in message:
+            return ApiError(409, "23503", message)
+        if "NOT NULL" in message:
+            return ApiError(400, "23502", message)
+        if "CHECK" in message:
+            return ApiError(400, "23514", message)
+        if "ON CONFLICT" in message:
+            return ApiError(400, "42P10", message)
+        return ApiError(400, "PGRST000", message)
+
+
+def _parse_args(argv: List[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve a local PostgREST stand-in for import_from_csv.py")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=54321, help="Port (default: 54321)")
+    parser.add_argument("--db", default=":memory:", help="SQLite database file (default: in memory)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every response (default: 0)")
+    parser.add_argument("--max-rows", type=int, default=None, help="Cap on rows per GET response, like db-max-rows")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = _parse_args(argv)
+    server = LocalPostgrest(args.db, args.host, args.port, args.latency_ms / 1000, args.max_rows)
+    print(f"Serving {server.url}/rest/v1 from {args.db} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import csv
+import json
+import os
+import sys
+import tempfile
+from array import array
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import import_from_csv as importer  # noqa: E402
+
+
+def _write(path: Path, fieldnames: list, rows: list) -> None:
+    with path.open("w", newline="", encoding="utf-8") as fp:
+        writer = csv.DictWriter(fp, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_embeddings_join_from_spill_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        courses_csv, scores_csv = Path(tmp) / "epfl_courses.csv", Path(tmp) / "courses_scores.csv"
+        _write(courses_csv, ["row_id", "course_code", "course_name", "keywords", "available_programs"], [
+            {"row_id": "r1", "course_code": "CS-101", "course_name": "Intro", "keywords": "['python']",
+             "available_programs": "['BA1 Computer Science']"},
+            {"row_id": "r2", "course_code": "CS-101", "course_name": "Intro", "keywords": "[]", "available_programs": "[]"},
+            {"row_id": "r3", "course_code": "MATH-200", "course_name": "Analysis", "keywords": "[]", "available_programs": "[]"},
+            {"row_id": "r4", "course_code": "PHYS-100", "course_name": "Physics", "keywords": "[]", "available_programs": "[]"},
+        ])
+        # scores in a different order than the courses; r1 has a malformed vector, r4 none at all
+        _write(scores_csv, ["row_id", "text", "score_skills_sigmoid", "embedding"], [
+            {"row_id": "r3", "text": "Analysis", "score_skills_sigmoid": "0.25", "embedding": json.dumps([0.5, -1.0])},
+            {"row_id": "r2", "text": "Intro", "score_skills_sigmoid": "0.75", "embedding": json.dumps([0.1, 0.2])},
+            {"row_id": "r1", "text": "Intro", "score_skills_sigmoid": "0.5", "embedding": "[0.1, oops"},
+            {"row_id": "r4", "text": "Physics", "score_skills_sigmoid": "", "embedding": ""},
+        ])
+        courses, offerings, _kw, links, programs, embeddings, _unparsed = importer.build_payloads(courses_csv, scores_csv)
+
+        assert sorted(courses) == ["CS-101", "MATH-200", "PHYS-100"]
+        assert [o["score_skills_sigmoid"] for o in offerings] == [0.5, 0.75, 0.25, None]
+        assert links == {("r1", "python")} and programs == {("r1", "BA", "BA1", 1, "Computer Science")}
+
+        # the first offering with a usable vector represents the course
+        assert sorted(embeddings) == ["CS-101", "MATH-200"] and "PHYS-100" not in embeddings
+        entry = embeddings["CS-101"]
+        assert entry["row_id"] == "r2" and entry["preview"] is None
+        assert isinstance(entry["embedding"], array) and entry["embedding"].tolist() == array("f", [0.1, 0.2]).tolist()
+        assert importer.compact_vector(embeddings["MATH-200"]["embedding"], 9) == [0.5, -1.0]
+    print("[ok] scores joined by row_id, embeddings read back from the spill file")
+
+
+if __name__ == "__main__":
+    test_embeddings_join_from_spill_file()
@@ -0,0 +1,59 @@
+import csv
+import os
+import random
+import sys
+import warnings
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import import_from_csv as importer  # noqa: E402
+
+EDGE_CASES = [
+    "", "[]", "[ ]", "['a']", "[ 'a' , \"b's\" ,]", "['  ', '']", "[\t'a'\t]", "['é', \"ü\"]",
+    "['\\xa0x\\xa0']", "['it\\'s']", '["say \\"hi\\""]', "['\\N{BULLET} x']", "['\\d']",
+    # not plain lists of str literals: left to ast.literal_eval (or rejected by it)
+    "['\\N{NO SUCH NAME}']", "['\\x0']", "['a\\\nb']", "['a',\n'b']", "['a' 'b']", "['a',,'b']", "[,]",
+    "['a'] ", " ['a']", "[u'a']", "[b'a']", "['a', 1]", "('a',)", "[['a']]", "None", "['a'", "['a']]",
+    "['\ud800']", "['a\x00']", "['\x0c']",
+]
+
+
+def _random_cells(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    alphabet = list("[]'\", \t\\axn{}0N\n") + ["\\x", "\\xa0", "'a'", '"b"']
+    items = ["a", " b ", "it's", 'x"y', "\xa0", "\\", "é\x81", ""]
+    cells = []
+    for _ in range(count):
+        cells.append("".join(rng.choice(alphabet) for _ in range(rng.randint(0, 14))))
+        cells.append("[" + ", ".join(repr(rng.choice(items)) for _ in range(rng.randint(0, 4))) + "]")
+    return cells
+
+
+def test_parse_list_field_matches_literal_eval():
+    with importer.COURSES_CSV.open(newline="", encoding="utf-8") as handle:
+        rows = list(csv.DictReader(handle))
+    cells = [row[field] for row in rows for field in ("keywords", "available_programs")]
+    assert cells and all(importer.LIST_FIELD_RE.fullmatch(cell) for cell in cells)  # the fast path covers the CSV
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # invalid escapes like '\d' warn in both decoders
+        for cell in cells + EDGE_CASES + _random_cells(5000):
+            assert importer.parse_list_field(cell) == importer.literal_list_field(cell), repr(cell)
+    print("[ok] parse_list_field matches ast.literal_eval on epfl_courses.csv and edge cases")
+
+
+def test_parse_program_label_is_memoized():
+    with importer.COURSES_CSV.open(newline="", encoding="utf-8") as handle:
+        labels = [label for row in csv.DictReader(handle) for label in importer.parse_list_field(row["available_programs"])]
+    labels += ["", "BA", "XY3 Physics", "MA3   ", "Minor Autumn Semester Neuro-X", "MA Project Spring Chemistry",
+               "edoc Mathematics", "PhD.1 Physics"]
+    importer.parse_program_label.cache_clear()
+    for label in labels:
+        assert importer.parse_program_label(label) == importer.parse_program_label.__wrapped__(label), label
+    info = importer.parse_program_label.cache_info()
+    assert info.misses == len(set(labels)) and info.hits == len(labels) - len(set(labels))
+    print("[ok] memoized parse_program_label matches the uncached parser")
+
+
+if __name__ == "__main__":
+    test_parse_list_field_matches_literal_eval()
+    test_parse_program_label_is_memoized()
@@ -0,0 +1,117 @@
+"""End-to-end import against the local PostgREST stand-in (no network or Supabase project needed)."""
+
+import contextlib
+import csv
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import import_from_csv as importer  # noqa: E402
+from bench_import import change_corpus, write_corpus  # noqa: E402
+from local_postgrest import LocalPostgrest, split_items  # noqa: E402
+
+TABLES = ("courses", "course_offerings", "course_embeddings", "tags", "offering_tags", "offering_program_levels")
+
+
+def _counts(server: LocalPostgrest) -> dict:
+    return {table: server.query(f"select count(*) from {table}")[0][0] for table in TABLES}
+
+
+def _import(server: LocalPostgrest, tmp: Path, courses_csv: Path, scores_csv: Path, *extra: str,
+            related_csv: Path | None = None) -> None:
+    argv = ["--supabase-url", server.url, "--service-role-key", "local", "--courses-csv", str(courses_csv),
+            "--scores-csv", str(scores_csv), "--related-csv", str(related_csv or tmp / "missing.csv"),
+            "--manifest", str(tmp / "manifest.json"), "--batch-size", "50", *extra]
+    with contextlib.redirect_stdout(io.StringIO()):
+        importer.main(argv)
+
+
+def test_filters_and_paging():
+    assert split_items('and(a.eq."x,y",b.eq.2),c.in.(1,2)') == ['and(a.eq."x,y",b.eq.2)', "c.in.(1,2)"]
+    with LocalPostgrest(max_rows=2) as server:
+        url = f"{server.url}/rest/v1/programs"
+        resp = requests.post(url, json=[{"name": n} for n in ("a", 'q"uote', "c, d")],
+                             headers={"Prefer": "return=representation"}, params={"select": "id,name"})
+        assert resp.status_code == 201 and [row["name"] for row in resp.json()] == ["a", 'q"uote', "c, d"]
+        assert requests.post(url, json=[{"name": "a"}]).status_code == 409
+
+        resp = requests.head(url, headers={"Prefer": "count=exact", "Range": "0-0"})
+        assert resp.headers["Content-Range"] == "0-0/3"
+        page = requests.get(url, params={"select": "name", "order": "id.desc"}, headers={"Range": "0-9"})
+        assert page.json() == [{"name": "c, d"}, {"name": 'q"uote'}]  # capped by max_rows
+
+        client = importer.SupabaseClient(server.url, "local", max_in_flight=2)
+        assert client.lookup("programs", ["name"]) == {"a": 1, 'q"uote': 2, "c, d": 3}
+        client.delete_keys("programs", ["name"], [['q"uote'], ["c, d"]])
+        assert server.query("select name from programs") == [("a",)]
+    print("[ok] stand-in filters, conflicts, counts and paging")
+
+
+def test_full_and_delta_import():
+    with tempfile.TemporaryDirectory() as tmp_dir, LocalPostgrest() as server:
+        tmp = Path(tmp_dir)
+        courses_csv, scores_csv = write_corpus(tmp, offerings=300, dim=8)
+        _import(server, tmp, courses_csv, scores_csv)
+        counts = _counts(server)
+        assert counts["courses"] == 200 and counts["course_offerings"] == 300 and counts["course_embeddings"] == 200
+        assert counts["offering_tags"] > 300 * 10 and counts["offering_program_levels"] > 300
+
+        posts = server.stats["POST"]["requests"]
+        _import(server, tmp, courses_csv, scores_csv, "--delta")
+        assert server.stats["POST"]["requests"] == posts and _counts(server) == counts
+
+        changes = change_corpus(courses_csv, 0.1)
+        _import(server, tmp, courses_csv, scores_csv, "--delta", "--delete-missing")
+        assert _counts(server)["course_offerings"] == 300 - changes["dropped"]
+        assert server.query("select count(*) from course_offerings where prof_name like '% Jr'")[0][0] == changes["prof_name"]
+        assert server.query("select count(*) from tags where name = 'changed keyword'")[0][0] == int(changes["keyword"] > 0)
+    print("[ok] full import, no-op delta and delete-missing against the stand-in")
+
+
+def _write_related(path: Path, neighbours: dict) -> None:
+    with path.open("w", newline="", encoding="utf-8") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(["row_id", "neighbour_id", "rank", "score"])
+        for row_id, ids in neighbours.items():
+            writer.writerows([row_id, neighbour, rank, 0.5] for rank, neighbour in enumerate(ids, start=1))
+
+
+def test_related_ranks_replaced_per_course():
+    with tempfile.TemporaryDirectory() as tmp_dir, LocalPostgrest() as server:
+        tmp = Path(tmp_dir)
+        courses_csv, scores_csv = write_corpus(tmp, offerings=30, dim=8)
+        with courses_csv.open(newline="", encoding="utf-8") as fp:
+            row_ids = [row["row_id"] for row in csv.DictReader(fp)][:20]  # one offering per course
+        related_csv = tmp / "related_courses.csv"
+        _write_related(related_csv, {r: [row_ids[(i + j) % 20] for j in (1, 2, 3)] for i, r in enumerate(row_ids)})
+        _import(server, tmp, courses_csv, scores_csv, related_csv=related_csv)
+        assert server.query("select count(*) from related_courses")[0][0] == 60
+
+        # the first course keeps one neighbour, the second none; no --delete-missing needed
+        neighbours = {r: [row_ids[(i + j) % 20] for j in (1, 2, 3)] for i, r in enumerate(row_ids[2:], start=2)}
+        neighbours[row_ids[0]] = [row_ids[1]]
+        _write_related(related_csv, neighbours)
+        _import(server, tmp, courses_csv, scores_csv, "--delta", related_csv=related_csv)
+        ranks = server.query(
+            "select c.course_code, count(*), max(r.rank) from related_courses r join courses c on c.id = r.course_id "
+            "group by c.course_code order by c.course_code"
+        )
+        assert len(ranks) == 19 and ranks[0][1:] == (1, 1) and all(row[1:] == (3, 3) for row in ranks[1:])
+
+        # restoring the original ranks re-sends the pruned rows even though the manifest saw them before
+        _write_related(related_csv, {r: [row_ids[(i + j) % 20] for j in (1, 2, 3)] for i, r in enumerate(row_ids)})
+        _import(server, tmp, courses_csv, scores_csv, "--delta", related_csv=related_csv)
+        assert server.query("select count(*) from related_courses")[0][0] == 60
+    print("[ok] related courses are replaced per course")
+
+
+if __name__ == "__main__":
+    test_filters_and_paging()
+    test_full_and_delta_import()
+    test_related_ranks_replaced_per_course()